@@ -0,0 +1,42 @@
+import contextlib
+import os
+import tempfile
+
+# mkstemp creates files only the owner can read, written files get the usual permissions instead
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb', encoding=None, permissions=FILE_MODE):
+    """
+    Write a file through a unique temporary file next to it, which replaces the file once the
+    block finishes. Readers never see a partial file, and threads or processes writing the same
+    path at once do not mix their contents. If the block fails, the temporary file is removed.
+
+    Args:
+        path (str): The file to write. Its directory is created if needed.
+        mode (str): 'wb' for bytes or 'w' for text.
+        encoding (str): The encoding of text.
+        permissions (int): The permission bits of the file, FILE_MODE by default.
+
+    Yields:
+        file: The open temporary file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=directory or '.', prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, mode, encoding=encoding) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temporary_path, permissions)
+        os.replace(temporary_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporary_path)
+        raise
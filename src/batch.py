@@ -0,0 +1,380 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+from src.image.character_info import get_closest_characters
+from src.image.game_info import GameInfo
+from src.image.memory_budget import MEMORY_CEILING
+from src.image.image_writer import (
+    IMAGE_FORMAT, IMAGE_FORMAT_ALIASES, IMAGE_FORMATS, IMAGE_QUALITY, IMAGE_WRITER,
+    PNG_COMPRESS_LEVEL, ImageWriter
+)
+from src.image.text_to_image import (
+    MAX_BATCH_SIZE, MEMORY_RECORDER, build_prompts, choose_seed, get_generation_params,
+    render_prompts
+)
+from src.metrics import METRICS, enable_metrics_log
+from src.profiling import capture_profile
+
+JOB_DEFAULTS = {
+    "facial_expression": "smile",
+    "looking_at": "viewer",
+    "indoors": "indoors",
+    "daytime": "night",
+    "additional_tags": ""
+}
+REQUIRED_INPUTS = ('anime_name', 'game_name')
+QUEUE_SIZE = 4
+_DONE = object()
+
+
+def read_jobs(path):
+    """
+    Read generation jobs from a CSV file with a header row or a JSONL file.
+
+    Every job needs an 'anime_name' and a 'game_name'; the other inputs of the main window
+    default to JOB_DEFAULTS. Jobs without an 'id' are numbered by their position in the file,
+    jobs without a 'seed' get the seed of the run.
+
+    Yields:
+        dict: The jobs in file order.
+
+    Raises:
+        ValueError: If a row is malformed or lacks a required input.
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for number, row in enumerate(rows, 1):
+            if not isinstance(row, dict) or not all(row.get(key) for key in REQUIRED_INPUTS):
+                raise ValueError(f"Job {number} in {path} needs an "
+                                 f"{' and a '.join(REQUIRED_INPUTS)}")
+            job = dict(JOB_DEFAULTS, **{key: value for key, value in row.items()
+                                        if value not in (None, '')})
+            job['id'] = str(job.get('id', number))
+            yield job
+
+
+class ProgressManifest:
+    """
+    Append-only record of the finished jobs of a batch run, so an interrupted run can resume.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize ProgressManifest, reading the jobs finished by earlier runs.
+
+        Args:
+            path (str): The path of the JSONL manifest.
+        """
+        self.path = path
+        self.finished = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.finished[entry['id']] = entry['files']
+
+    def is_finished(self, job_id):
+        """
+        Check whether a job was finished by this or an earlier run.
+        """
+        with self._lock:
+            return job_id in self.finished
+
+    def record(self, job_id, files):
+        """
+        Record a finished job and its image files, flushed to disk right away.
+        """
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'id': job_id, 'files': files}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self.finished[job_id] = files
+
+
+class Stage:
+    """
+    One step of a StagedPipeline, run by its own worker threads.
+    """
+
+    def __init__(self, name, function, workers=1):
+        """
+        Initialize Stage.
+
+        Args:
+            name (str): The name shown in the throughput report.
+            function (callable): Takes a job and returns it for the next stage, or None to drop
+                it.
+            workers (int): The number of threads running the stage.
+        """
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def process(self, job):
+        """
+        Run the stage on a job, counting its time and failures.
+
+        Returns:
+            dict: The job for the next stage, None if it failed or was dropped.
+        """
+        start = time.perf_counter()
+        try:
+            result = self.function(job)
+        except Exception as error:  # pylint: disable=W0718
+            print(f"{self.name} failed for job {job.get('id')}: {error!r}")
+            result = None
+            failed = 1
+        else:
+            failed = 0
+        with self._lock:
+            self.busy_seconds += time.perf_counter() - start
+            self.processed += 1 - failed
+            self.failed += failed
+        return result
+
+    def record_failure(self, job_id, error):
+        """
+        Count a job as failed whose work the stage handed to the background, e.g. a write.
+        """
+        print(f"{self.name} failed for job {job_id}: {error!r}")
+        with self._lock:
+            self.processed -= 1
+            self.failed += 1
+
+    def stats(self, wall_seconds):
+        """
+        Get the throughput of the stage.
+
+        Returns:
+            dict: The processed and failed jobs, the jobs per busy second of one worker and the
+                share of the run the workers were busy.
+        """
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'failed': self.failed,
+                'jobs_per_second': (self.processed / self.busy_seconds
+                                    if self.busy_seconds else 0.0),
+                'utilization': (self.busy_seconds / (wall_seconds * self.workers)
+                                if wall_seconds else 0.0)
+            }
+
+
+class StagedPipeline:
+    """
+    Streams jobs through stages connected by bounded queues.
+
+    All stages run at the same time, so e.g. network lookups for upcoming jobs overlap with the
+    diffusion of the current one, while the bounded queues keep fast stages from running far
+    ahead of slow ones.
+    """
+
+    def __init__(self, stages, queue_size=QUEUE_SIZE):
+        """
+        Initialize StagedPipeline.
+
+        Args:
+            stages (list[Stage]): The stages in processing order.
+            queue_size (int): The number of jobs that may wait in front of each stage.
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.wall_seconds = 0.0
+        self._feed_error = None
+
+    def run(self, jobs):
+        """
+        Process jobs until all of them passed the last stage.
+
+        Args:
+            jobs (iterable[dict]): The jobs, read lazily.
+
+        Raises:
+            Exception: The error that stopped reading the jobs, after the jobs read before it
+                passed all stages.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(jobs, queues), daemon=True)]
+        threads += [threading.Thread(target=self._work, args=(index, queues, remaining, lock),
+                                     daemon=True)
+                    for index, stage in enumerate(self.stages) for _ in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - start
+        if self._feed_error is not None:
+            error, self._feed_error = self._feed_error, None
+            raise error
+
+    def _feed(self, jobs, queues):
+        try:
+            for job in jobs:
+                queues[0].put(job)
+        except Exception as error:  # pylint: disable=W0718
+            self._feed_error = error
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+
+    def _work(self, index, queues, remaining, lock):
+        stage = self.stages[index]
+        has_next = index + 1 < len(self.stages)
+        while (job := queues[index].get()) is not _DONE:
+            result = stage.process(job)
+            if result is not None and has_next:
+                queues[index + 1].put(result)
+        with lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and has_next:
+            for _ in range(self.stages[index + 1].workers):
+                queues[index + 1].put(_DONE)
+
+    def report(self):
+        """
+        Get the throughput of every stage of the last run.
+
+        Returns:
+            dict: The stats of each stage by name.
+        """
+        return {stage.name: stage.stats(self.wall_seconds) for stage in self.stages}
+
+
+# pylint: disable-next=R0913,R0917
+def build_stages(output_dir, manifest, lookup_workers=2, max_batch_size=MAX_BATCH_SIZE,
+                 profile=False, writer=None, seed=None):
+    """
+    Build the stages generating and saving the images of a job.
+
+    Args:
+        output_dir (str): The directory the images are saved to.
+        manifest (ProgressManifest): Records the saved jobs.
+        lookup_workers (int): The number of threads of each network-bound stage.
+        max_batch_size (int): The maximum number of variants rendered in one batch.
+        profile (bool): Whether to capture a profile of the diffusion of every job.
+        writer (ImageWriter): Writes the images in the background, IMAGE_WRITER by default.
+        seed (int): The seed of the jobs without one, a random one per job by default.
+
+    Returns:
+        list[Stage]: Character resolution, game metadata, prompt building, diffusion and
+            saving. Saving only queues the images; a job is recorded in the manifest once its
+            images are written, and counted as failed by the save stage if writing fails.
+    """
+    game_info = GameInfo()
+    writer = writer or IMAGE_WRITER
+
+    def resolve_characters(job):
+        job['processed_anime_name'] = get_closest_characters(job['anime_name'])
+        return job
+
+    def fetch_game_metadata(job):
+        keywords = game_info.get_game_keywords(job['game_name'])
+        job['recency'], job['game_tags'] = keywords or ('', [])
+        return job
+
+    def build_job_prompts(job):
+        job.setdefault('seed', seed)
+        choose_seed(job)
+        job['prompts'] = build_prompts(job)
+        return job
+
+    def diffuse(job):
+        with capture_profile(dict(job)) if profile else contextlib.nullcontext():
+            job['images'] = render_prompts(job['prompts'], max_batch_size, seed=job['seed'])
+        return job
+
+    def save(job):
+        job_id = job['id']
+
+        def record(written):
+            if written.exception():
+                save_stage.record_failure(job_id, written.exception())
+                return
+            manifest.record(job_id, written.result())
+            print(f"Saved job {job_id}: {', '.join(written.result())}")
+
+        writer.submit_all(job.pop('images'), os.path.join(output_dir, job_id),
+                          [get_generation_params(prompt, job['seed']) for prompt in job['prompts']]
+                          ).add_done_callback(record)
+        return job
+
+    save_stage = Stage("save", save)
+    return [
+        Stage("characters", resolve_characters, lookup_workers),
+        Stage("game metadata", fetch_game_metadata, lookup_workers),
+        Stage("prompts", build_job_prompts),
+        Stage("diffusion", diffuse),
+        save_stage
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate images for a CSV or JSONL of jobs.")
+    parser.add_argument('jobs', help="CSV or JSONL file with anime_name and game_name per job")
+    parser.add_argument('--output', default='./output/batch')
+    parser.add_argument('--manifest', help="progress manifest, <output>/manifest.jsonl by default")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--lookup-workers', type=int, default=2)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--seed', type=int,
+                        help="seed of the jobs without one, a random one per job by default")
+    parser.add_argument('--profile', action='store_true',
+                        help="capture a cProfile and torch profiler trace of every job")
+    parser.add_argument('--format', choices=[*IMAGE_FORMATS, *IMAGE_FORMAT_ALIASES],
+                        default=IMAGE_FORMAT)
+    parser.add_argument('--quality', type=int, default=IMAGE_QUALITY,
+                        help="WebP and JPEG quality from 1 to 100")
+    parser.add_argument('--compress-level', type=int, default=PNG_COMPRESS_LEVEL,
+                        help="PNG compression level from 0 to 9")
+    args = parser.parse_args()
+    enable_metrics_log()
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest = ProgressManifest(args.manifest or os.path.join(args.output, 'manifest.jsonl'))
+    jobs = (job for job in read_jobs(args.jobs) if not manifest.is_finished(job['id']))
+    writer = ImageWriter(args.format, args.quality, args.compress_level)
+    pipeline = StagedPipeline(build_stages(args.output, manifest, args.lookup_workers,
+                                           args.max_batch_size, args.profile, writer,
+                                           args.seed),
+                              args.queue_size)
+    pipeline.run(jobs)
+    writer.close()
+
+    print(f"Finished in {pipeline.wall_seconds:.1f} s")
+    for name, stats in pipeline.report().items():
+        print(f"{name:<15} {stats['processed']:6d} done {stats['failed']:6d} failed "
+              f"{stats['jobs_per_second']:8.2f} jobs/s {stats['utilization']:6.1%} busy")
+    for name, histogram in METRICS.snapshot()['histograms'].items():
+        mean = histogram['sum'] / histogram['count']
+        print(f"{name:<20} {histogram['count']:6d} spans {mean:8.3f} s mean "
+              f"{histogram['max']:8.3f} s max")
+    for stage, peak in MEMORY_RECORDER.peaks.items():
+        print(f"Peak memory during {stage}: {peak / 1024 ** 2:.0f} MB")
+    if MEMORY_CEILING:
+        for stage, peak in MEMORY_RECORDER.over_budget(MEMORY_CEILING).items():
+            print(f"Warning: {stage} exceeded MEMORY_CEILING_MB with {peak / 1024 ** 2:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
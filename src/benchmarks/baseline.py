@@ -0,0 +1,39 @@
+import json
+import sys
+
+
+def add_baseline_arguments(parser, tolerance=0.2):
+    """
+    Add the --output, --baseline and --tolerance options of a benchmark command.
+    """
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="fail if slower than the results in this JSON file")
+    parser.add_argument('--tolerance', type=float, default=tolerance,
+                        help="allowed slowdown relative to the baseline, e.g. 0.2 for 20%%")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Get the measurements that are slower than the baseline by more than the tolerance.
+    """
+    return {name: (seconds, baseline[name]) for name, seconds in results.items()
+            if name in baseline and seconds > baseline[name] * (1 + tolerance)}
+
+
+def handle_results(results, args):
+    """
+    Save the results and compare them with a baseline as requested by the command line options.
+
+    Exits with status 1 if a measurement regressed.
+    """
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for name, (seconds, baseline) in regressions.items():
+            print(f"Regression: {name} took {seconds * 1000:.3f} ms, "
+                  f"baseline {baseline * 1000:.3f} ms")
+        if regressions:
+            sys.exit(1)
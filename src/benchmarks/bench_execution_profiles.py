@@ -0,0 +1,57 @@
+import argparse
+import statistics
+import time
+
+from src.image.execution_profile import configure_threads, resolve_profile
+from src.image.text_to_image import load_diffusion_pipeline, torch
+
+TEST_MODEL = "hf-internal-testing/tiny-stable-diffusion-xl-pipe"
+CPU_PROFILES = ['cpu-fp32', 'cpu-bf16', 'cpu', 'cpu-compile']
+
+
+def seconds_per_step(pipe, steps, size):
+    """
+    Render one image and get the median duration of its diffusion steps.
+    """
+    step_times = [time.perf_counter()]
+
+    def on_step_end(_pipe, _step, _timestep, callback_kwargs):
+        step_times.append(time.perf_counter())
+        return callback_kwargs
+
+    pipe(prompt="1girl, solo, upper body", num_inference_steps=steps, width=size, height=size,
+         callback_on_step_end=on_step_end)
+    return statistics.median(end - start for start, end in zip(step_times, step_times[1:]))
+
+
+def run(model=TEST_MODEL, profiles=None, steps=8, size=256):
+    """
+    Measure the seconds per diffusion step of every execution profile.
+
+    Returns:
+        dict: Seconds per step by profile name.
+    """
+    results = {}
+    for name in profiles or CPU_PROFILES:
+        profile = resolve_profile(name)
+        configure_threads(profile)
+        pipe = load_diffusion_pipeline(model, getattr(torch, profile['dtype']), profile['device'],
+                                       profile)
+        seconds_per_step(pipe, 1, size)  # warm up, and compile for 'cpu-compile'
+        results[name] = seconds_per_step(pipe, steps, size)
+        print(f"{name:<12} {profile['dtype']:<9} {results[name] * 1000:8.1f} ms/step")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure seconds per step of execution profiles.")
+    parser.add_argument('--model', default=TEST_MODEL)
+    parser.add_argument('--profiles', nargs='+', default=CPU_PROFILES)
+    parser.add_argument('--steps', type=int, default=8)
+    parser.add_argument('--size', type=int, default=256)
+    args = parser.parse_args()
+    run(args.model, args.profiles, args.steps, args.size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import contextlib
+import functools
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, patch
+
+from src.benchmarks.baseline import add_baseline_arguments, handle_results
+from src.benchmarks.bench_summary_keywords import build_corpus
+from src.image import character_info, game_info, igdb_client, text_to_image, twitch_auth
+from src.image.character_catalog import CharacterCatalog, format_character_line
+from src.image.result_cache import ResultCache
+
+SYLLABLES = ['a', 'ka', 'ki', 'ko', 'mi', 'na', 'ri', 'ru', 'sa', 'shi', 'to', 'yu', 'zu', 'ne',
+             'ha', 'ro', 'chi', 'ma', 'no', 'ta']
+CHARACTER_COUNTS = [10_000, 100_000]
+CHARACTER_QUERIES = ['kita ikuyo', 'ikuyo kita', 'kitta ikuyou', 'shima rinko']
+INPUT_VALUES = {
+    "anime_name": "kita ikuyo",
+    "game_name": "Tekken 7",
+    "gender": "1girl",
+    "facial_expression": "smile",
+    "looking_at": "viewer",
+    "indoors": "indoors",
+    "daytime": "day",
+    "additional_tags": "school uniform"
+}
+FAKE_GAME = {
+    "id": 7498,
+    "name": "Tekken 7",
+    "first_release_date": 1424217600,
+    "genres": [4, 25],
+    "summary": "Experience the epic conclusion of the Mishima clan and unravel the reasons "
+               "behind each step of their ceaseless fight."
+}
+FAKE_GENRES = [{"id": 4, "name": "Fighting"}, {"id": 25, "name": "Hack and slash/Beat 'em up"}]
+
+
+def measure(function, number=1, repeats=5):
+    """
+    Get the median seconds per call of a function over several repeats.
+    """
+    function()  # warm up
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        durations.append((time.perf_counter() - start) / number)
+    return statistics.median(durations)
+
+
+def build_character_lines(count, seed=0):
+    """
+    Build wildcard lines of made up characters, including the queried 'kita ikuyo'.
+    """
+    rng = random.Random(seed)
+
+    def word():
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    lines = [format_character_line(rng.choice(['1girl', '1boy, male focus']),
+                                   f'{word()} {word()}', f'{word()} \\(series\\)')
+             for _ in range(count - 1)]
+    lines.insert(rng.randrange(count), format_character_line('1girl', 'kita ikuyo',
+                                                             'bocchi the rock!'))
+    return lines
+
+
+@contextlib.contextmanager
+def stub_characters(lines):
+    """
+    Serve the character list from memory instead of the catalog file or the network.
+    """
+    catalog = CharacterCatalog.from_lines(lines)
+    with patch.dict(character_info._CATALOG_CACHE,  # pylint: disable=W0212
+                    {'catalog': catalog}, clear=True):
+        with patch.dict(character_info._INDEX_CACHE, clear=True):  # pylint: disable=W0212
+            yield
+
+
+def bench_closest_characters(repeats):
+    """
+    Measure fuzzy matching of character names against lists of CHARACTER_COUNTS entries.
+    """
+    results = {}
+    for count in CHARACTER_COUNTS:
+        with stub_characters(build_character_lines(count)):
+            results[f'closest characters {count}'] = measure(lambda: [
+                character_info.get_closest_characters(query) for query in CHARACTER_QUERIES
+            ], repeats=repeats) / len(CHARACTER_QUERIES)
+    return results
+
+
+def bench_summary_keywords(repeats):
+    """
+    Measure keyword extraction per game summary.
+    """
+    corpus = build_corpus(200)
+
+    def extract():
+        game_info.is_relevant_adjective.cache_clear()
+        for summary in corpus:
+            game_info.get_summary_keywords(summary)
+
+    return {'summary keywords': measure(extract, repeats=repeats) / len(corpus)}
+
+
+def bench_build_prompts(repeats):
+    """
+    Measure the prompt assembly of create_image for three character variants.
+    """
+    image_params = dict(INPUT_VALUES, recency='recent', game_tags=['fighting', 'mishima', 'clan'],
+                        processed_anime_name=['kita ikuyo', 'kita aurora', 'ikuyo kita'])
+    return {'build prompts': measure(lambda: text_to_image.build_prompts(image_params),
+                                     number=10000, repeats=repeats)}
+
+
+@functools.lru_cache(maxsize=None)
+def get_qt_application():
+    """
+    Get the QApplication needed to create pixmaps, without a display if there is none.
+    """
+    from PySide6.QtWidgets import QApplication  # pylint: disable=C0415,E0611
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QApplication.instance() or QApplication([])
+
+
+def bench_pil2pixmap(repeats):
+    """
+    Measure the conversion of generated images to pixmaps.
+    """
+    from PIL import Image  # pylint: disable=C0415
+    from src.main import pil2pixmap  # pylint: disable=C0415
+    get_qt_application()
+    images = {mode: Image.new(mode, (text_to_image.IMAGE_SIZE, text_to_image.IMAGE_SIZE))
+              for mode in ('RGB', 'RGBA')}
+    return {f'pil2pixmap {mode}': measure(lambda image=image: pil2pixmap(image), number=10,
+                                          repeats=repeats)
+            for mode, image in images.items()}
+
+
+class FakeIGDBHandler(BaseHTTPRequestHandler):
+    """
+    Answers IGDB games and genres queries with FAKE_GAME and FAKE_GENRES.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=C0103
+        """
+        Answer an IGDB query.
+        """
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps([FAKE_GAME] if self.path.endswith('/games') else FAKE_GENRES).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        return
+
+
+def stub_pipeline(*_key):
+    """
+    Get a diffusion pipeline that only runs the step callbacks and returns placeholder images.
+    """
+    def pipe(prompt, callback_on_step_end=None, **kwargs):
+        for step in range(kwargs['num_inference_steps']):
+            callback_on_step_end(pipe, step, step, {})
+        return SimpleNamespace(images=[object() for _ in prompt])
+    return pipe
+
+
+@contextlib.contextmanager
+def stub_services(base_url):
+    """
+    Route IGDB requests to a local server and diffusion to stub_pipeline.
+    """
+    token_manager = twitch_auth.TwitchTokenManager('benchmark', 'benchmark', path=None)
+    token_manager.token = {'access_token': 'benchmark', 'expires_at': time.time() + 86400}
+    patches = [
+        patch.dict(twitch_auth._DEFAULT_MANAGER,  # pylint: disable=W0212
+                   {'manager': token_manager}),
+        patch.dict(igdb_client._DEFAULT_TRANSPORT,  # pylint: disable=W0212
+                   {'transport': igdb_client.IGDBTransport(base_url)}),
+        patch.object(game_info.GENRE_REGISTRY, 'path', None),
+        patch.object(text_to_image, 'torch', MagicMock()),
+        patch.object(text_to_image, 'get_pipeline_key', return_value=('stub', None, 'cpu')),
+        patch.object(text_to_image, 'PIPELINE_REGISTRY', Mock(get=stub_pipeline)),
+        patch.object(text_to_image, 'PROMPT_EMBEDDINGS',
+                     Mock(get=lambda _pipe, _key, prompts: {'prompt': prompts})),
+        patch.object(text_to_image, 'RESULT_CACHE', ResultCache(max_bytes=0)),
+        stub_characters(build_character_lines(CHARACTER_COUNTS[0]))
+    ]
+    with contextlib.ExitStack() as stack:
+        for stub in patches:
+            stack.enter_context(stub)
+        yield
+
+
+def bench_process_image(repeats):
+    """
+    Measure process_image end to end with a fake IGDB server and a stub diffusion pipeline.
+    """
+    from src import main as application  # pylint: disable=C0415
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeIGDBHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Warm up in the foreground, so no loading thread outlives the stubs
+    warm_up = functools.partial(text_to_image.warm_up_pipeline, background=False)
+    try:
+        with stub_services(f"http://127.0.0.1:{server.server_address[1]}/v4"), \
+                patch.object(application, 'warm_up_pipeline', warm_up):
+            return {'process image': measure(
+                lambda: application.AnimeImageGenerator().process_image(
+                    dict(INPUT_VALUES), on_status=lambda _status: None),
+                repeats=repeats)}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+BENCHMARKS = {
+    'closest_characters': bench_closest_characters,
+    'summary_keywords': bench_summary_keywords,
+    'build_prompts': bench_build_prompts,
+    'pil2pixmap': bench_pil2pixmap,
+    'process_image': bench_process_image
+}
+
+
+def run(names=None, repeats=5):
+    """
+    Run the hot path benchmarks, skipping those whose dependencies or data are missing.
+
+    Returns:
+        dict: Seconds per call by measurement name.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        try:
+            measured = BENCHMARKS[name](repeats)
+        except (ImportError, LookupError) as error:
+            print(f"{name:<40} skipped: {error.__class__.__name__}: {str(error).strip()[:60]}")
+            continue
+        for measurement, seconds in measured.items():
+            print(f"{measurement:<40} {seconds * 1000:10.4f} ms")
+        results.update(measured)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the generation hot paths.")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS))
+    parser.add_argument('--repeats', type=int, default=5)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    handle_results(run(args.only, args.repeats), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import time
+
+from src.image.prompt_embeddings import PromptEmbeddingCache
+from src.image.text_to_image import (
+    MODEL, NEGATIVE_PROMPT, build_prompts, load_diffusion_pipeline, torch
+)
+
+SAMPLE_PARAMS = {
+    "recency": "newest",
+    "processed_anime_name": ['1boy, male focus, uzumaki naruto, naruto \\(series\\)',
+                             '1boy, male focus, uzumaki boruto, naruto \\(series\\)',
+                             '1girl, uzumaki himawari, naruto \\(series\\)'],
+    "anime_name": "Naruto Uzumaki",
+    "game_name": "Final Fantasy VII",
+    "game_tags": ["Action", "RPG"],
+    "facial_expression": "smiling",
+    "looking_at": "viewer",
+    "indoors": "indoors",
+    "daytime": "night"
+}
+
+
+def measure(name, encode, prompts):
+    """
+    Encode every prompt on its own, like one image per pipeline call, and print the time per
+    image.
+
+    Returns:
+        float: The seconds per image.
+    """
+    start = time.perf_counter()
+    for prompt in prompts:
+        encode(prompt)
+    seconds = (time.perf_counter() - start) / len(prompts)
+    print(f"{name:<10} {seconds * 1000:8.2f} ms/image")
+    return seconds
+
+
+def run(model=MODEL, requests=4):
+    """
+    Compare the text encoding time per image with and without the prompt embedding cache, for
+    repeated requests of the same character variants.
+    """
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    dtype = torch.float16 if device == 'cuda' else torch.float32
+    pipe = load_diffusion_pipeline(model, dtype, device)
+    prompts = build_prompts(SAMPLE_PARAMS) * requests
+    cache = PromptEmbeddingCache(NEGATIVE_PROMPT)
+
+    def encode_uncached(prompt):
+        with torch.no_grad():
+            pipe.encode_prompt(prompt=[prompt], num_images_per_prompt=1,
+                               do_classifier_free_guidance=True,
+                               negative_prompt=[NEGATIVE_PROMPT])
+
+    encode_uncached(prompts[0])  # warm up the text encoders
+    uncached = measure("uncached", encode_uncached, prompts)
+    cached = measure("cached", lambda prompt: cache.get(pipe, (model, dtype, device), [prompt]),
+                     prompts)
+    print(f"Saved {(uncached - cached) * 1000:.2f} ms/image, {cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the text encoding time per image.")
+    parser.add_argument('--model', default=MODEL,
+                        help="e.g. hf-internal-testing/tiny-stable-diffusion-xl-pipe")
+    parser.add_argument('--requests', type=int, default=4,
+                        help="how often the same three character variants are requested")
+    args = parser.parse_args()
+    run(args.model, args.requests)
+
+
+if __name__ == "__main__":
+    main()
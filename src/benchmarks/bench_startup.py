@@ -0,0 +1,76 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from src.benchmarks.baseline import add_baseline_arguments, handle_results
+
+IMPORTED_MODULES = ['src.image.character_info', 'src.image.game_info',
+                    'src.image.text_to_image', 'src.main']
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+FIRST_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+import sys
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+from src.main import AnimeCharacterImageGenerator
+app = QApplication(sys.argv)
+window = AnimeCharacterImageGenerator()
+window.show()
+
+def painted():
+    print(time.perf_counter() - start)
+    app.quit()
+
+QTimer.singleShot(0, painted)
+app.exec()
+"""
+
+
+def time_script(script):
+    """
+    Run a script in a fresh interpreter and return the seconds it prints.
+    """
+    environment = dict(os.environ, PREFETCH_DEPENDENCIES='0')
+    environment.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                            check=True, env=environment).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def run(runs=5):
+    """
+    Measure the median import time of the application modules and the time to first paint.
+
+    Returns:
+        dict: Seconds per measurement.
+    """
+    results = {f'import {module}': statistics.median(
+        time_script(IMPORT_SCRIPT.format(module=module)) for _ in range(runs))
+        for module in IMPORTED_MODULES}
+    results['first paint'] = statistics.median(time_script(FIRST_PAINT_SCRIPT)
+                                               for _ in range(runs))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure application startup time.")
+    parser.add_argument('--runs', type=int, default=5)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    for name, seconds in results.items():
+        print(f"{name:<40} {seconds * 1000:8.1f} ms")
+    handle_results(results, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import random
+import sys
+import time
+
+from nltk.corpus import wordnet as wn
+from nltk.tag import pos_tag
+from nltk.tokenize import word_tokenize
+
+from src.image.game_info import (
+    FILTER_WORDS, KEYWORD_TAGS, get_summary_keywords, get_summary_keywords_many,
+    is_relevant_adjective
+)
+
+SUMMARY_SENTENCES = [
+    "Experience the epic conclusion of the Mishima clan and unravel the reasons behind each "
+    "step of their ceaseless fight.",
+    "Powered by Unreal Engine 4, Tekken 7 features stunning story-driven cinematic battles and "
+    "intense duels that can be enjoyed with friends and rivals alike.",
+    "Explore a vast open world filled with ancient ruins, hidden treasures and dangerous "
+    "creatures.",
+    "Build your own colony on a distant planet and manage scarce resources to keep your settlers "
+    "alive.",
+    "A fast-paced roguelike where every run reshapes the dungeon, its enemies and its rewards.",
+    "Lead a small band of mercenaries through a tactical campaign of turn-based battles.",
+    "Race across neon cities at breakneck speed in a futuristic anti-gravity league.",
+    "Solve intricate puzzles in a quiet lighthouse while uncovering the memories of its keeper.",
+]
+
+
+def build_corpus(size, seed=0):
+    """
+    Build a corpus of summaries from shuffled sample sentences.
+    """
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(SUMMARY_SENTENCES, rng.randint(2, 4))) for _ in range(size)]
+
+
+def get_summary_keywords_uncached(summary):
+    """
+    The keyword extraction without WordNet memoization or early stopping, as a baseline.
+    """
+    tagged = pos_tag(word_tokenize(summary))
+    summary_keywords = [word for word, tag in tagged if
+                        tag in KEYWORD_TAGS
+                        and bool(wn.synsets(word))
+                        and all(FILTER_WORD not in word for FILTER_WORD in FILTER_WORDS)]
+    return summary_keywords[:5]
+
+
+def measure(name, function, corpus):
+    """
+    Run a keyword extraction over the corpus and print its throughput.
+
+    Returns:
+        list: The extracted keywords.
+    """
+    is_relevant_adjective.cache_clear()
+    start = time.perf_counter()
+    result = function(corpus)
+    seconds = time.perf_counter() - start
+    print(f"{name:<12} {len(corpus) / seconds:10.1f} summaries/s")
+    return result
+
+
+def run(size=1000):
+    """
+    Compare the keyword extraction strategies on a corpus of the given size.
+    """
+    corpus = build_corpus(size)
+    get_summary_keywords_many(corpus[:1])  # load tokenizer, tagger and WordNet up front
+
+    baseline = measure("uncached", lambda summaries: [
+        get_summary_keywords_uncached(summary) for summary in summaries], corpus)
+    cached = measure("memoized", lambda summaries: [
+        get_summary_keywords(summary) for summary in summaries], corpus)
+    batched = measure("batched", get_summary_keywords_many, corpus)
+    if not baseline == cached == batched:
+        raise AssertionError("Keyword extraction strategies disagree")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,221 @@
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+from src.atomic_file import atomic_write
+
+MAGIC = b'AGCC'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIIId')  # magic, version, entries, series, genders, blob size, created
+FIELD_SEPARATOR = ', '
+DEFAULT_CATALOG_PATH = './resources/characters.catalog'
+
+
+def parse_character_line(line):
+    """
+    Split a wildcard line like "1boy, male focus, uzumaki naruto, naruto \\(series\\)".
+
+    Returns:
+        tuple: The gender tags, the character name and the series. Lines that do not follow the
+            format are kept whole as the name.
+    """
+    fields = line.split(FIELD_SEPARATOR)
+    if len(fields) < 3 or not (fields[0] or fields[-1]):
+        return '', line, ''
+    return FIELD_SEPARATOR.join(fields[:-2]), fields[-2], fields[-1]
+
+
+def format_character_line(gender, name, series):
+    """
+    Join parsed fields back into the wildcard line they came from.
+    """
+    if not (gender or series):
+        return name
+    return FIELD_SEPARATOR.join((gender, name, series))
+
+
+def _string_table(strings):
+    offsets = array('I', [0])
+    blob = bytearray()
+    for string in strings:
+        blob += string.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _cast_arrays(data, position, layout):
+    """
+    Cast consecutive, 4-byte aligned arrays out of a buffer.
+
+    Returns:
+        tuple: The arrays by name and the position after the last one.
+    """
+    arrays = {}
+    for key, count, code in layout:
+        size = count * struct.calcsize(code)
+        arrays[key] = data[position:position + size].cast(code)
+        position += size + (-size % 4)
+    return arrays, position
+
+
+def _pad(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+class CharacterCatalog:
+    """
+    Compact character list with gender tags, names and series stored as separate fields.
+
+    Names are kept in one UTF-8 blob addressed by an offset array; series and gender tags are
+    interned into small tables referenced by id. The persisted file has the same layout, so it is
+    memory-mapped instead of parsed on load.
+    """
+
+    def __init__(self, tables, created=None):
+        """
+        Initialize CharacterCatalog.
+
+        Args:
+            tables (dict): The 'name', 'series' and 'gender' string tables as (offsets, blob) pairs
+                and the per entry 'series_ids' and 'gender_ids'.
+            created (float): The time the catalog was built, defaults to now.
+        """
+        self._tables = tables
+        self.created = time.time() if created is None else created
+        self._series = [self._string('series', i) for i in range(len(tables['series'][0]) - 1)]
+        self._genders = [self._string('gender', i) for i in range(len(tables['gender'][0]) - 1)]
+        self._lines = {}
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        Build a catalog from wildcard lines, skipping blank ones.
+        """
+        names, series_ids, gender_ids = [], array('I'), array('H')
+        series_table, gender_table = {}, {}
+        for line in lines:
+            line = line.strip('\r')
+            if not line.strip():
+                continue
+            gender, name, series = parse_character_line(line)
+            names.append(name)
+            series_ids.append(series_table.setdefault(series, len(series_table)))
+            gender_ids.append(gender_table.setdefault(gender, len(gender_table)))
+        return cls({'name': _string_table(names), 'series': _string_table(series_table),
+                    'gender': _string_table(gender_table),
+                    'series_ids': series_ids, 'gender_ids': gender_ids})
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-map a catalog file written by save.
+        """
+        with open(path, 'rb') as file:
+            data = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        header = HEADER.unpack_from(data)
+        if header[:2] != (MAGIC, VERSION):
+            raise ValueError(f"'{path}' is not a character catalog")
+        entries, series, genders = header[2:5]
+
+        arrays, position = _cast_arrays(data, HEADER.size, (
+            ('name', entries + 1, 'I'), ('series', series + 1, 'I'),
+            ('gender', genders + 1, 'I'), ('series_ids', entries, 'I'),
+            ('gender_ids', entries, 'H')))
+        tables = {'series_ids': arrays['series_ids'], 'gender_ids': arrays['gender_ids']}
+        for key in ('name', 'series', 'gender'):
+            end = position + arrays[key][-1]
+            tables[key] = (arrays[key], data[position:end])
+            position = end
+        return cls(tables, created=header[6])
+
+    def save(self, path):
+        """
+        Write the catalog to disk, replacing any previous file atomically.
+        """
+        tables = self._tables
+        blob = b''.join(bytes(tables[key][1]) for key in ('name', 'series', 'gender'))
+        parts = [HEADER.pack(MAGIC, VERSION, len(self), len(self._series), len(self._genders),
+                             len(blob), self.created)]
+        parts += [_pad(bytes(tables[key][0])) for key in ('name', 'series', 'gender')]
+        parts += [_pad(bytes(tables['series_ids'])), _pad(bytes(tables['gender_ids'])), blob]
+
+        with atomic_write(path) as file:
+            file.write(b''.join(parts))
+
+    def __len__(self):
+        return len(self._tables['series_ids'])
+
+    def age(self):
+        """
+        Get the number of seconds since the catalog was built.
+        """
+        return time.time() - self.created
+
+    def name(self, index):
+        """
+        Get the character name of an entry.
+        """
+        return self._string('name', index)
+
+    def series(self, index):
+        """
+        Get the series of an entry.
+        """
+        return self._series[self._tables['series_ids'][index]]
+
+    def gender(self, index):
+        """
+        Get the gender tags of an entry, e.g. "1girl" or "1boy, male focus".
+        """
+        return self._genders[self._tables['gender_ids'][index]]
+
+    def line(self, index):
+        """
+        Get an entry as the original wildcard line.
+        """
+        return format_character_line(self.gender(index), self.name(index), self.series(index))
+
+    def select(self, series=None, gender=None):
+        """
+        Get the ids of the entries of a series and/or with a gender tag.
+
+        Args:
+            series (str): Optional series to restrict to, compared case-insensitively.
+            gender (str): Optional gender tag to restrict to, e.g. "1girl".
+
+        Returns:
+            list[int]: The matching entry ids in catalog order.
+        """
+        series_ids = None if series is None else {
+            i for i, name in enumerate(self._series) if name.lower() == series.lower()}
+        gender_ids = None if gender is None else {
+            i for i, tags in enumerate(self._genders) if gender in tags.split(FIELD_SEPARATOR)}
+        return [i for i in range(len(self))
+                if (series_ids is None or self._tables['series_ids'][i] in series_ids)
+                and (gender_ids is None or self._tables['gender_ids'][i] in gender_ids)]
+
+    def lines(self, series=None, gender=None):
+        """
+        Get the wildcard lines of the catalog, optionally restricted like select.
+
+        The result is built once per filter and shared between calls.
+        """
+        key = (series, gender)
+        if key not in self._lines:
+            ids = range(len(self)) if key == (None, None) else self.select(series, gender)
+            self._lines[key] = [self.line(i) for i in ids]
+        return self._lines[key]
+
+    def _string(self, table, index):
+        offsets, blob = self._tables[table]
+        return bytes(blob[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.image.character_catalog <characterfull.txt> [catalog path]
+    with open(sys.argv[1], encoding='utf-8') as source:
+        catalog = CharacterCatalog.from_lines(source.read().split("\n"))
+    catalog.save(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CATALOG_PATH)
+    print(f"Saved {len(catalog)} characters")
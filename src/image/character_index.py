@@ -0,0 +1,185 @@
+import math
+from collections import Counter
+from itertools import compress
+
+from rapidfuzz import fuzz as rfuzz
+from rapidfuzz import process as rprocess
+from thefuzz import utils
+
+
+SEED_FACTOR = 8
+SCORE_MARGIN = 1e-3
+
+
+def sort_tokens(text):
+    """
+    Sort the whitespace separated tokens of a string, like the token sort scorers do.
+    """
+    return " ".join(sorted(text.split()))
+
+
+def process_query(query):
+    """
+    Apply the preprocessing thefuzz applies to a query before partial_token_sort_ratio.
+    """
+    return sort_tokens(utils.full_process(utils.full_process(query), force_ascii=True))
+
+
+def process_choice(choice):
+    """
+    Apply the preprocessing thefuzz applies to a choice before partial_token_sort_ratio.
+    """
+    return sort_tokens(utils.full_process(choice, force_ascii=True))
+
+
+def _to_bitset(ids, size):
+    buffer = bytearray((size + 7) // 8)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+_BINARY_DIGITS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def _from_bitset(bits):
+    selectors = bin(bits)[:1:-1].encode().translate(_BINARY_DIGITS)
+    return list(compress(range(len(selectors)), selectors))
+
+
+def _bit_sliced_sum(bitsets):
+    """
+    Add up bitsets position-wise, returning the binary digits of every count (lowest first).
+    """
+    digits = []
+    for carry in bitsets:
+        for j, digit in enumerate(digits):
+            digits[j], carry = digit ^ carry, digit & carry
+            if not carry:
+                break
+        if carry:
+            digits.append(carry)
+    return digits
+
+
+def _at_least(digits, value, everything):
+    """
+    Get the bitset of positions whose bit-sliced count is at least ``value``.
+    """
+    if value <= 0:
+        return everything
+    if value >> len(digits):
+        return 0
+    greater, equal = 0, everything
+    for j in reversed(range(len(digits))):
+        if value >> j & 1:
+            equal &= digits[j]
+        else:
+            greater |= equal & digits[j]
+            equal &= ~digits[j]
+    return greater | equal
+
+
+def min_overlap(score, length):
+    """
+    Get the smallest character overlap that allows a partial ratio of ``score``.
+
+    A needle of ``length`` characters sharing ``overlap`` characters (as a multiset) with the
+    other string scores at most ``200 * overlap / (length + overlap)``.
+    """
+    if score >= 200:
+        return length + 1
+    return max(0, math.ceil(score * length / (200 - score) - 1e-6))
+
+
+class CharacterIndex:
+    """
+    Search index over a character list that reproduces thefuzz's partial_token_sort_ratio results.
+
+    Every entry is stored with its preprocessed, token sorted text and character occurrence
+    postings kept as bitsets. The postings give an upper bound for the score of every entry, so
+    only entries that can still reach the requested top-k are scored exactly.
+    """
+
+    def __init__(self, choices):
+        """
+        Initialize CharacterIndex.
+
+        Args:
+            choices (list[str]): The entries to index.
+        """
+        self.choices = list(choices)
+        self.processed = [process_choice(choice) for choice in self.choices]
+        size = len(self.processed)
+        postings = {}
+        lengths = {}
+        for i, text in enumerate(self.processed):
+            for char, count in Counter(text).items():
+                for occurrence in range(1, count + 1):
+                    postings.setdefault((char, occurrence), []).append(i)
+            lengths.setdefault(len(text), []).append(i)
+        self._postings = {key: _to_bitset(ids, size) for key, ids in postings.items()}
+        self._lengths = {length: _to_bitset(ids, size) for length, ids in lengths.items()}
+        self._everything = (1 << size) - 1
+
+    def indexes(self, choices):
+        """
+        Check whether the index was built from the given entries.
+        """
+        return self.choices == choices
+
+    def search(self, query, limit=None, score_cutoff=0):
+        """
+        Find the best matching entries for a query.
+
+        Args:
+            query (str): The text to search for.
+            limit (int): Optional maximum number of results.
+            score_cutoff (int): Minimum score of a result.
+
+        Returns:
+            list[tuple]: (entry, score) pairs ordered like thefuzz.process.extractBests.
+        """
+        processed_query = process_query(query)
+        length = len(processed_query)
+        if not length or score_cutoff <= 0:
+            results = self._score(processed_query, range(len(self.processed)), limit, score_cutoff)
+            return [(choice, int(round(score))) for choice, score in results]
+
+        counts = _bit_sliced_sum(
+            self._postings.get((char, occurrence), 0)
+            for char, count in Counter(processed_query).items()
+            for occurrence in range(1, count + 1))
+        threshold = score_cutoff
+        if limit:
+            # rapidfuzz may drop a score equal to the cutoff due to rounding, keep a margin
+            threshold = max(threshold, self._seed_score(processed_query, counts, limit,
+                                                        score_cutoff) - SCORE_MARGIN)
+
+        shorter = 0
+        for entry_length, bits in self._lengths.items():
+            if entry_length < length:
+                shorter |= bits
+        candidates = _at_least(counts, min_overlap(threshold, length), self._everything) | shorter
+        results = self._score(processed_query, _from_bitset(candidates), limit, threshold)
+        return [(choice, int(round(score))) for choice, score in results]
+
+    def _seed_score(self, processed_query, counts, limit, score_cutoff):
+        """
+        Score the entries sharing the most characters with the query first. Their k-th best
+        score is a lower bound for the final k-th score, which prunes everything else.
+        """
+        seed_size = limit * SEED_FACTOR
+        overlap = len(processed_query)
+        seed = _at_least(counts, overlap, self._everything)
+        while seed.bit_count() < seed_size and overlap > 0:
+            overlap -= 1
+            seed = _at_least(counts, overlap, self._everything)
+        best = self._score(processed_query, _from_bitset(seed)[:seed_size], limit, score_cutoff)
+        return best[-1][1] if len(best) == limit else score_cutoff
+
+    def _score(self, processed_query, ids, limit, score_cutoff):
+        results = rprocess.extract(processed_query, [self.processed[i] for i in ids],
+                                   scorer=rfuzz.partial_ratio, processor=None,
+                                   score_cutoff=score_cutoff, limit=limit)
+        return [(self.choices[ids[i]], score) for _, score, i in results]
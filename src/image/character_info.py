@@ -1,44 +1,213 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import requests
-import requests_cache
-from thefuzz import process, fuzz
 
-requests_cache.install_cache('name_api_cache', expire_after=3600)
+from src.image.character_catalog import CharacterCatalog, DEFAULT_CATALOG_PATH
+from src.image.character_index import CharacterIndex
+from src.image.http_cache import CachedClientSession
+
+CHARACTER_CACHE_NAME = 'name_api_cache'
+_CHARACTER_SESSION = {}
+_CHARACTER_SESSION_LOCK = threading.Lock()
 CHARACTER_LIST_URL = ("https://huggingface.co/spaces/cagliostrolab"
                       "/animagine-xl-3.1/raw/main/wildcard/characterfull.txt")
+CATALOG_PATH = os.environ.get('CHARACTER_CATALOG_PATH', DEFAULT_CATALOG_PATH)
+CATALOG_MAX_AGE = 3600
+_CATALOG_CACHE = {}
+_CATALOG_LOCK = threading.Lock()
+PARALLEL_MIN_NAMES = 32
+_INDEX_CACHE = {}
+_INDEX_LOCK = threading.Lock()
+_WORKER_INDEX = {}
+_POOL = {}
+_POOL_LOCK = threading.Lock()
+
+
+def get_character_session():
+    """
+    Get the cached HTTP session of the character list, opening its cache on first use.
+    """
+    with _CHARACTER_SESSION_LOCK:
+        if 'session' not in _CHARACTER_SESSION:
+            _CHARACTER_SESSION['session'] = CachedClientSession(CHARACTER_CACHE_NAME,
+                                                                expire_after=3600)
+        return _CHARACTER_SESSION['session']
 
 
-def get_all_characters() -> list[str]:
+def fetch_character_catalog(refresh=False):
     """
-    Get all characters from the character list.
+    Download the character list and build a catalog from it.
+
+    Args:
+        refresh (bool): Whether to revalidate a cached character list before using it.
     """
-    response = requests.get(CHARACTER_LIST_URL, timeout=3)
+    response = get_character_session().get(CHARACTER_LIST_URL, timeout=3, refresh=refresh)
     response.raise_for_status()
-    text: list[str] = response.text.split("\n")
-    return text
+    return CharacterCatalog.from_lines(response.text.split("\n"))
+
+
+def refresh_character_catalog():
+    """
+    Rebuild the local catalog from the revalidated character list.
+
+    If the download or writing the catalog fails, the current catalog is kept.
+    """
+    try:
+        catalog = fetch_character_catalog(refresh=True)
+        catalog.save(CATALOG_PATH)
+    except (requests.RequestException, OSError) as error:
+        print(f"Could not refresh the character catalog: {error}")
+        return
+    with _CATALOG_LOCK:
+        _CATALOG_CACHE['catalog'] = catalog
+
+
+def get_character_catalog():
+    """
+    Get the character catalog.
+
+    The local catalog at CATALOG_PATH is used as long as it is younger than CATALOG_MAX_AGE. After
+    that it is still returned right away while it is rebuilt from CHARACTER_LIST_URL in the
+    background. If the download fails, the local catalog keeps being used, so matching works
+    offline. Only without any local catalog the download blocks the caller; if the catalog cannot
+    be written then, the downloaded one is only kept in memory.
+    """
+    with _CATALOG_LOCK:
+        catalog = _CATALOG_CACHE.get('catalog')
+        if catalog is None and os.path.exists(CATALOG_PATH):
+            catalog = CharacterCatalog.load(CATALOG_PATH)
+        if catalog is None:
+            catalog = fetch_character_catalog()
+            try:
+                catalog.save(CATALOG_PATH)
+            except OSError as error:
+                print(f"Could not save the character catalog: {error}")
+            _CATALOG_CACHE['checked'] = time.time()
+        checked = max(_CATALOG_CACHE.get('checked', 0), catalog.created)
+        if time.time() - checked > CATALOG_MAX_AGE:
+            _CATALOG_CACHE['checked'] = time.time()
+            _CATALOG_CACHE['refresh'] = threading.Thread(target=refresh_character_catalog,
+                                                         daemon=True)
+            _CATALOG_CACHE['refresh'].start()
+        _CATALOG_CACHE['catalog'] = catalog
+    return catalog
+
+
+def get_all_characters(series=None, gender=None) -> list[str]:
+    """
+    Get all characters from the character list, optionally only of a series or gender tag.
+    """
+    return get_character_catalog().lines(series, gender)
+
+
+def get_character_index(characters=None, series=None, gender=None):
+    """
+    Get the search index over the character list, building it only when the list changed.
+    """
+    if characters is None:
+        characters = get_all_characters(series, gender)
+    with _INDEX_LOCK:
+        index = _INDEX_CACHE.get((series, gender))
+        if index is None or not index.indexes(characters):
+            index = CharacterIndex(characters)
+            _INDEX_CACHE[(series, gender)] = index
+    return index
 
 
-def get_closest_character(name):
+def get_closest_character(name, series=None, gender=None):
     """
     Get the closest character name from the character list.
     """
-    res = process.extractOne(query=name.lower(), choices=get_all_characters(),
-                             scorer=fuzz.partial_token_sort_ratio, score_cutoff=50)
+    res = get_character_index(series=series, gender=gender).search(
+        name.lower(), limit=1, score_cutoff=50)
     if res:
-        return res[0]
+        return res[0][0]
     return None
 
 
-def get_closest_characters(name, limit=3):
+def get_closest_characters(name, limit=3, series=None, gender=None):
     """
     Get the closest character names from the character list.
+
+    Returns:
+        list[str]: Only the best match if it is almost exact, otherwise up to limit matches,
+            empty if nothing matched.
     """
-    res = process.extractBests(query=name.lower(), choices=get_all_characters(),
-                               scorer=fuzz.partial_token_sort_ratio, score_cutoff=50, limit=limit)
-    if res[0][1] >= 90:
+    return _closest_names(get_character_index(series=series, gender=gender), name, limit)
+
+
+def _closest_names(index, name, limit):
+    res = index.search(name.lower(), limit=limit, score_cutoff=50)
+    if res and res[0][1] >= 90:
         return [res[0][0]]
     return [r[0] for r in res]
 
 
+def _init_worker(characters):
+    _WORKER_INDEX['index'] = CharacterIndex(characters)
+
+
+def _closest_characters_in_worker(name, limit):
+    return _closest_names(_WORKER_INDEX['index'], name, limit)
+
+
+def _get_pool(characters, workers):
+    """
+    Get the process pool matching against a character list, reusing it until the list or the
+    number of workers changes. Must be called with _POOL_LOCK held.
+    """
+    if _POOL.get('characters') != characters or _POOL.get('workers') != workers:
+        close_character_pool()
+        _POOL.update(executor=ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                  initargs=(characters,)),
+                     characters=characters, workers=workers)
+    return _POOL['executor']
+
+
+def close_character_pool():
+    """
+    Stop the worker processes of get_closest_characters_many.
+    """
+    executor = _POOL.pop('executor', None)
+    _POOL.clear()
+    if executor is not None:
+        executor.shutdown()
+
+
+def get_closest_characters_many(names, limit=3, series=None, gender=None, workers=None):
+    """
+    Get the closest character names for many names at once.
+
+    The character list is loaded once. Batches of at least PARALLEL_MIN_NAMES names are matched
+    in a process pool, every worker building its own index. The pool is kept for later batches
+    against the same character list.
+
+    Args:
+        names (list[str]): The character names to resolve.
+        limit (int): The maximum number of matches per name.
+        series (str): Optional series to restrict the matches to.
+        gender (str): Optional gender tag to restrict the matches to.
+        workers (int): The number of worker processes, defaults to the number of CPUs.
+
+    Returns:
+        list[list[str]]: The matches per name in input order, see get_closest_characters.
+    """
+    names = list(names)
+    characters = get_all_characters(series, gender)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(names) < PARALLEL_MIN_NAMES:
+        index = get_character_index(characters, series, gender)
+        return [_closest_names(index, name, limit) for name in names]
+
+    with _POOL_LOCK:
+        return list(_get_pool(characters, workers).map(
+            _closest_characters_in_worker, names, [limit] * len(names),
+            chunksize=max(1, len(names) // (workers * 4))))
+
+
 if __name__ == "__main__":
     print(get_closest_character("Naruto Uzumaki"))
     print(get_closest_character("kita ikuyo"))
@@ -47,3 +216,4 @@ if __name__ == "__main__":
     print(get_closest_characters("Naruto Uzumaki"))
     print(get_closest_characters("kita ikuyo"))
     print(get_closest_characters("Asuka Langley"))
+    print(get_closest_characters_many(["Naruto Uzumaki", "kita ikuyo", "Asuka Langley"]))
@@ -0,0 +1,79 @@
+DISPLAY_MODES = ('RGB', 'RGBA')
+THUMBNAIL_SIZE = 96
+
+
+def get_display_buffer(image):
+    """
+    Get the pixels of an image in a layout a QImage can wrap without another conversion.
+
+    Images in other modes than DISPLAY_MODES are converted to RGB, or to RGBA if they have
+    transparency.
+
+    Args:
+        image (PIL.Image): The image.
+
+    Returns:
+        tuple: The pixel bytes, the width, the height, the bytes per line and the mode.
+    """
+    if image.mode not in DISPLAY_MODES:
+        transparent = 'A' in image.mode or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    return image.tobytes(), image.width, image.height, image.width * len(image.mode), image.mode
+
+
+def get_thumbnail_size(width, height, size=THUMBNAIL_SIZE):
+    """
+    Get the size of an image scaled down to fit a square, keeping its aspect ratio.
+    """
+    scale = min(1, size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class DisplayCache:
+    """
+    Pixmaps of the variants of a result.
+
+    Only the displayed variant is kept as full size pixmap, the others are converted again when
+    they are shown. Thumbnails are scaled down before the conversion, so they never need a full
+    size pixmap.
+    """
+
+    def __init__(self, to_pixmap, thumbnail_size=THUMBNAIL_SIZE):
+        """
+        Initialize DisplayCache.
+
+        Args:
+            to_pixmap (callable): Converts a PIL image to a pixmap.
+            thumbnail_size (int): The size of the square thumbnails fit into.
+        """
+        self.to_pixmap = to_pixmap
+        self.thumbnail_size = thumbnail_size
+        self.images = []
+        self._displayed = (None, None)
+        self._thumbnails = {}
+
+    def set_images(self, images):
+        """
+        Replace the variants, dropping the pixmaps of the previous ones.
+        """
+        self.images = images
+        self._displayed = (None, None)
+        self._thumbnails.clear()
+
+    def pixmap(self, index):
+        """
+        Get the full size pixmap of a variant, replacing the one displayed before.
+        """
+        if self._displayed[0] != index:
+            self._displayed = (index, self.to_pixmap(self.images[index]))
+        return self._displayed[1]
+
+    def thumbnail(self, index):
+        """
+        Get the thumbnail pixmap of a variant, scaling it only once.
+        """
+        if index not in self._thumbnails:
+            image = self.images[index]
+            self._thumbnails[index] = self.to_pixmap(image.resize(
+                get_thumbnail_size(image.width, image.height, self.thumbnail_size)))
+        return self._thumbnails[index]
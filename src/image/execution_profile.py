@@ -0,0 +1,108 @@
+import functools
+import os
+
+from src.lazy_module import LazyModule
+
+torch = LazyModule('torch')
+diffusers = LazyModule('diffusers')
+
+EXECUTION_PROFILE = os.environ.get('EXECUTION_PROFILE', 'auto')
+CPU_THREADS = int(os.environ['CPU_THREADS']) if os.environ.get('CPU_THREADS') else None
+PROFILES = {
+    'cuda': {'device': 'cuda', 'dtype': 'float16'},
+    'cpu-fp32': {'device': 'cpu', 'dtype': 'float32', 'channels_last': True},
+    'cpu-bf16': {'device': 'cpu', 'dtype': 'bfloat16', 'channels_last': True},
+    'cpu-compile': {'device': 'cpu', 'dtype': None, 'channels_last': True, 'compile': True},
+    'cpu': {'device': 'cpu', 'dtype': None, 'channels_last': True}
+}
+BFLOAT16_CPU_FLAGS = ('avx512_bf16', 'amx_bf16')
+
+
+def cpu_supports_bfloat16():
+    """
+    Check whether the CPU has native bfloat16 instructions, as listed in /proc/cpuinfo.
+    """
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as file:
+            flags = set(file.read().split())
+    except OSError:
+        return False
+    return any(flag in flags for flag in BFLOAT16_CPU_FLAGS)
+
+
+def resolve_profile(name=EXECUTION_PROFILE, threads=CPU_THREADS):
+    """
+    Get the settings of an execution profile.
+
+    Args:
+        name (str): A key of PROFILES, or 'auto' for 'cuda' if available and 'cpu' otherwise.
+            The 'cpu' profiles without a dtype use bfloat16 if the CPU supports it and float32
+            otherwise.
+        threads (int): The number of intra-op threads on CPU, all cores by default.
+
+    Returns:
+        dict: The profile with its name, device, dtype name, thread counts, and whether to use
+            channels-last memory format and torch.compile.
+    """
+    if name == 'auto':
+        name = 'cuda' if torch.cuda.is_available() else 'cpu'
+    if name not in PROFILES:
+        raise ValueError(f"Unknown execution profile '{name}', use one of {sorted(PROFILES)}")
+    profile = dict({'channels_last': False, 'compile': False}, name=name, **PROFILES[name])
+    if profile['dtype'] is None:
+        profile['dtype'] = 'bfloat16' if cpu_supports_bfloat16() else 'float32'
+    if profile['device'] == 'cpu':
+        profile['threads'] = threads or os.cpu_count()
+        profile['interop_threads'] = 1
+    return profile
+
+
+@functools.lru_cache(maxsize=None)
+def get_execution_profile():
+    """
+    Get the execution profile selected with EXECUTION_PROFILE, applying its thread settings once.
+    """
+    profile = resolve_profile()
+    configure_threads(profile)
+    return profile
+
+
+def configure_threads(profile):
+    """
+    Set the torch thread pools to the sizes of a CPU profile.
+    """
+    if 'threads' not in profile:
+        return
+    torch.set_num_threads(profile['threads'])
+    try:
+        torch.set_num_interop_threads(profile['interop_threads'])
+    except RuntimeError:
+        pass  # only possible before the first parallel work, keep the current pool
+
+
+def apply_profile(pipe, profile):
+    """
+    Apply the memory format and attention settings of a profile to a loaded pipeline.
+
+    Args:
+        pipe: A diffusers pipeline.
+        profile (dict): The profile, see resolve_profile.
+
+    Returns:
+        The pipeline.
+    """
+    pipe.unet.set_attn_processor(diffusers.models.attention_processor.AttnProcessor2_0())
+    if profile['channels_last']:
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+    if profile['compile']:
+        pipe.unet = torch.compile(pipe.unet)
+    return pipe
+
+
+def warm_up_compiled(pipe, profile, width, height):
+    """
+    Run one step, so torch.compile compiles the UNet before the first image request.
+    """
+    if profile['compile']:
+        pipe(prompt="warm up", num_inference_steps=1, width=width, height=height)
@@ -1,16 +1,15 @@
-import os
+import asyncio
+import functools
+import threading
 import time
-import nltk
-import requests
-import requests_cache
-from nltk.corpus import wordnet as wn
-from nltk.tag import pos_tag
-from nltk.tokenize import word_tokenize
-
-nltk.download('punkt_tab', quiet=True)
-nltk.download('averaged_perceptron_tagger_eng', quiet=True)
-nltk.download('wordnet', quiet=True)
-requests_cache.install_cache('game_api_cache', expire_after=3600)
+
+from src.image.genre_registry import GenreRegistry
+from src.image.igdb_client import AsyncIGDBTransport, get_default_transport
+from src.image.twitch_auth import get_default_token_manager
+from src.lazy_module import LazyModule, prefetch
+from src.metrics import span
+
+nltk = LazyModule('nltk')
 
 CURRENT_YEAR = int(time.strftime('%Y', time.gmtime(time.time())))
 DATE_RECENCY = {  # Date ranges provided by ai model
@@ -21,13 +20,62 @@ DATE_RECENCY = {  # Date ranges provided by ai model
     'oldest': (2005, 2010)
 }
 FILTER_WORDS = ['game', 'play']
+KEYWORD_TAGS = ('NN', 'NNS', 'JJ', 'JJR', 'JJS')
+SUMMARY_KEYWORD_LIMIT = 5
+WORDNET_CACHE_SIZE = 65536
+GENRE_REGISTRY = GenreRegistry()
+MULTIQUERY_LIMIT = 10  # IGDB accepts at most 10 queries per multiquery request
+NLTK_RESOURCES = {
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'averaged_perceptron_tagger_eng': 'taggers/averaged_perceptron_tagger_eng',
+    'wordnet': 'corpora/wordnet',
+}
+_NLTK_STATE = {'ready': False}
+_NLTK_LOCK = threading.Lock()
+
+
+def ensure_nltk_data():
+    """
+    Download the NLTK resources that are not installed yet and load WordNet, once per process.
+
+    WordNet is loaded under the lock because NLTK's lazy corpus loader is not thread safe; every
+    caller waits here until it is ready, including while prefetch_nltk is still loading it.
+    """
+    if _NLTK_STATE['ready']:
+        return
+    with _NLTK_LOCK:
+        if _NLTK_STATE['ready']:
+            return
+        for package, resource in NLTK_RESOURCES.items():
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(package, quiet=True)
+        load_wordnet()
+        _NLTK_STATE['ready'] = True
+
 
+def prefetch_nltk():
+    """
+    Import NLTK, fetch its resources and load WordNet in a background thread.
+    """
+    return prefetch(ensure_nltk_data)
+
+
+def load_wordnet():
+    """
+    Load the WordNet corpus, which NLTK otherwise does on the first lookup.
+    """
+    nltk.corpus.wordnet.ensure_loaded()
 
+
+@functools.lru_cache(maxsize=WORDNET_CACHE_SIZE)
 def is_relevant_adjective(word):
     """
     Check if a word is a relevant adjective using WordNet.
     """
-    synsets = wn.synsets(word)
+    ensure_nltk_data()
+    synsets = nltk.corpus.wordnet.synsets(word)
     return bool(synsets)
 
 
@@ -42,18 +90,63 @@ def get_year_recency(release_date):
     return 'oldest'
 
 
+def select_summary_keywords(tagged):
+    """
+    Pick the first SUMMARY_KEYWORD_LIMIT relevant nouns and adjectives from a tagged summary.
+    """
+    summary_keywords = []
+    for word, tag in tagged:
+        if (tag in KEYWORD_TAGS
+                and all(FILTER_WORD not in word for FILTER_WORD in FILTER_WORDS)
+                and is_relevant_adjective(word)):
+            summary_keywords.append(word)
+            if len(summary_keywords) == SUMMARY_KEYWORD_LIMIT:
+                break
+    return summary_keywords
+
+
 def get_summary_keywords(summary):
     """
     Extract relevant keywords from the game summary.
     """
-    tokens = word_tokenize(summary)
-    tagged = pos_tag(tokens)
-    summary_keywords = [word for word, tag in tagged if
-                        tag in ('NN', 'NNS', 'JJ', 'JJR', 'JJS')
-                        and is_relevant_adjective(word)
-                        and all(
-                            FILTER_WORD not in word for FILTER_WORD in FILTER_WORDS)]
-    return summary_keywords[:5]
+    ensure_nltk_data()
+    tokens = nltk.word_tokenize(summary)
+    tagged = nltk.pos_tag(tokens)
+    return select_summary_keywords(tagged)
+
+
+def get_summary_keywords_many(summaries):
+    """
+    Extract relevant keywords from many game summaries, tagging them in one pass.
+    """
+    ensure_nltk_data()
+    tagged_summaries = nltk.pos_tag_sents([nltk.word_tokenize(summary) for summary in summaries])
+    return [select_summary_keywords(tagged) for tagged in tagged_summaries]
+
+
+def get_game_query(name):
+    """
+    Build the IGDB query searching for a game by name.
+    """
+    return (f"search \"{name}\"; fields name, first_release_date, genres, summary;"
+            f"\nwhere category = 0;\nlimit 1;")
+
+
+def get_games_multiquery(names):
+    """
+    Build an IGDB multiquery searching for several games, each query named by its position.
+    """
+    return "\n".join(f"query games \"{i}\" {{\n{get_game_query(name)}\n}};"
+                     for i, name in enumerate(names))
+
+
+def combine_game_keywords(game_details, genres, buzzwords):
+    """
+    Combine game details, genre names and summary keywords into the recency and keywords
+    of a game.
+    """
+    recency = get_year_recency(game_details.get('first_release_date', 0))
+    return recency, list(set(genres + buzzwords))
 
 
 class GameInfo:
@@ -61,46 +154,48 @@ class GameInfo:
     Class to fetch game information from Twitch and IGDB.
     """
 
-    def __init__(self):
+    def __init__(self, transport=None, async_transport=None, genre_registry=GENRE_REGISTRY,
+                 token_manager=None):
+        """
+        Initialize GameInfo.
+
+        Args:
+            transport (IGDBTransport): The transport for IGDB requests, shared by default.
+            async_transport (AsyncIGDBTransport): The transport for awaitable IGDB requests.
+            genre_registry (GenreRegistry): The registry resolving genre ids to names.
+            token_manager (TwitchTokenManager): The source of Twitch tokens, shared by default.
+        """
         self.token = None
-        self.client_id = os.environ.get('TWITCH_CLIENT_ID')
-        self.client_secret = os.environ.get('TWITCH_CLIENT_SECRET')
-        self.authentication_time = 0
+        self.token_manager = token_manager or get_default_token_manager()
+        self.client_id = self.token_manager.client_id
+        self.transport = transport or get_default_transport()
+        self.async_transport = async_transport or AsyncIGDBTransport(self.transport)
+        self.genre_registry = genre_registry
 
     def authenticate(self):
         """
-        Authenticate with the Twitch API.
+        Authenticate with the Twitch API using the shared token.
         """
-        if self.token and time.time() - self.authentication_time < self.token['expires_in']:
-            return
-        url = "https://id.twitch.tv/oauth2/token"
-        payload = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "grant_type": "client_credentials"
-        }
-        response = requests.post(url, data=payload, timeout=10)
-        response.raise_for_status()
-        self.token = response.json()
-        self.authentication_time = time.time()
-        return
+        with span('twitch auth'):
+            self.token = self.token_manager.get_token()
 
-    def get_game_info(self, name):
+    def get_headers(self):
         """
-        Fetch game information from the IGDB API.
+        Get the headers of an authenticated IGDB request.
         """
-        self.authenticate()
-        url = "https://api.igdb.com/v4/games"
-        payload = (f"search \"{name}\"; fields name, first_release_date, genres, summary;"
-                   f"\nwhere category = 0;\nlimit 1;")
-        headers = {
+        return {
             "Content-Type": "text/plain",
             "Client-ID": self.client_id,
             "Authorization": f"Bearer {self.token['access_token']}"
         }
-        response = requests.post(url, data=payload, headers=headers, timeout=3)
-        response.raise_for_status()
-        games = response.json()
+
+    def get_game_info(self, name):
+        """
+        Fetch game information from the IGDB API.
+        """
+        self.authenticate()
+        with span('igdb game search'):
+            games = self.transport.post('games', get_game_query(name), self.get_headers())
         if not games:
             print(f"Game with name '{name}' not found")
             return None
@@ -108,21 +203,17 @@ class GameInfo:
 
     def get_genres(self, genre_ids):
         """
-        Fetch genre names from the IGDB API.
+        Get genre names, fetching them from the IGDB API only if the genre registry lacks them.
+        """
+        with span('genre lookup', genres=len(genre_ids)):
+            return self.genre_registry.resolve(genre_ids, self.fetch_genres)
+
+    def fetch_genres(self, query):
+        """
+        Send a query to the IGDB genres endpoint.
         """
         self.authenticate()
-        url = "https://api.igdb.com/v4/genres"
-        payload = (f"fields name; where id = "
-                   f"{(str(genre_ids)).translate(str.maketrans('[]', '()'))};")
-        headers = {
-            "Content-Type": "text/plain",
-            "Client-ID": self.client_id,
-            "Authorization": f"Bearer {self.token['access_token']}"
-        }
-        response = requests.post(url, data=payload, headers=headers, timeout=3)
-        response.raise_for_status()
-        genres = [genre['name'] for genre in response.json()]
-        return genres
+        return self.transport.post('genres', query, self.get_headers())
 
     def get_game_keywords(self, name):
         """
@@ -132,15 +223,86 @@ class GameInfo:
         if not game_details:
             return None
 
-        release_date = game_details.get('first_release_date', 0)
         genre_ids = game_details.get('genres', None)
-        summary = game_details.get('summary', '')
+        genres = self.get_genres(genre_ids) if genre_ids else []
+        with span('summary keywords'):
+            buzzwords = get_summary_keywords(game_details.get('summary', ''))
+        return combine_game_keywords(game_details, genres, buzzwords)
 
-        recency = get_year_recency(release_date)
-        genres = genre_ids and self.get_genres(genre_ids)
-        buzzwords = get_summary_keywords(summary)
+    def get_game_info_many(self, names):
+        """
+        Fetch game information for many games, packing up to MULTIQUERY_LIMIT searches into
+        each IGDB multiquery request.
 
-        return recency, list(set(genres + buzzwords))
+        Returns:
+            list[dict]: The game information in the order of names, None for unknown games.
+        """
+        self.authenticate()
+        games = []
+        for start in range(0, len(names), MULTIQUERY_LIMIT):
+            chunk = names[start:start + MULTIQUERY_LIMIT]
+            results = {result['name']: result['result'] for result in self.transport.post(
+                'multiquery', get_games_multiquery(chunk), self.get_headers())}
+            games += [(results.get(str(i)) or [None])[0] for i in range(len(chunk))]
+        return games
+
+    def get_game_keywords_many(self, names):
+        """
+        Get recency, genres, and keywords for many games with few IGDB requests.
+
+        Returns:
+            list[tuple]: The recency and keywords in the order of names, None for unknown games.
+        """
+        games = self.get_game_info_many(list(names))
+        genre_ids = sorted({genre_id for game in games if game
+                            for genre_id in game.get('genres', [])})
+        if genre_ids:
+            self.get_genres(genre_ids)  # resolves all genres of the batch at once
+
+        found = [game for game in games if game]
+        buzzwords = iter(get_summary_keywords_many([game.get('summary', '') for game in found]))
+        results = []
+        for game in games:
+            if not game:
+                results.append(None)
+                continue
+            genres = self.get_genres(game['genres']) if game.get('genres') else []
+            results.append(combine_game_keywords(game, genres, next(buzzwords)))
+        return results
+
+    async def get_game_info_async(self, name):
+        """
+        Fetch game information from the IGDB API without blocking the event loop.
+        """
+        await asyncio.to_thread(self.authenticate)
+        games = await self.async_transport.post('games', get_game_query(name),
+                                                self.get_headers())
+        if not games:
+            print(f"Game with name '{name}' not found")
+            return None
+        return games[0]
+
+    async def get_genres_async(self, genre_ids):
+        """
+        Get genre names without blocking the event loop.
+        """
+        return await asyncio.to_thread(self.get_genres, genre_ids)
+
+    async def get_game_keywords_async(self, name):
+        """
+        Get recency, genres, and keywords for a game without blocking the event loop.
+
+        The genre lookup and the summary keyword extraction run concurrently.
+        """
+        game_details = await self.get_game_info_async(name)
+        if not game_details:
+            return None
+
+        genre_ids = game_details.get('genres', None)
+        genres, buzzwords = await asyncio.gather(
+            self.get_genres_async(genre_ids) if genre_ids else asyncio.sleep(0, []),
+            asyncio.to_thread(get_summary_keywords, game_details.get('summary', '')))
+        return combine_game_keywords(game_details, genres, buzzwords)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+from src.atomic_file import atomic_write
+
+DEFAULT_GENRES_PATH = './resources/genres.json'
+GENRES_TTL = 7 * 24 * 3600
+RETRY_AFTER = 300
+ALL_GENRES_QUERY = "fields name; limit 500;"
+
+
+def get_genres_query(genre_ids):
+    """
+    Build the IGDB query fetching the names of genres.
+    """
+    return (f"fields name; where id = "
+            f"{(str(list(genre_ids))).translate(str.maketrans('[]', '()'))};")
+
+
+class GenreRegistry:  # pylint: disable=R0902
+    """
+    Local copy of the IGDB genres table.
+
+    The whole table is fetched in one request and persisted to disk. It is refetched once it is
+    older than the TTL; genre ids never seen before are fetched individually. Ids IGDB does not
+    know are remembered for the same TTL, so they are not fetched on every lookup. If the table
+    cannot be read or written, it is only kept in memory.
+    """
+
+    def __init__(self, path=DEFAULT_GENRES_PATH, ttl=GENRES_TTL):
+        """
+        Initialize GenreRegistry.
+
+        Args:
+            path (str): Where the table is persisted, None to keep it in memory only.
+            ttl (float): The number of seconds after which the table is fetched again.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.genres = {}
+        self.missing = {}
+        self.fetched = 0
+        self._retry_at = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def resolve(self, genre_ids, fetch):
+        """
+        Get the names of genres.
+
+        Args:
+            genre_ids (list[int]): The genre ids.
+            fetch (callable): Sends an IGDB genres query and returns the decoded response.
+
+        Returns:
+            list[str]: The names of the known genres in the order of genre_ids.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if time.time() - self.fetched > self.ttl and time.time() >= self._retry_at:
+                try:
+                    self._update(fetch(ALL_GENRES_QUERY), replace=True)
+                except requests.RequestException:
+                    if not self.genres:
+                        raise
+                    self._retry_at = time.time() + RETRY_AFTER
+            now = time.time()
+            unknown = [genre_id for genre_id in dict.fromkeys(genre_ids)
+                       if genre_id not in self.genres
+                       and now - self.missing.get(genre_id, -self.ttl) > self.ttl]
+            if unknown:
+                self._update(fetch(get_genres_query(unknown)), missing=unknown)
+            return [self.genres[genre_id] for genre_id in genre_ids if genre_id in self.genres]
+
+    def _load(self):
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                table = json.load(file)
+            genres = {int(genre_id): name for genre_id, name in table['genres'].items()}
+            missing = {int(genre_id): checked
+                       for genre_id, checked in table.get('missing', {}).items()}
+            fetched = float(table['fetched'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            print(f"Ignoring the unreadable genre table {self.path}: {error!r}")
+            return
+        self.genres, self.missing, self.fetched = genres, missing, fetched
+
+    def _update(self, response, replace=False, missing=()):
+        genres = {genre['id']: genre['name'] for genre in response}
+        if replace:
+            self.genres = genres
+            self.missing = {}
+            self.fetched = time.time()
+        else:
+            self.genres.update(genres)
+        for genre_id in missing:
+            if genre_id not in genres:
+                self.missing[genre_id] = time.time()
+        if not self.path:
+            return
+        try:
+            with atomic_write(self.path, 'w', encoding='utf-8') as file:
+                json.dump({'fetched': self.fetched, 'genres': self.genres,
+                           'missing': self.missing}, file)
+        except OSError as error:
+            print(f"Could not save the genre table: {error}")
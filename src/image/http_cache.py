@@ -0,0 +1,51 @@
+import threading
+
+from requests_cache import CachedSession
+
+
+class CachedClientSession(CachedSession):  # pylint: disable=W0223
+    """
+    HTTP session with its own response cache, owned by a single API client.
+
+    Expired responses are revalidated with ETag/Last-Modified. Until the revalidation finishes in
+    the background, the stale response is served, so an expired entry never blocks a caller. If
+    the server cannot be reached, stale responses are used as well.
+    """
+
+    def __init__(self, cache_name, expire_after=3600, **kwargs):
+        """
+        Initialize CachedClientSession.
+
+        Args:
+            cache_name (str): The name of the cache, used as the SQLite file name.
+            expire_after (int): Seconds after which a response is revalidated.
+            **kwargs: Further requests_cache settings overriding the defaults.
+        """
+        kwargs.setdefault('backend', 'sqlite')
+        kwargs.setdefault('stale_while_revalidate', True)
+        kwargs.setdefault('stale_if_error', True)
+        super().__init__(cache_name, expire_after=expire_after, **kwargs)
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+        self._counters_lock = threading.Lock()
+
+    def request(self, method, url, *args, **kwargs):  # pylint: disable=W0221
+        response = super().request(method, url, *args, **kwargs)
+        if not getattr(response, 'from_cache', False):
+            counter = 'misses'
+        elif getattr(response, 'is_expired', False):
+            counter = 'stale_hits'
+        else:
+            counter = 'hits'
+        with self._counters_lock:
+            self._counters[counter] += 1
+        return response
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: The number of fresh hits, stale hits served while revalidating, and misses.
+        """
+        with self._counters_lock:
+            return dict(self._counters)
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.image.http_cache import CachedClientSession
+
+IGDB_URL = "https://api.igdb.com/v4"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+GAME_CACHE_NAME = 'game_api_cache'
+
+
+class IGDBTransport:
+    """
+    Sends IGDB queries over one persistent, pooled HTTP session.
+
+    Connections are reused across calls and threads, failed requests are retried with
+    exponential backoff and the number of requests in flight is limited.
+    """
+
+    # pylint: disable-next=R0913,R0917
+    def __init__(self, base_url=IGDB_URL, timeout=3, retries=3, backoff_factor=0.5,
+                 max_in_flight=4, cache_name=None):
+        """
+        Initialize IGDBTransport.
+
+        Args:
+            base_url (str): The IGDB API root.
+            timeout (float): The connect and read timeout of a request in seconds.
+            retries (int): How often a failed request is retried.
+            backoff_factor (float): The base of the exponential backoff between retries.
+            max_in_flight (int): The maximum number of concurrent requests.
+            cache_name (str): The name of the response cache of this transport, None for no cache.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache_name = cache_name
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight,
+                                   max_retries=Retry(total=retries, backoff_factor=backoff_factor,
+                                                     status_forcelist=RETRY_STATUSES,
+                                                     allowed_methods=None,
+                                                     raise_on_status=False))
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    @property
+    def session(self):
+        """
+        The HTTP session, created with its response cache on first use.
+        """
+        with self._session_lock:
+            if self._session is None:
+                session = (CachedClientSession(self.cache_name, allowable_methods=('GET', 'POST'))
+                           if self.cache_name else requests.Session())
+                session.mount('https://', self.adapter)
+                session.mount('http://', self.adapter)
+                self._session = session
+            return self._session
+
+    def post(self, endpoint, query, headers):
+        """
+        Send a query to an IGDB endpoint.
+
+        Args:
+            endpoint (str): The endpoint name, e.g. 'games'.
+            query (str): The apicalypse query.
+            headers (dict): The request headers.
+
+        Returns:
+            The decoded JSON response.
+        """
+        with self._in_flight:
+            response = self.session.post(f"{self.base_url}/{endpoint}", data=query,
+                                         headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+
+
+class AsyncIGDBTransport:
+    """
+    Awaitable wrapper around an IGDBTransport, so independent IGDB calls run concurrently.
+    """
+
+    def __init__(self, transport=None, max_in_flight=4):
+        """
+        Initialize AsyncIGDBTransport.
+
+        Args:
+            transport (IGDBTransport): The transport sending the requests, shared by default.
+            max_in_flight (int): The maximum number of concurrent requests.
+        """
+        self.transport = transport or get_default_transport()
+        self.max_in_flight = max_in_flight
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    async def post(self, endpoint, query, headers):
+        """
+        Send a query to an IGDB endpoint without blocking the event loop.
+
+        See IGDBTransport.post.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.setdefault(loop, asyncio.Semaphore(self.max_in_flight))
+        async with semaphore:
+            return await asyncio.to_thread(self.transport.post, endpoint, query, headers)
+
+
+_DEFAULT_TRANSPORT = {}
+_DEFAULT_TRANSPORT_LOCK = threading.Lock()
+
+
+def get_default_transport():
+    """
+    Get the IGDBTransport shared by all GameInfo instances.
+    """
+    with _DEFAULT_TRANSPORT_LOCK:
+        if 'transport' not in _DEFAULT_TRANSPORT:
+            _DEFAULT_TRANSPORT['transport'] = IGDBTransport(cache_name=GAME_CACHE_NAME)
+        return _DEFAULT_TRANSPORT['transport']
@@ -0,0 +1,167 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.atomic_file import atomic_write
+from src.lazy_module import LazyModule
+from src.metrics import span
+
+pil_image = LazyModule('PIL.Image')
+png_plugin = LazyModule('PIL.PngImagePlugin')
+
+IMAGE_FORMATS = {'png': ('PNG', '.png'), 'webp': ('WEBP', '.webp'), 'jpeg': ('JPEG', '.jpg')}
+IMAGE_FORMAT_ALIASES = {'jpg': 'jpeg'}
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 90))
+PNG_COMPRESS_LEVEL = int(os.environ.get('PNG_COMPRESS_LEVEL', 6))
+EXIF_IMAGE_DESCRIPTION = 0x010E
+
+
+def check_image_format(image_format):
+    """
+    Get the name of an image format in IMAGE_FORMATS, resolving IMAGE_FORMAT_ALIASES.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    image_format = IMAGE_FORMAT_ALIASES.get(image_format.lower(), image_format.lower())
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}', "
+                         f"expected one of {', '.join(IMAGE_FORMATS)}")
+    return image_format
+
+
+def get_default_image_format(image_format):
+    """
+    Get the format of the IMAGE_FORMAT environment variable, PNG if it is unknown.
+    """
+    try:
+        return check_image_format(image_format)
+    except ValueError as error:
+        print(f"Ignoring IMAGE_FORMAT: {error}")
+        return 'png'
+
+
+IMAGE_FORMAT = get_default_image_format(os.environ.get('IMAGE_FORMAT', 'png'))
+
+
+def get_save_options(image_format, metadata, quality=IMAGE_QUALITY,
+                     compress_level=PNG_COMPRESS_LEVEL):
+    """
+    Get the PIL save options of an image format, embedding metadata in the file.
+
+    PNG files get one text chunk per metadata entry and a 'parameters' chunk with all of them as
+    JSON. WebP and JPEG files get the JSON as EXIF image description.
+
+    Args:
+        image_format (str): One of IMAGE_FORMATS.
+        metadata (dict): The prompt, seed and generation parameters of the image.
+        quality (int): The WebP and JPEG quality from 1 to 100.
+        compress_level (int): The PNG zlib compression level from 0 to 9.
+
+    Returns:
+        dict: The keyword arguments of PIL.Image.Image.save.
+    """
+    parameters = json.dumps(metadata or {}, sort_keys=True, default=str)
+    if image_format == 'png':
+        info = png_plugin.PngInfo()
+        for key, value in (metadata or {}).items():
+            info.add_text(key, value if isinstance(value, str) else json.dumps(value, default=str))
+        info.add_text('parameters', parameters)
+        return {'format': 'PNG', 'pnginfo': info, 'compress_level': compress_level}
+    exif = pil_image.Exif()
+    exif[EXIF_IMAGE_DESCRIPTION] = parameters
+    return {'format': IMAGE_FORMATS[image_format][0], 'exif': exif.tobytes(), 'quality': quality}
+
+
+# pylint: disable-next=R0913,R0917
+def write_image(image, path, image_format=IMAGE_FORMAT, metadata=None, quality=IMAGE_QUALITY,
+                compress_level=PNG_COMPRESS_LEVEL):
+    """
+    Encode an image and write it atomically, so a crash never leaves a partial file.
+
+    Args:
+        image (PIL.Image): The image.
+        path (str): The path of the file without extension.
+        image_format (str): One of IMAGE_FORMATS.
+        metadata (dict): Embedded in the file, see get_save_options.
+        quality (int): The WebP and JPEG quality.
+        compress_level (int): The PNG compression level.
+
+    Returns:
+        str: The path of the written file.
+    """
+    image_format = check_image_format(image_format)
+    path += IMAGE_FORMATS[image_format][1]
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    with span('image save', format=image_format), atomic_write(path) as file:
+        image.save(file, **get_save_options(image_format, metadata, quality, compress_level))
+    return path
+
+
+class ImageWriter:
+    """
+    Queue of images encoded and written by background threads, see write_image.
+    """
+
+    def __init__(self, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY,
+                 compress_level=PNG_COMPRESS_LEVEL, workers=2):
+        """
+        Initialize ImageWriter.
+
+        Args:
+            image_format (str): The default format, one of IMAGE_FORMATS.
+            quality (int): The WebP and JPEG quality from 1 to 100.
+            compress_level (int): The PNG compression level from 0 to 9.
+            workers (int): The number of images encoded at the same time.
+        """
+        self.image_format = check_image_format(image_format)
+        self.quality = quality
+        self.compress_level = compress_level
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-writer')
+
+    def submit(self, image, path, metadata=None, image_format=None):
+        """
+        Queue an image to be written.
+
+        Args:
+            image (PIL.Image): The image.
+            path (str): The path of the file without extension.
+            metadata (dict): Embedded in the file, see get_save_options.
+            image_format (str): Overrides the default format.
+
+        Returns:
+            concurrent.futures.Future: The path of the written file.
+        """
+        return self._executor.submit(write_image, image, path, image_format or self.image_format,
+                                     metadata, self.quality, self.compress_level)
+
+    def submit_all(self, images, path, metadata=None):
+        """
+        Queue all variants of a result to be written one after another as <path>-<index>.
+
+        Args:
+            images (list[PIL.Image]): The variants.
+            path (str): The path of the files without index and extension.
+            metadata (list[dict]): The metadata of every variant.
+
+        Returns:
+            concurrent.futures.Future: The paths of the written files.
+        """
+        metadata = metadata or []
+
+        def write_all():
+            return [write_image(image, f'{path}-{index}', self.image_format,
+                                metadata[index] if index < len(metadata) else None,
+                                self.quality, self.compress_level)
+                    for index, image in enumerate(images)]
+        return self._executor.submit(write_all)
+
+    def close(self):
+        """
+        Wait for the queued images and stop the background threads.
+        """
+        self._executor.shutdown(wait=True)
+
+
+IMAGE_WRITER = ImageWriter()
@@ -0,0 +1,87 @@
+import os
+import time
+
+from src.lazy_module import LazyModule
+
+torch = LazyModule('torch')
+pil_image = LazyModule('PIL.Image')
+
+# Linear approximation of the SDXL VAE decoder, mapping the 4 latent channels to RGB
+LATENT_RGB_FACTORS = [
+    [0.3651, 0.4232, 0.4341],
+    [-0.2533, -0.0042, 0.1068],
+    [0.1076, 0.1111, -0.0362],
+    [-0.3165, -0.2492, -0.2188]
+]
+LATENT_RGB_BIAS = [0.1084, -0.0175, -0.0011]
+PREVIEW_EVERY = int(os.environ.get('PREVIEW_EVERY', 0))
+PREVIEW_MAX_OVERHEAD = 0.05
+
+
+def latents_to_previews(latents):
+    """
+    Turn a batch of SDXL latents into low-resolution RGB images without the VAE.
+
+    Args:
+        latents (torch.Tensor): The latents of shape (batch, 4, height / 8, width / 8).
+
+    Returns:
+        list[PIL.Image]: One preview per latent, an eighth of the image size.
+    """
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32, device=latents.device)
+    bias = torch.tensor(LATENT_RGB_BIAS, dtype=torch.float32, device=latents.device)
+    rgb = torch.einsum('bchw,cr->bhwr', latents.float(), factors) + bias
+    pixels = ((rgb + 1) * 127.5).clamp(0, 255).to(torch.uint8).cpu().numpy()
+    return [pil_image.fromarray(image_pixels) for image_pixels in pixels]
+
+
+class LatentPreviewer:
+    """
+    Streams previews of the intermediate latents to a callback every few diffusion steps.
+
+    The time spent on previews is measured, and a preview is skipped whenever the previews so far
+    took more than max_overhead of the time spent on diffusion steps.
+    """
+
+    def __init__(self, on_preview, every=4, max_overhead=PREVIEW_MAX_OVERHEAD):
+        """
+        Initialize LatentPreviewer.
+
+        Args:
+            on_preview (callable): Called with the previews, the step, the range of the variants
+                in the current batch and the number of variants.
+            every (int): The number of steps between two previews.
+            max_overhead (float): The maximum preview time as a fraction of the step time.
+        """
+        self.on_preview = on_preview
+        self.every = every
+        self.max_overhead = max_overhead
+        self.step_seconds = 0.0
+        self.preview_seconds = 0.0
+        self.previews = 0
+        self._last_step = None
+
+    def start(self):
+        """
+        Start timing the steps of a new batch.
+        """
+        self._last_step = time.perf_counter()
+
+    def on_step(self, step, latents, variants, total):
+        """
+        Record a finished step and send a preview if one is due and within the overhead cap.
+        """
+        now = time.perf_counter()
+        if self._last_step is not None:
+            self.step_seconds += now - self._last_step
+        if step % self.every == 0 and self.preview_seconds <= self.max_overhead * self.step_seconds:
+            self.on_preview(latents_to_previews(latents), step, variants, total)
+            self.preview_seconds += time.perf_counter() - now
+            self.previews += 1
+        self._last_step = time.perf_counter()
+
+    def overhead(self):
+        """
+        Get the time spent on previews as a fraction of the time spent on diffusion steps.
+        """
+        return self.preview_seconds / self.step_seconds if self.step_seconds else 0.0
@@ -0,0 +1,54 @@
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.image.character_info import get_closest_characters
+from src.image.game_info import GameInfo
+from src.metrics import span
+from src.profiling import is_capturing
+
+
+def run_stage(executor, name, function, *args):
+    """
+    Run a stage of a request in an executor, timed as a span of the current job.
+
+    While a profile is captured, the stage runs right away in the calling thread instead, as
+    cProfile only sees the thread that started it.
+
+    Returns:
+        concurrent.futures.Future: The result of the stage.
+    """
+    def stage():
+        with span(name):
+            return function(*args)
+    if not is_capturing():
+        return executor.submit(contextvars.copy_context().run, stage)
+    future = Future()
+    try:
+        future.set_result(stage())
+    except Exception as error:  # pylint: disable=W0718
+        future.set_exception(error)
+    return future
+
+
+def resolve_inputs(input_values, game_info=None):
+    """
+    Look up the game and the closest characters of a request at the same time.
+
+    Args:
+        input_values (dict): The inputs with the 'game_name' and the 'anime_name'.
+        game_info (GameInfo): The IGDB client, a new one by default.
+
+    Returns:
+        dict: input_values, updated with the 'recency', 'game_tags' and
+            'processed_anime_name'.
+    """
+    game_info = game_info or GameInfo()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        game = run_stage(executor, 'game lookup', game_info.get_game_keywords,
+                         input_values["game_name"])
+        characters = run_stage(executor, 'character match', get_closest_characters,
+                               input_values["anime_name"])
+        recency, game_tags = game.result()
+        input_values["processed_anime_name"] = characters.result()
+    input_values.update({"recency": recency, "game_tags": game_tags})
+    return input_values
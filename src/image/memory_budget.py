@@ -0,0 +1,174 @@
+import os
+import sys
+import threading
+
+from src.lazy_module import LazyModule
+
+torch = LazyModule('torch')
+
+MEMORY_CEILING = (int(os.environ['MEMORY_CEILING_MB']) * 1024 ** 2
+                  if os.environ.get('MEMORY_CEILING_MB') else None)
+# Rough peak activation memory of a 1024x1024 SDXL generation, without and with slicing
+FULL_ACTIVATION_BYTES = 3 * 1024 ** 3
+SLICED_ACTIVATION_BYTES = 1024 ** 3
+SLICING_STRATEGIES = ['attention_slicing', 'vae_slicing', 'vae_tiling']
+
+
+def choose_memory_strategies(ceiling, component_sizes, device):
+    """
+    Choose the memory saving strategies needed to stay below a memory ceiling.
+
+    Slicing and tiling bound the activation memory. Offloading keeps weights in CPU RAM and
+    moves them to the accelerator only while they are used, so it is only chosen when the
+    pipeline does not run on the CPU. On the CPU nothing bounds the weights themselves, see
+    get_weights_overflow.
+
+    Args:
+        ceiling (int): The memory ceiling in bytes, None for no ceiling.
+        component_sizes (dict): The bytes held by each pipeline component.
+        device (str): The device the pipeline runs on.
+
+    Returns:
+        list[str]: The strategies, see apply_memory_strategies.
+    """
+    total = sum(component_sizes.values())
+    if ceiling is None or total + FULL_ACTIVATION_BYTES <= ceiling:
+        return []
+    if total + SLICED_ACTIVATION_BYTES <= ceiling or device == 'cpu':
+        return list(SLICING_STRATEGIES)
+    if max(component_sizes.values(), default=0) + SLICED_ACTIVATION_BYTES <= ceiling:
+        return SLICING_STRATEGIES + ['model_cpu_offload']
+    return SLICING_STRATEGIES + ['sequential_cpu_offload']
+
+
+def get_weights_overflow(ceiling, component_sizes, device):
+    """
+    Get by how many bytes the weights alone exceed a memory ceiling no strategy can meet.
+
+    Only the CPU is affected: there the weights cannot be offloaded anywhere.
+
+    Returns:
+        int: The bytes above the ceiling, 0 if the weights fit or can be offloaded.
+    """
+    if ceiling is None or device != 'cpu':
+        return 0
+    return max(0, sum(component_sizes.values()) - ceiling)
+
+
+def apply_memory_strategies(pipe, strategies):
+    """
+    Enable memory saving strategies on a diffusers pipeline.
+
+    Args:
+        pipe: The pipeline.
+        strategies (list[str]): Any of 'attention_slicing', 'vae_slicing', 'vae_tiling',
+            'model_cpu_offload' and 'sequential_cpu_offload'.
+    """
+    for strategy in strategies:
+        getattr(pipe, f'enable_{strategy}')()
+
+
+def get_peak_rss():
+    """
+    Get the peak resident set size of the process in bytes since the last reset_peak_rss.
+    """
+    try:
+        with open('/proc/self/status', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource  # pylint: disable=C0415
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size to the current one, where the OS supports it (Linux).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='utf-8') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def get_peak_memory(device):
+    """
+    Get the peak memory used on a device since the last reset_peak_memory: the memory allocated
+    by torch on CUDA devices, the resident set size of the process otherwise.
+    """
+    if device.startswith('cuda'):
+        return torch.cuda.max_memory_allocated(device)
+    return get_peak_rss()
+
+
+def reset_peak_memory(device):
+    """
+    Reset the peak memory of a device, see get_peak_memory.
+    """
+    if device.startswith('cuda'):
+        torch.cuda.reset_peak_memory_stats(device)
+    else:
+        reset_peak_rss()
+
+
+class PeakMemoryRecorder:
+    """
+    Records the peak memory on the generation device during each stage of a generation, so it
+    can be compared with MEMORY_CEILING.
+
+    On the CPU only Linux can reset the peak between stages; elsewhere the peak of a stage
+    includes the stages before it.
+    """
+
+    def __init__(self, get_device=lambda: 'cpu'):
+        """
+        Initialize PeakMemoryRecorder.
+
+        Args:
+            get_device (callable): Returns the device the generation runs on.
+        """
+        self.peaks = {}
+        self.get_device = get_device
+        self._stage = None
+        self._device = None
+        self._lock = threading.Lock()
+
+    def start(self, stage):
+        """
+        End the current stage, if any, and start measuring a new one.
+        """
+        with self._lock:
+            self._stop()
+            self._stage = stage
+            self._device = self.get_device()
+            reset_peak_memory(self._device)
+
+    def stop(self):
+        """
+        End the current stage.
+        """
+        with self._lock:
+            self._stop()
+
+    def over_budget(self, ceiling):
+        """
+        Get the stages whose peak exceeded a memory ceiling.
+
+        Returns:
+            dict: The peak in bytes by stage.
+        """
+        with self._lock:
+            return {stage: peak for stage, peak in self.peaks.items() if peak > ceiling}
+
+    def _stop(self):
+        if self._stage is not None:
+            self.peaks[self._stage] = max(self.peaks.get(self._stage, 0),
+                                          get_peak_memory(self._device))
+            self._stage = None
@@ -0,0 +1,165 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_component_sizes(pipe):
+    """
+    Estimate the memory held by each component of a pipeline in bytes.
+
+    Args:
+        pipe: A diffusers pipeline, or any object exposing a ``components`` dict of torch modules.
+
+    Returns:
+        dict: The summed size of all parameters and buffers by component name.
+    """
+    sizes = {}
+    for name, component in getattr(pipe, 'components', {}).items():
+        if not hasattr(component, 'parameters'):
+            continue
+        sizes[name] = sum(tensor.numel() * tensor.element_size() for tensor in
+                          list(component.parameters()) + list(component.buffers()))
+    return sizes
+
+
+def estimate_pipeline_size(pipe):
+    """
+    Estimate the memory held by a pipeline in bytes.
+
+    Args:
+        pipe: A diffusers pipeline, or any object exposing a ``components`` dict of torch modules.
+
+    Returns:
+        int: The summed size of all parameters and buffers of the pipeline components.
+    """
+    return sum(estimate_component_sizes(pipe).values())
+
+
+class PipelineRegistry:
+    """
+    Process-wide, thread-safe cache of loaded pipelines keyed by (model, dtype, device).
+
+    Every combination is loaded once. When a memory budget is set, the least recently used
+    pipelines are evicted until the loaded pipelines fit into it again.
+    """
+
+    def __init__(self, loader, memory_budget=None, size_of=estimate_pipeline_size):
+        """
+        Initialize PipelineRegistry.
+
+        Args:
+            loader (callable): Called as ``loader(model, dtype, device)`` to load a pipeline.
+            memory_budget (int): Optional maximum number of bytes held by cached pipelines.
+            size_of (callable): Returns the size of a loaded pipeline in bytes.
+        """
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self.size_of = size_of
+        self._pipelines = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'load_seconds': 0.0, 'saved_seconds': 0.0}
+
+    def get(self, model, dtype, device):
+        """
+        Return the pipeline for the given combination, loading it on first use.
+
+        Args:
+            model (str): The model name or path.
+            dtype: The torch dtype of the pipeline weights.
+            device (str): The device the pipeline runs on.
+
+        Returns:
+            The loaded pipeline.
+        """
+        key = (model, dtype, device)
+        with self._lock:
+            pipe = self._hit(key)
+            if pipe is not None:
+                return pipe
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                pipe = self._hit(key)
+                if pipe is not None:
+                    return pipe
+
+            start = time.perf_counter()
+            pipe = self.loader(model, dtype, device)
+            load_seconds = time.perf_counter() - start
+            size = self.size_of(pipe)
+
+            with self._lock:
+                self._pipelines[key] = {'pipe': pipe, 'size': size, 'load_seconds': load_seconds}
+                self._stats['misses'] += 1
+                self._stats['load_seconds'] += load_seconds
+                self._evict(keep=key)
+        return pipe
+
+    def warm_up(self, model, dtype, device, background=False):
+        """
+        Load a pipeline ahead of the first request.
+
+        Args:
+            model (str): The model name or path.
+            dtype: The torch dtype of the pipeline weights.
+            device (str): The device the pipeline runs on.
+            background (bool): Load in a daemon thread instead of blocking the caller.
+
+        Returns:
+            threading.Thread: The loading thread if ``background`` is set, otherwise None.
+        """
+        if not background:
+            self.get(model, dtype, device)
+            return None
+        thread = threading.Thread(target=self.get, args=(model, dtype, device), daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        """
+        Drop all cached pipelines.
+        """
+        with self._lock:
+            self._pipelines.clear()
+        gc.collect()
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Hits, misses, evictions, total load time and the load time saved by cache hits,
+                the latter two in seconds, plus the bytes currently held.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = len(self._pipelines)
+            stats['bytes'] = sum(entry['size'] for entry in self._pipelines.values())
+        return stats
+
+    def _hit(self, key):
+        entry = self._pipelines.get(key)
+        if entry is None:
+            return None
+        self._pipelines.move_to_end(key)
+        self._stats['hits'] += 1
+        self._stats['saved_seconds'] += entry['load_seconds']
+        return entry['pipe']
+
+    def _evict(self, keep):
+        if self.memory_budget is None:
+            return
+        evicted = False
+        while sum(entry['size'] for entry in self._pipelines.values()) > self.memory_budget:
+            oldest = next(iter(self._pipelines))
+            if oldest == keep:
+                break
+            del self._pipelines[oldest]
+            self._stats['evictions'] += 1
+            evicted = True
+        if evicted:
+            gc.collect()
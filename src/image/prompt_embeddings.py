@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.lazy_module import LazyModule
+
+torch = LazyModule('torch')
+
+PROMPT_CACHE_SIZE = int(os.environ.get('PROMPT_EMBEDDING_CACHE_SIZE', 64))
+
+
+def encode_prompts(pipe, prompts):
+    """
+    Run the SDXL text encoders of a pipeline on prompts, without classifier-free guidance.
+
+    Returns:
+        tuple: The prompt embeddings and the pooled prompt embeddings, one row per prompt.
+    """
+    with torch.no_grad():
+        prompt_embeds, _, pooled_prompt_embeds, _ = pipe.encode_prompt(
+            prompt=prompts, num_images_per_prompt=1, do_classifier_free_guidance=False)
+    return prompt_embeds, pooled_prompt_embeds
+
+
+class PromptEmbeddingCache:
+    """
+    Reuses the text encoder outputs of a pipeline across generations.
+
+    The embeddings of the negative prompt are computed once per pipeline, those of the prompts
+    are kept in a bounded LRU keyed by the prompt text.
+    """
+
+    def __init__(self, negative_prompt, max_prompts=PROMPT_CACHE_SIZE):
+        """
+        Initialize PromptEmbeddingCache.
+
+        Args:
+            negative_prompt (str): The negative prompt used for every image.
+            max_prompts (int): The maximum number of cached prompt embeddings.
+        """
+        self.negative_prompt = negative_prompt
+        self.max_prompts = max_prompts
+        self._prompts = OrderedDict()
+        self._negative = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'encode_seconds': 0.0}
+
+    def get(self, pipe, pipeline_key, prompts):
+        """
+        Get the precomputed embeddings of a batch, encoding only unknown prompts.
+
+        Args:
+            pipe: The SDXL pipeline whose text encoders are used.
+            pipeline_key (tuple): The (model, dtype, device) of the pipeline.
+            prompts (list[str]): The prompts of the batch.
+
+        Returns:
+            dict: The prompt_embeds, negative_prompt_embeds, pooled_prompt_embeds and
+                negative_pooled_prompt_embeds arguments of the pipeline.
+        """
+        with self._lock:
+            if pipeline_key not in self._negative:
+                self._negative[pipeline_key] = self._encode(pipe, [self.negative_prompt])
+            negative_embeds, negative_pooled_embeds = self._negative[pipeline_key]
+            unknown = list(dict.fromkeys(
+                prompt for prompt in prompts if (pipeline_key, prompt) not in self._prompts))
+            self._stats['hits'] += len(prompts) - len(unknown)
+            self._stats['misses'] += len(unknown)
+            if unknown:
+                prompt_embeds, pooled_embeds = self._encode(pipe, unknown)
+                for index, prompt in enumerate(unknown):
+                    self._prompts[(pipeline_key, prompt)] = (prompt_embeds[index:index + 1],
+                                                             pooled_embeds[index:index + 1])
+            embeddings = []
+            for prompt in prompts:
+                self._prompts.move_to_end((pipeline_key, prompt))
+                embeddings.append(self._prompts[(pipeline_key, prompt)])
+            while len(self._prompts) > self.max_prompts:
+                self._prompts.popitem(last=False)
+        return {
+            'prompt_embeds': torch.cat([embedding for embedding, _ in embeddings]),
+            'pooled_prompt_embeds': torch.cat([pooled for _, pooled in embeddings]),
+            'negative_prompt_embeds': torch.cat([negative_embeds] * len(prompts)),
+            'negative_pooled_prompt_embeds': torch.cat([negative_pooled_embeds] * len(prompts))
+        }
+
+    def clear(self):
+        """
+        Drop all cached embeddings, e.g. after the pipelines were unloaded.
+        """
+        with self._lock:
+            self._prompts.clear()
+            self._negative.clear()
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: The prompt hits and misses, the seconds spent encoding and the number of cached
+                prompts.
+        """
+        with self._lock:
+            return dict(self._stats, cached=len(self._prompts))
+
+    def _encode(self, pipe, prompts):
+        start = time.perf_counter()
+        embeddings = encode_prompts(pipe, prompts)
+        self._stats['encode_seconds'] += time.perf_counter() - start
+        return embeddings
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from src.atomic_file import atomic_write
+from src.lazy_module import LazyModule
+
+pil_image = LazyModule('PIL.Image')
+
+DEFAULT_RESULT_CACHE_DIR = './cache/results'
+DEFAULT_RESULT_CACHE_BUDGET = 2 * 1024 ** 3
+
+
+def get_result_key(params):
+    """
+    Hash everything that determines a generated image.
+
+    Args:
+        params (dict): The prompt, negative prompt, model, scheduler, seed, steps, guidance scale
+            and size of the image.
+
+    Returns:
+        str: The hex digest identifying the image.
+    """
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed store of generated images on disk.
+
+    Every image is saved as PNG next to a JSON file with its generation parameters, both named
+    after get_result_key. Reading an entry marks it as recently used; once the files exceed the
+    disk budget, the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory=DEFAULT_RESULT_CACHE_DIR, max_bytes=DEFAULT_RESULT_CACHE_BUDGET):
+        """
+        Initialize ResultCache.
+
+        Args:
+            directory (str): Where the images are stored.
+            max_bytes (int): The disk budget of the cache, 0 to disable it.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, params):
+        """
+        Get the cached image generated with the given parameters.
+
+        An entry whose image cannot be read, e.g. one truncated by a crash, is deleted and
+        counted as a miss.
+
+        Returns:
+            PIL.Image: The image, None if it is not cached.
+        """
+        if not self.max_bytes:
+            return None
+        key = get_result_key(params)
+        path = self._path(key, '.png')
+        try:
+            with pil_image.open(path) as image:
+                image.load()
+            os.utime(path)
+        except FileNotFoundError:
+            image = None
+        except (OSError, SyntaxError, ValueError) as error:
+            print(f"Deleting unreadable cached image {path}: {error}")
+            self._remove(key)
+            image = None
+        with self._lock:
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return image
+
+    def contains(self, params):
+        """
+        Check whether an image generated with the given parameters is cached, without reading it.
+        """
+        return bool(self.max_bytes) and os.path.exists(self._path(get_result_key(params), '.png'))
+
+    def put(self, params, image):
+        """
+        Store an image and its generation parameters, evicting old entries beyond the budget.
+
+        The cache is optional: if it cannot be written, a warning is printed and the image is
+        not stored.
+        """
+        if not self.max_bytes:
+            return
+        key = get_result_key(params)
+        try:
+            with self._lock:
+                with atomic_write(self._path(key, '.json'), 'w', encoding='utf-8') as file:
+                    json.dump({'params': params, 'created': time.time()}, file)
+                with atomic_write(self._path(key, '.png')) as file:
+                    image.save(file, format='PNG')
+                self._evict()
+        except OSError as error:
+            print(f"Could not store the image in the result cache: {error}")
+
+    def stats(self):
+        """
+        Get the hits, misses and the disk usage of the cache.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'bytes': sum(size for _, size, _ in self._entries())}
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f'{key}{extension}')
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.png'):
+                continue
+            key = name[:-len('.png')]
+            try:
+                image_stat = os.stat(self._path(key, '.png'))
+            except FileNotFoundError:
+                continue
+            metadata_path = self._path(key, '.json')
+            metadata_size = os.path.getsize(metadata_path) if os.path.exists(metadata_path) else 0
+            entries.append((image_stat.st_mtime, image_stat.st_size + metadata_size, key))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key):
+        for extension in ('.png', '.json'):
+            try:
+                os.remove(self._path(key, extension))
+            except OSError:
+                pass
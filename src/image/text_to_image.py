@@ -1,5 +1,23 @@
-import torch
-from diffusers import DiffusionPipeline
+import os
+import random
+import threading
+
+from src.image.execution_profile import apply_profile, get_execution_profile, warm_up_compiled
+from src.image.memory_budget import (
+    MEMORY_CEILING, PeakMemoryRecorder, apply_memory_strategies, choose_memory_strategies,
+    get_weights_overflow
+)
+from src.image.pipeline_registry import PipelineRegistry, estimate_component_sizes
+from src.image.prompt_embeddings import PromptEmbeddingCache
+from src.image.result_cache import (
+    DEFAULT_RESULT_CACHE_BUDGET, DEFAULT_RESULT_CACHE_DIR, ResultCache
+)
+from src.lazy_module import LazyModule, prefetch
+from src.metrics import Cancelled, span
+from src.profiling import label_components
+
+torch = LazyModule('torch')
+diffusers = LazyModule('diffusers')
 
 NEGATIVE_PROMPT = (
     "nsfw, lowres, (bad), text, error, fewer, extra, missing, "
@@ -8,6 +26,126 @@ NEGATIVE_PROMPT = (
     "signature, extra digits, artistic error, username, scan, [abstract]"
 )
 MODEL = "cagliostrolab/animagine-xl-3.1"
+PIPELINE_MEMORY_BUDGET = (int(os.environ['PIPELINE_MEMORY_BUDGET_MB']) * 1024 ** 2
+                          if os.environ.get('PIPELINE_MEMORY_BUDGET_MB') else None)
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 3))
+NUM_INFERENCE_STEPS = 28
+GUIDANCE_SCALE = 7
+IMAGE_SIZE = 1024
+SCHEDULER = None  # the default scheduler of MODEL
+MAX_SEED = 2 ** 32 - 1
+RESULT_CACHE = ResultCache(
+    os.environ.get('RESULT_CACHE_DIR', DEFAULT_RESULT_CACHE_DIR),
+    int(os.environ['RESULT_CACHE_BUDGET_MB']) * 1024 ** 2
+    if os.environ.get('RESULT_CACHE_BUDGET_MB') else DEFAULT_RESULT_CACHE_BUDGET)
+
+
+class GenerationCancelled(Cancelled):
+    """
+    Raised from a step callback to stop the diffusion between two steps.
+    """
+
+
+def load_diffusion_pipeline(model, dtype, device, profile=None):
+    """
+    Load a diffusion pipeline, move it to the given device and apply an execution profile.
+
+    With MEMORY_CEILING set, the memory saving strategies needed to stay below it are enabled.
+    They are chosen from the loaded weights, so loading itself is not bounded; on the CPU a
+    warning is printed if the weights alone exceed the ceiling.
+
+    Args:
+        model (str): The model name or path.
+        dtype: The torch dtype of the pipeline weights.
+        device (str): The device the pipeline runs on.
+        profile (dict): The execution profile, the one selected with EXECUTION_PROFILE by default.
+    """
+    profile = profile or get_execution_profile()
+    pipe = diffusers.DiffusionPipeline.from_pretrained(
+        model,
+        torch_dtype=dtype,
+        use_safetensors=device == 'cuda',
+    )
+    component_sizes = estimate_component_sizes(pipe)
+    overflow = get_weights_overflow(MEMORY_CEILING, component_sizes, device)
+    if overflow:
+        print(f"Warning: the weights of {model} exceed MEMORY_CEILING_MB by "
+              f"{overflow / 1024 ** 2:.0f} MB, which the CPU cannot offload")
+    strategies = choose_memory_strategies(MEMORY_CEILING, component_sizes, device)
+    if device != 'cpu' and not any(strategy.endswith('offload') for strategy in strategies):
+        pipe.to(device)
+    apply_profile(pipe, profile)
+    apply_memory_strategies(pipe, strategies)
+    warm_up_compiled(pipe, profile, IMAGE_SIZE, IMAGE_SIZE)
+    return pipe
+
+
+_WARM_UP = {}
+_WARM_UP_LOCK = threading.Lock()
+PIPELINE_REGISTRY = PipelineRegistry(load_diffusion_pipeline, memory_budget=PIPELINE_MEMORY_BUDGET)
+PROMPT_EMBEDDINGS = PromptEmbeddingCache(NEGATIVE_PROMPT)
+MEMORY_RECORDER = PeakMemoryRecorder(lambda: get_pipeline_key()[2])
+
+
+def get_pipeline_key():
+    """
+    Get the (model, dtype, device) combination used for image generation.
+    """
+    profile = get_execution_profile()
+    return MODEL, getattr(torch, profile['dtype']), profile['device']
+
+
+def prefetch_diffusers():
+    """
+    Import torch and diffusers in a background thread.
+    """
+    return prefetch(torch.import_module, diffusers.import_module)
+
+
+def warm_up_pipeline(background=True):
+    """
+    Load the default pipeline ahead of the first image request.
+
+    The background warm-up runs once per process; torch is imported in the loading thread as
+    well, so the caller does not wait for it. If it fails, the error is raised by the next
+    wait_for_warm_up instead of loading the pipeline a second time, and the following call
+    starts a new warm-up.
+
+    Returns:
+        threading.Thread: The loading thread if ``background`` is set, otherwise None.
+    """
+    if not background:
+        return PIPELINE_REGISTRY.warm_up(*get_pipeline_key())
+    with _WARM_UP_LOCK:
+        if _WARM_UP.get('thread') is None:
+            _WARM_UP['thread'] = prefetch(_warm_up_in_background)
+        return _WARM_UP['thread']
+
+
+def wait_for_warm_up():
+    """
+    Wait for the background warm-up, if one was started, and raise the error it failed with.
+    """
+    with _WARM_UP_LOCK:
+        thread = _WARM_UP.get('thread')
+    if thread is None:
+        return
+    thread.join()
+    with _WARM_UP_LOCK:
+        error = _WARM_UP.pop('error', None)
+        if error is not None and _WARM_UP.get('thread') is thread:
+            _WARM_UP['thread'] = None
+    if error is not None:
+        raise error
+
+
+def _warm_up_in_background():
+    try:
+        warm_up_pipeline(background=False)
+    except Exception as error:  # pylint: disable=W0718
+        print(f"Pipeline warm-up failed: {error!r}")
+        with _WARM_UP_LOCK:
+            _WARM_UP['error'] = error
 
 
 def show_results(images):
@@ -16,7 +154,39 @@ def show_results(images):
         img.show()
 
 
-def create_image(image_params):
+def build_prompts(image_params):
+    """
+    Build one prompt per character variant.
+
+    Args:
+        image_params (dict): The image parameters, see create_image.
+
+    Returns:
+        list[str]: The prompts in the order of 'processed_anime_name', one for 'anime_name' if
+            no character matched.
+    """
+    prompt_parts = [
+        image_params.get('recency', ''),
+        "masterpiece", "best quality", "very aesthetic",
+        image_params.get('gender', ''),
+        "solo", "upper body", "v",
+        image_params.get('facial_expression', ''),
+        f"looking at {image_params.get('looking_at', '')}",
+        image_params.get('indoors', ''),
+        image_params.get('daytime', ''),
+        image_params.get('game_name', ''),
+        ', '.join(image_params.get('game_tags', [])).lower(),
+        image_params.get('additional_tags', '').lower()
+    ]
+    prompt_parts = [part.lower() for part in prompt_parts if part]
+
+    names = image_params.get('processed_anime_name') or image_params['anime_name']
+    if isinstance(names, str):
+        names = [names]
+    return [", ".join(prompt_parts[:4] + [name] + prompt_parts[4:]) for name in names]
+
+
+def create_image(image_params, on_step=None, previewer=None):
     """
     Create an anime-style image based on the provided parameters.
 
@@ -32,47 +202,205 @@ def create_image(image_params):
             - 'indoors': Whether the scene is indoors or outdoors.
             - 'daytime': Whether it's daytime or nighttime.
             - 'additional_tags': Additional tags to provide more context for image generation.
+            - 'max_batch_size': Optional maximum number of variants rendered in one batch.
+            - 'seed': Optional seed of the random latents, see choose_seed.
+        on_step (callable): Called after every diffusion step, see render_prompts.
+        previewer (LatentPreviewer): Streams previews of the intermediate latents.
 
     Returns:
         tuple: A tuple containing the generated images and the output filename.
     """
-    pipe = DiffusionPipeline.from_pretrained(
-        MODEL,
-        torch_dtype=torch.float16,
-        use_safetensors=torch.cuda.is_available(),
-    )
+    with span('prompt assembly'):
+        prompts = build_prompts(image_params)
+    images = render_prompts(prompts, image_params.get('max_batch_size', MAX_BATCH_SIZE), on_step,
+                            previewer, choose_seed(image_params))
+    return images, get_output_filename(image_params)
 
-    if torch.cuda.is_available():
-        pipe.to('cuda')
 
-    prompt_parts = [
-        image_params.get('recency', ''),
-        "masterpiece", "best quality", "very aesthetic",
-        image_params.get('gender', ''),
-        "solo", "upper body", "v",
-        image_params.get('facial_expression', ''),
-        f"looking at {image_params.get('looking_at', '')}",
-        image_params.get('indoors', ''),
-        image_params.get('daytime', ''),
-        image_params.get('game_name', ''),
-        ', '.join(image_params.get('game_tags', [])).lower(),
-        image_params.get('additional_tags', '').lower()
-    ]
-    prompt_parts = [part.lower() for part in prompt_parts if part]
+def choose_seed(image_params):
+    """
+    Get the seed of a request, choosing a random one if it has none.
+
+    The seed is recorded in image_params, so the saved metadata and the result cache key tell
+    how to render the same images again.
+
+    Returns:
+        int: The seed of the random latents.
+    """
+    if image_params.get('seed') in (None, ''):
+        image_params['seed'] = random.randint(0, MAX_SEED)
+    image_params['seed'] = int(image_params['seed'])
+    return image_params['seed']
+
+
+def reuse_seed(image_params, last_image_params):
+    """
+    Give a request without seed the seed of the last request if all other inputs are the same,
+    so repeating a request returns its images instead of new random ones.
+
+    Returns:
+        bool: Whether the seed was reused.
+    """
+    if image_params.get('seed') not in (None, '') or 'seed' not in last_image_params:
+        return False
+    if ({key: value for key, value in image_params.items() if key != 'seed'}
+            != {key: value for key, value in last_image_params.items() if key != 'seed'}):
+        return False
+    image_params['seed'] = last_image_params['seed']
+    return True
+
+
+def may_be_cached(image_params, last_image_params):
+    """
+    Check before the lookups whether the images of a request may already exist: it has a seed,
+    or it repeats the last request, whose seed reuse_seed gives it.
+    """
+    return image_params.get('seed') not in (None, '') or all(
+        last_image_params.get(key) == value for key, value in image_params.items()
+        if key != 'seed')
+
+
+def is_cached(image_params):
+    """
+    Check whether all images of a request with seed are in RESULT_CACHE, so rendering them needs
+    no pipeline.
+    """
+    if image_params.get('seed') in (None, ''):
+        return False
+    seed = int(image_params['seed'])
+    return all(RESULT_CACHE.contains(get_generation_params(prompt, seed))
+               for prompt in build_prompts(image_params))
 
-    images = []
-    for name in image_params.get('processed_anime_name', image_params['anime_name']):
-        images += pipe(
-            prompt=", ".join(prompt_parts[:4] + [name] + prompt_parts[4:]),
-            negative_prompt=NEGATIVE_PROMPT,
-            width=1024,
-            height=1024,
-            guidance_scale=7,
-            num_inference_steps=28
-        ).images
 
-    return images, (f"./output/{image_params['anime_name'].replace(' ', '_')}_"
-                    f"{image_params['game_name'].replace(' ', '_')}")
+def get_generation_params(prompt, seed):
+    """
+    Get everything that determines the image rendered for a prompt.
+    """
+    return {
+        'prompt': prompt,
+        'negative_prompt': NEGATIVE_PROMPT,
+        'model': MODEL,
+        'scheduler': SCHEDULER,
+        'seed': seed,
+        'steps': NUM_INFERENCE_STEPS,
+        'guidance_scale': GUIDANCE_SCALE,
+        'width': IMAGE_SIZE,
+        'height': IMAGE_SIZE
+    }
+
+
+def get_image_metadata(image_params):
+    """
+    Get the prompt, seed and generation parameters of every variant created for image_params.
+    """
+    seed = choose_seed(image_params)
+    return [get_generation_params(prompt, seed) for prompt in build_prompts(image_params)]
+
+
+# pylint: disable-next=R0913,R0917
+def render_prompts(prompts, max_batch_size=MAX_BATCH_SIZE, on_step=None, previewer=None,
+                   seed=None):
+    """
+    Render one image per prompt with the default pipeline.
+
+    Images rendered before are taken from RESULT_CACHE; the pipeline is only loaded if at least
+    one image is missing. The text encoder outputs are taken from PROMPT_EMBEDDINGS.
+
+    Args:
+        prompts (list[str]): The prompts, e.g. from build_prompts.
+        max_batch_size (int): The maximum number of prompts rendered in one batch.
+        on_step (callable): Called after every diffusion step with the finished step, the number
+            of steps, the range of the variants in the current batch and the number of variants
+            to render. It may raise GenerationCancelled to stop the rendering.
+        previewer (LatentPreviewer): Streams previews of the intermediate latents.
+        seed (int): The seed of the random latents of every image, a random one by default.
+
+    Returns:
+        list[PIL.Image]: The images in the order of prompts.
+    """
+    if seed is None:
+        seed = random.randint(0, MAX_SEED)
+    generation_params = [get_generation_params(prompt, seed) for prompt in prompts]
+    with span('result cache lookup'):
+        images = [RESULT_CACHE.get(image_params) for image_params in generation_params]
+    missing = [index for index, image in enumerate(images) if image is None]
+    if not missing:
+        return images
+
+    batch_size = max(1, max_batch_size)
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        if previewer:
+            previewer.start()
+        rendered = render_batch(
+            [prompts[index] for index in batch], seed,
+            get_step_callback(on_step, previewer, range(start, start + len(batch)), len(missing))
+            if on_step or previewer else None)
+        with span('result cache save', variants=len(batch)):
+            for index, image in zip(batch, rendered):
+                images[index] = image
+                RESULT_CACHE.put(generation_params[index], image)
+    return images
+
+
+def render_batch(prompts, seed, callback_on_step_end=None):
+    """
+    Render a batch of prompts in one call of the default pipeline.
+
+    The peak memory of loading, text encoding, denoising and VAE decoding is recorded in
+    MEMORY_RECORDER, the duration of loading, text encoding and diffusion in spans.
+    """
+    def callback(pipe, step, timestep, callback_kwargs):
+        if step + 1 == NUM_INFERENCE_STEPS:
+            MEMORY_RECORDER.start('vae decode')
+        if callback_on_step_end:
+            return callback_on_step_end(pipe, step, timestep, callback_kwargs)
+        return callback_kwargs
+
+    try:
+        MEMORY_RECORDER.start('load')
+        with span('model load'):
+            wait_for_warm_up()
+            pipeline_key = get_pipeline_key()
+            pipe = PIPELINE_REGISTRY.get(*pipeline_key)
+        MEMORY_RECORDER.start('text encoding')
+        with span('text encoding', variants=len(prompts)):
+            embeddings = PROMPT_EMBEDDINGS.get(pipe, pipeline_key, prompts)
+        MEMORY_RECORDER.start('denoising')
+        with span('diffusion', variants=len(prompts)), label_components(pipe):
+            return pipe(
+                **embeddings,
+                width=IMAGE_SIZE,
+                height=IMAGE_SIZE,
+                guidance_scale=GUIDANCE_SCALE,
+                num_inference_steps=NUM_INFERENCE_STEPS,
+                generator=[torch.Generator().manual_seed(seed) for _ in prompts],
+                callback_on_step_end=callback
+            ).images
+    finally:
+        MEMORY_RECORDER.stop()
+
+
+def get_step_callback(on_step, previewer, variants, total):
+    """
+    Adapt on_step and previewer of render_prompts to the callback_on_step_end interface of
+    diffusers.
+    """
+    def callback(_pipe, step, _timestep, callback_kwargs):
+        if previewer:
+            previewer.on_step(step + 1, callback_kwargs['latents'], variants, total)
+        if on_step:
+            on_step(step + 1, NUM_INFERENCE_STEPS, variants, total)
+        return callback_kwargs
+    return callback
+
+
+def get_output_filename(image_params):
+    """
+    Get the output path of an image without timestamp and extension.
+    """
+    return (f"./output/{image_params['anime_name'].replace(' ', '_')}_"
+            f"{image_params['game_name'].replace(' ', '_')}")
 
 
 if __name__ == "__main__":
@@ -107,3 +435,4 @@ if __name__ == "__main__":
     second_result, second_output_filename = create_image(params2)
     show_results(first_result)
     show_results(second_result)
+    print(PIPELINE_REGISTRY.stats())
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+from src.atomic_file import atomic_write
+
+TWITCH_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+DEFAULT_TOKEN_PATH = './resources/twitch_token.json'
+REFRESH_BEFORE_EXPIRY = 24 * 3600
+EXPIRY_MARGIN = 60
+RETRY_AFTER = 300
+_DEFAULT_MANAGER = {}
+_DEFAULT_MANAGER_LOCK = threading.Lock()
+
+
+class TwitchTokenManager:  # pylint: disable=R0902
+    """
+    Twitch app access token shared by all IGDB clients and threads.
+
+    The token is persisted to disk, so it survives restarts. Once it is about to expire it is
+    refreshed in the background while the current token keeps being handed out. Callers that
+    need a token while none is valid wait for the same single refresh request.
+    """
+
+    def __init__(self, client_id, client_secret, path=DEFAULT_TOKEN_PATH,
+                 refresh_before=REFRESH_BEFORE_EXPIRY):
+        """
+        Initialize TwitchTokenManager.
+
+        Args:
+            client_id (str): The Twitch client id.
+            client_secret (str): The Twitch client secret.
+            path (str): Where the token is persisted, None to keep it in memory only.
+            refresh_before (float): How many seconds before its expiry the token is refreshed.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.path = path
+        self.refresh_before = refresh_before
+        self.token = None
+        self._pending = None
+        self._retry_at = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        """
+        Get a valid token, requesting a new one only if there is none.
+
+        Returns:
+            dict: The token with its 'access_token' and the 'expires_at' timestamp.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            remaining = self.token['expires_at'] - time.time() if self.token else 0
+            if remaining > EXPIRY_MARGIN:
+                if (remaining < self.refresh_before and self._pending is None
+                        and time.time() >= self._retry_at):
+                    self._pending = Future()
+                    threading.Thread(target=self._refresh, args=(self._pending,),
+                                     daemon=True).start()
+                return self.token
+            pending = self._pending
+            if pending is None:
+                pending = self._pending = Future()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            self._refresh(pending)
+        return pending.result()
+
+    def warm_up(self):
+        """
+        Load or request the token ahead of the first IGDB request, ignoring network errors.
+        """
+        try:
+            self.get_token()
+        except (requests.RequestException, KeyError, ValueError) as error:
+            print(f"Twitch authentication failed: {error}")
+
+    def _refresh(self, pending):
+        try:
+            response = requests.post(TWITCH_TOKEN_URL, data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "client_credentials"
+            }, timeout=10)
+            response.raise_for_status()
+            token = response.json()
+            token['expires_at'] = time.time() + token['expires_in']
+        except (requests.RequestException, KeyError, ValueError) as error:
+            with self._lock:
+                self._pending = None
+                self._retry_at = time.time() + RETRY_AFTER
+            pending.set_exception(error)
+            return
+        with self._lock:
+            self.token = token
+            self._pending = None
+        pending.set_result(token)
+        try:
+            self._save(token)
+        except OSError as error:
+            print(f"Could not save the Twitch token: {error}")
+
+    def _load(self):
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as file:
+            stored = json.load(file)
+        if stored.get('client_id') == self.client_id:
+            self.token = stored['token']
+
+    def _save(self, token):
+        if not self.path:
+            return
+        with atomic_write(self.path, 'w', encoding='utf-8', permissions=0o600) as file:
+            json.dump({'client_id': self.client_id, 'token': token}, file)
+
+
+def get_default_token_manager():
+    """
+    Get the TwitchTokenManager for TWITCH_CLIENT_ID shared by all GameInfo instances.
+    """
+    with _DEFAULT_MANAGER_LOCK:
+        if 'manager' not in _DEFAULT_MANAGER:
+            _DEFAULT_MANAGER['manager'] = TwitchTokenManager(
+                os.environ.get('TWITCH_CLIENT_ID'), os.environ.get('TWITCH_CLIENT_SECRET'))
+        return _DEFAULT_MANAGER['manager']
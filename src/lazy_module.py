@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Heavy dependencies like torch or nltk are declared at module level as usual, but only cost
+    their import time when they are used.
+    """
+
+    def __init__(self, name):
+        """
+        Initialize LazyModule.
+
+        Args:
+            name (str): The dotted name of the module to import.
+        """
+        self._lazy_name = name
+
+    def import_module(self):
+        """
+        Import the module, if that has not happened yet, and return it.
+        """
+        return importlib.import_module(self._lazy_name)
+
+    def __getattr__(self, attribute):
+        return getattr(self.import_module(), attribute)
+
+    def __repr__(self):
+        return f"<lazy module '{self._lazy_name}'>"
+
+
+def prefetch(*tasks):
+    """
+    Run loading tasks, e.g. LazyModule.import_module, one after another in a daemon thread.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    def run():
+        for task in tasks:
+            task()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
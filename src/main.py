@@ -1,4 +1,4 @@
-import io
+import contextlib
 import os
 import sys
 import threading
@@ -7,13 +7,25 @@ import time
 from PySide6.QtWidgets import (  # pylint: disable=E0611
     QApplication, QMainWindow, QLabel,
     QLineEdit, QPushButton, QVBoxLayout,
-    QWidget, QHBoxLayout
+    QWidget, QHBoxLayout, QCheckBox
 )
-from PySide6.QtGui import QPixmap, QImage  # pylint: disable=E0611
-from PySide6.QtCore import Qt  # pylint: disable=E0611
-from src.image.game_info import GameInfo
-from src.image.text_to_image import create_image
-from src.image.character_info import get_closest_characters
+from PySide6.QtGui import QIcon, QPixmap, QImage  # pylint: disable=E0611
+from PySide6.QtCore import (  # pylint: disable=E0611
+    Qt, QTimer, QObject, QRunnable, QSize, QThreadPool, Signal
+)
+from src.image.game_info import prefetch_nltk
+from src.image.text_to_image import (
+    GenerationCancelled, create_image, get_image_metadata, is_cached, may_be_cached,
+    prefetch_diffusers, reuse_seed, warm_up_pipeline
+)
+from src.image.display_cache import THUMBNAIL_SIZE, DisplayCache, get_display_buffer
+from src.image.image_writer import IMAGE_WRITER
+from src.image.lookups import resolve_inputs
+from src.image.latent_preview import PREVIEW_EVERY, LatentPreviewer
+from src.image.twitch_auth import get_default_token_manager
+from src.lazy_module import prefetch
+from src.metrics import collect_spans, enable_metrics_log, format_breakdown, span
+from src.profiling import capture_profile, is_capturing
 
 
 def read_stylesheet(file_path):
@@ -32,6 +44,38 @@ def read_stylesheet(file_path):
         return file.read()
 
 
+def start_background_loading():
+    """
+    Load NLTK, torch, diffusers and the Twitch token in background threads, so the first
+    generation does not wait for them. Set PREFETCH_DEPENDENCIES=0 to load them on first use
+    instead.
+    """
+    if os.environ.get('PREFETCH_DEPENDENCIES', '1') != '0':
+        prefetch_nltk()
+        prefetch_diffusers()
+        prefetch(get_default_token_manager().warm_up)
+    if os.environ.get('PIPELINE_WARM_UP'):
+        warm_up_pipeline()
+
+
+def report_saved(future):
+    """
+    Print where the images of an IMAGE_WRITER future were saved, or why they were not.
+    """
+    error = future.exception()
+    if error:
+        print(f"Saving failed: {error!r}")
+        return
+    paths = future.result()
+    print(f"Image saved as: {paths if isinstance(paths, str) else ', '.join(paths)}")
+
+
+QIMAGE_FORMATS = {
+    'RGB': QImage.Format.Format_RGB888,
+    'RGBA': QImage.Format.Format_RGBA8888
+}
+
+
 def pil2pixmap(image):
     """
     Convert a PIL image to a QPixmap.
@@ -42,11 +86,8 @@ def pil2pixmap(image):
     Returns:
         QPixmap: The converted QPixmap.
     """
-    bytes_img = io.BytesIO()
-    image.save(bytes_img, format='PNG')
-    qimg = QImage()
-    qimg.loadFromData(bytes_img.getvalue())
-    return QPixmap.fromImage(qimg)
+    data, width, height, bytes_per_line, mode = get_display_buffer(image)
+    return QPixmap.fromImage(QImage(data, width, height, bytes_per_line, QIMAGE_FORMATS[mode]))
 
 
 class AnimeImageGenerator:
@@ -62,41 +103,221 @@ class AnimeImageGenerator:
         self.output_filename = None
         self.images = []
         self.current_index = 0
+        self.display = DisplayCache(pil2pixmap)
 
-    def process_image(self, input_values, window_element):
+    def process_image(self, input_values, on_status=print, on_step=None, previewer=None):
         """
         Process an image based on input values.
 
+        The game lookup, the character resolution and the pipeline loading run concurrently;
+        the generation waits for the pipeline once the prompts are built. While a profile is
+        captured, they run one after another, so the profile covers all of them. Repeating the
+        last request without seed returns its images, see reuse_seed.
+
+        The pipeline is only loaded if an image may be missing from the result cache: right away
+        for a request without seed that differs from the last one, otherwise once the prompts
+        show a cache miss. A fully cached request never loads the model.
+
         Args:
             input_values (dict): A dictionary containing input values.
-            window_element: The window element to update with the generated image.
+            on_status (callable): Called with a description of the current stage.
+            on_step (callable): Called after every diffusion step, see create_image.
+            previewer (LatentPreviewer): Streams previews of the intermediate latents.
+
+        Returns:
+            tuple: The generated images and the output filename.
         """
-        window_element.input_controls["progress_label"].setText("Generating image...")
-        game_info = GameInfo()
-        recency, game_tags = game_info.get_game_keywords(input_values["game_name"])
-        input_values["processed_anime_name"] = (
-            get_closest_characters(input_values["anime_name"]))
-        input_values.update({"recency": recency, "game_tags": game_tags})
+        on_status("Looking up game and character...")
+        if not is_capturing() and not may_be_cached(input_values, self.last_input_values):
+            warm_up_pipeline()
+        resolve_inputs(input_values)
 
+        reuse_seed(input_values, self.last_input_values)
         if input_values == self.last_input_values and self.output_filename:
-            window_element.image_controls["image_label"].show()
-            window_element.show_image()
-        else:
-            self.images, self.output_filename = create_image(input_values)
-            window_element.show_image()
-            self.last_input_values = input_values
+            return self.images, self.output_filename
+        if not is_capturing() and not is_cached(input_values):
+            warm_up_pipeline()
+        on_status("Generating image...")
+        with span('generation'):
+            return create_image(input_values, on_step, previewer)
+
+    def set_result(self, input_values, images, output_filename):
+        """
+        Make the result of process_image the current images.
+        """
+        self.last_input_values = input_values
+        self.images = images
+        self.output_filename = output_filename
+        self.current_index = 0
+        self.display.set_images(images)
+
+    def get_pixmap(self, index):
+        """
+        Get the image at an index for display, see DisplayCache.pixmap.
+        """
+        return self.display.pixmap(index)
+
+    def get_thumbnail(self, index):
+        """
+        Get a downscaled copy of the image at an index, see DisplayCache.thumbnail.
+        """
+        return self.display.thumbnail(index)
 
     def save_image(self):
         """
-        Save the current image.
+        Save the current image in the background, with its generation parameters as metadata.
+
+        Returns:
+            concurrent.futures.Future: The path of the written file, None without image.
+        """
+        if not self.output_filename:
+            return None
+        metadata = get_image_metadata(self.last_input_values)
+        future = IMAGE_WRITER.submit(
+            self.images[self.current_index],
+            f'{self.output_filename}-{time.strftime("%Y%m%d-%H%M%S")}',
+            metadata[self.current_index] if self.current_index < len(metadata) else None)
+        future.add_done_callback(report_saved)
+        return future
+
+    def save_all_images(self):
+        """
+        Save all variants in the background, with their generation parameters as metadata.
+
+        Returns:
+            concurrent.futures.Future: The paths of the written files, None without images.
+        """
+        if not self.output_filename:
+            return None
+        future = IMAGE_WRITER.submit_all(
+            self.images, f'{self.output_filename}-{time.strftime("%Y%m%d-%H%M%S")}',
+            get_image_metadata(self.last_input_values))
+        future.add_done_callback(report_saved)
+        return future
+
+
+class JobSignals(QObject):
+    """
+    Signals of a GenerationJob, delivered to slots in the main thread.
+    """
+    status = Signal(str)
+    step = Signal(int, int, int, int, int)
+    preview = Signal(object)
+    finished = Signal(object, object, str, object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+
+class GenerationJob(QRunnable):
+    """
+    One image request, processed in a worker thread of the JobScheduler.
+    """
+
+    def __init__(self, image_generator, input_values, profile=False):
+        """
+        Initialize GenerationJob.
+
+        Args:
+            image_generator (AnimeImageGenerator): Processes the request.
+            input_values (dict): The inputs of the request.
+            profile (bool): Whether to capture a profile of the request, see capture_profile.
+        """
+        super().__init__()
+        self.image_generator = image_generator
+        self.input_values = input_values
+        self.profile = profile
+        self.signals = JobSignals()
+        self.previewer = (LatentPreviewer(self.on_preview, PREVIEW_EVERY)
+                          if PREVIEW_EVERY > 0 else None)
+        self.done = False
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Cancel the job before it starts or after the current diffusion step.
         """
-        if self.output_filename:
-            full_filename = f'{self.output_filename}-{time.strftime("%Y%m%d-%H%M%S")}.png'
-            self.images[self.current_index].save(full_filename)
-            print(f"Image saved as: {full_filename}")
+        self._cancelled.set()
 
+    def on_step(self, step, steps, variants, total):
+        """
+        Report the progress of a diffusion step and stop if the job was cancelled.
+        """
+        if self._cancelled.is_set():
+            raise GenerationCancelled()
+        self.signals.step.emit(step, steps, variants.start + 1, variants.stop, total)
+
+    def on_preview(self, previews, *_):
+        """
+        Send the preview of the first variant of the current batch to the window.
+        """
+        self.signals.preview.emit(previews[0])
+
+    def run(self):
+        try:
+            if self._cancelled.is_set():
+                raise GenerationCancelled()
+            profiler = (capture_profile(dict(self.input_values)) if self.profile
+                        else contextlib.nullcontext())
+            with profiler, collect_spans() as spans:
+                images, output_filename = self.image_generator.process_image(
+                    self.input_values, self.signals.status.emit, self.on_step, self.previewer)
+        except GenerationCancelled:
+            self.done = True
+            self.signals.cancelled.emit()
+        except Exception as error:  # pylint: disable=W0718
+            self.done = True
+            self.signals.failed.emit(str(error))
+        else:
+            self.done = True
+            self.signals.finished.emit(self.input_values, images, output_filename, spans)
 
-class AnimeCharacterImageGenerator(QMainWindow):
+
+class JobScheduler:
+    """
+    Queues image requests and processes them one after another in a QThreadPool.
+    """
+
+    def __init__(self, image_generator):
+        """
+        Initialize JobScheduler.
+
+        Args:
+            image_generator (AnimeImageGenerator): Processes the requests.
+        """
+        self.image_generator = image_generator
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.jobs = []
+
+    def submit(self, input_values, profile=False):
+        """
+        Queue an image request, optionally capturing a profile of it.
+
+        Returns:
+            GenerationJob: The job, whose signals report its progress.
+        """
+        job = GenerationJob(self.image_generator, input_values, profile)
+        job.setAutoDelete(False)
+        self.jobs.append(job)
+        self.pool.start(job)
+        return job
+
+    def pending(self):
+        """
+        Get the number of queued or running jobs.
+        """
+        self.jobs = [job for job in self.jobs if not job.done]
+        return len(self.jobs)
+
+    def cancel_all(self):
+        """
+        Cancel the running job and all queued jobs.
+        """
+        for job in self.jobs:
+            job.cancel()
+
+
+class AnimeCharacterImageGenerator(QMainWindow):  # pylint: disable=R0902
     """
     Class representing the main window of the Anime Character Image Generator application.
     """
@@ -107,6 +328,7 @@ class AnimeCharacterImageGenerator(QMainWindow):
         """
         super().__init__()
         self.image_generator = AnimeImageGenerator()
+        self.scheduler = JobScheduler(self.image_generator)
         self.inputs = {
             "anime_name": QLineEdit(),
             "game_name": QLineEdit(),
@@ -114,7 +336,8 @@ class AnimeCharacterImageGenerator(QMainWindow):
             "looking_at": QLineEdit("viewer"),
             "indoors": QLineEdit("indoors"),
             "daytime": QLineEdit("night"),
-            "additional_tags": QLineEdit()
+            "additional_tags": QLineEdit(),
+            "seed": QLineEdit()
         }
         self.inputs_labels = {
             "anime_name": "Anime character name",
@@ -123,17 +346,21 @@ class AnimeCharacterImageGenerator(QMainWindow):
             "looking_at": "Looking at",
             "indoors": "Indoors/outdoors",
             "daytime": "Daytime/night",
-            "additional_tags": "Additional tags (Separated by commas)"
+            "additional_tags": "Additional tags (Separated by commas)",
+            "seed": "Seed (empty for a random one)"
         }
         self.input_controls = {
             "progress_label": QLabel(""),
-            "generate_button": QPushButton("Generate Image")
+            "generate_button": QPushButton("Generate Image"),
+            "cancel_button": QPushButton("Cancel"),
+            "profile_checkbox": QCheckBox("Capture a profile to ./output")
         }
         self.inputs_layout = None
         self.image_controls = {
             "image_label": QLabel(""),
             "back_button": QPushButton("Back"),
-            "save_button": QPushButton("Save Image")
+            "save_button": QPushButton("Save Image"),
+            "save_all_button": QPushButton("Save All Variants")
         }
         self.image_navigation_buttons = {
             "prev_button": QPushButton("<"),
@@ -159,6 +386,7 @@ class AnimeCharacterImageGenerator(QMainWindow):
 
         # Input controls
         self.input_controls["generate_button"].clicked.connect(self.generate_image)
+        self.input_controls["cancel_button"].clicked.connect(self.scheduler.cancel_all)
         self.input_controls["progress_label"].setAlignment(Qt.AlignmentFlag.AlignCenter)
 
         # Image controls
@@ -167,9 +395,13 @@ class AnimeCharacterImageGenerator(QMainWindow):
         self.image_navigation_buttons["prev_button"].clicked.connect(self.show_previous_image)
         self.image_navigation_buttons["next_button"].clicked.connect(self.show_next_image)
         self.image_controls["save_button"].clicked.connect(self.image_generator.save_image)
+        self.image_controls["save_all_button"].clicked.connect(
+            self.image_generator.save_all_images)
 
         # Image navigation buttons
         navigation_button_layout = QHBoxLayout()
+        for button in self.image_navigation_buttons.values():
+            button.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
         navigation_button_layout.addWidget(self.image_navigation_buttons["prev_button"])
         navigation_button_layout.addWidget(self.image_navigation_buttons["next_button"])
 
@@ -193,13 +425,68 @@ class AnimeCharacterImageGenerator(QMainWindow):
             self.input_controls["progress_label"].setText(
                 "Please enter an anime character name.")
             return
-        self.input_controls["generate_button"].setDisabled(True)
-
         input_values = {key: widget.text().lower().replace(',', ' ').lstrip().rstrip()
                         for key, widget in self.inputs.items()}
+        if input_values["seed"] and not input_values["seed"].isdigit():
+            self.input_controls["progress_label"].setText(
+                "Please enter a whole number as seed.")
+            return
+        # An empty seed is replaced by a random one when the images are created
+        input_values["seed"] = int(input_values["seed"]) if input_values["seed"] else None
+
+        job = self.scheduler.submit(
+            input_values, self.input_controls["profile_checkbox"].isChecked())
+        job.signals.status.connect(self.show_status)
+        job.signals.step.connect(self.show_step)
+        job.signals.preview.connect(self.show_preview)
+        job.signals.finished.connect(self.show_result)
+        job.signals.failed.connect(self.show_failure)
+        job.signals.cancelled.connect(self.show_cancelled)
+        self.show_status("Queued")
+
+    def show_status(self, status):
+        """
+        Show the state of the current job and the number of jobs waiting behind it.
+        """
+        waiting = self.scheduler.pending() - 1
+        self.input_controls["progress_label"].setText(
+            f"{status} ({waiting} more queued)" if waiting > 0 else status)
+
+    def show_step(self, step, steps, first_variant, last_variant, variants):
+        """
+        Show the progress of the diffusion.
+        """
+        variant = (f"{first_variant}" if first_variant == last_variant
+                   else f"{first_variant}-{last_variant}")
+        self.show_status(f"Variant {variant} of {variants}: step {step}/{steps}")
 
-        threading.Thread(target=self.image_generator.process_image,
-                         args=(input_values, self)).start()
+    def show_preview(self, preview):
+        """
+        Show a preview of the image being generated.
+        """
+        self.image_controls["image_label"].setPixmap(pil2pixmap(preview))
+        self.image_controls["image_label"].show()
+
+    def show_result(self, input_values, images, output_filename, spans):
+        """
+        Show the images of a finished job and the time spent in each of its stages.
+        """
+        self.image_generator.set_result(input_values, images, output_filename)
+        self.show_image()
+        self.show_status(f"Done with seed {input_values['seed']}: {format_breakdown(spans)}")
+        self.input_controls["progress_label"].show()
+
+    def show_failure(self, error):
+        """
+        Show why a job failed.
+        """
+        self.show_status(f"Generation failed: {error}")
+
+    def show_cancelled(self):
+        """
+        Show that a job was cancelled.
+        """
+        self.show_status("Cancelled")
 
     def show_image(self):
         """
@@ -218,12 +505,16 @@ class AnimeCharacterImageGenerator(QMainWindow):
         for item in self.image_controls.values():
             item.show()
 
+        index = self.image_generator.current_index
         if len(self.image_generator.images) != 1:
             for item in self.image_navigation_buttons.values():
                 item.show()
+            for button, neighbour in (("prev_button", index - 1), ("next_button", index + 1)):
+                self.image_navigation_buttons[button].setIcon(
+                    QIcon(self.image_generator.get_thumbnail(neighbour))
+                    if 0 <= neighbour < len(self.image_generator.images) else QIcon())
 
-        pixmap = pil2pixmap(self.image_generator.images[self.image_generator.current_index])
-        self.image_controls["image_label"].setPixmap(pixmap)
+        self.image_controls["image_label"].setPixmap(self.image_generator.get_pixmap(index))
 
     def show_input_fields(self):
         """
@@ -244,7 +535,6 @@ class AnimeCharacterImageGenerator(QMainWindow):
 
         for item in self.input_controls.values():
             item.show()
-        self.input_controls["generate_button"].setEnabled(True)
 
     def show_previous_image(self):
         """
@@ -264,6 +554,7 @@ class AnimeCharacterImageGenerator(QMainWindow):
 
 
 if __name__ == '__main__':
+    enable_metrics_log()
     app = QApplication(sys.argv)
     stylesheet = read_stylesheet('./resources/form.css')
     if stylesheet:
@@ -271,4 +562,5 @@ if __name__ == '__main__':
     window = AnimeCharacterImageGenerator()
     window.resize(1000, 1000)
     window.show()
+    QTimer.singleShot(0, start_background_loading)
     sys.exit(app.exec())
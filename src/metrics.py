@@ -0,0 +1,178 @@
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+METRICS_LOG = os.environ.get('METRICS_LOG')
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+LOGGER = logging.getLogger('anigame.metrics')
+_SPANS = contextvars.ContextVar('spans', default=None)
+_PARENT = contextvars.ContextVar('parent', default=None)
+
+
+class Cancelled(Exception):
+    """
+    Base of the errors stopping a request on purpose, recorded by spans as cancelled instead of
+    failed.
+    """
+
+
+class MetricsRegistry:
+    """
+    In-process counters and latency histograms, shared by all threads.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Initialize MetricsRegistry.
+
+        Args:
+            buckets (tuple[float]): The upper bounds of the histogram buckets in seconds.
+        """
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """
+        Add to a counter.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """
+        Record a duration in a latency histogram.
+        """
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {
+                'count': 0, 'sum': 0.0, 'min': seconds, 'max': seconds,
+                'buckets': [0] * (len(self.buckets) + 1)
+            })
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['min'] = min(histogram['min'], seconds)
+            histogram['max'] = max(histogram['max'], seconds)
+            histogram['buckets'][bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def snapshot(self):
+        """
+        Get a copy of all metrics.
+
+        Returns:
+            dict: The 'counters' by name and the 'histograms' by name, each with its 'count',
+                'sum', 'min', 'max' and the 'buckets' counts, the last one above all bounds.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {name: dict(histogram, buckets=list(histogram['buckets']))
+                               for name, histogram in self._histograms.items()}
+            }
+
+    def reset(self):
+        """
+        Remove all metrics.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+METRICS = MetricsRegistry()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Time a stage of a request.
+
+    The duration is recorded in the METRICS histogram of the stage, logged as a JSON line and
+    added to the spans of the enclosing collect_spans, with the enclosing span as parent.
+    Failures are counted in '<name>.errors', cancellations in '<name>.cancelled'.
+
+    Args:
+        name (str): The stage name.
+        **attributes: Additional JSON serializable fields of the log line.
+    """
+    start = time.perf_counter()
+    status = 'ok'
+    parent = _PARENT.get()
+    token = _PARENT.set(name)
+    try:
+        yield
+    except Cancelled:
+        status = 'cancelled'
+        METRICS.increment(f'{name}.cancelled')
+        raise
+    except BaseException:
+        status = 'error'
+        METRICS.increment(f'{name}.errors')
+        raise
+    finally:
+        _PARENT.reset(token)
+        seconds = time.perf_counter() - start
+        METRICS.observe(name, seconds)
+        spans = _SPANS.get()
+        if spans is not None:
+            spans.append((name, seconds, parent))
+        if LOGGER.isEnabledFor(logging.INFO):
+            LOGGER.info(json.dumps(dict(attributes, span=name, seconds=round(seconds, 6),
+                                        status=status)))
+
+
+@contextlib.contextmanager
+def collect_spans():
+    """
+    Collect the spans finished in the current context, e.g. one job.
+
+    Yields:
+        list[tuple]: The (name, seconds, parent name) of the spans in the order they finished,
+            the parent None for the top-level spans.
+    """
+    spans = []
+    token = _SPANS.set(spans)
+    try:
+        yield spans
+    finally:
+        _SPANS.reset(token)
+
+
+def format_breakdown(spans, parent=None):
+    """
+    Summarize spans as the total seconds per top-level stage, followed by the stages nested in
+    it, e.g. "game lookup 0.41 s, generation 9.90 s (model load 0.10 s, diffusion 9.80 s)".
+
+    Args:
+        spans (list[tuple]): The spans of collect_spans.
+        parent (str): Only summarize the spans nested in this one.
+    """
+    totals = {}
+    for name, seconds, span_parent in spans:
+        if span_parent == parent:
+            totals[name] = totals.get(name, 0) + seconds
+    parts = []
+    for name, seconds in totals.items():
+        children = format_breakdown(spans, name) if name != parent else ''
+        parts.append(f"{name} {seconds:.2f} s ({children})" if children
+                     else f"{name} {seconds:.2f} s")
+    return ", ".join(parts)
+
+
+def enable_metrics_log(target=METRICS_LOG):
+    """
+    Write the span log lines to a file, or to stderr for '-'. Does nothing without a target.
+    """
+    if not target:
+        return
+    handler = (logging.StreamHandler(sys.stderr) if target == '-'
+               else logging.FileHandler(target, encoding='utf-8'))
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    LOGGER.addHandler(handler)
+    LOGGER.setLevel(logging.INFO)
@@ -0,0 +1,158 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import time
+
+from src.lazy_module import LazyModule
+
+torch = LazyModule('torch')
+
+PROFILE_DIR = './output'
+PROFILED_COMPONENTS = {'unet': 'forward', 'vae': 'decode'}
+REPORT_LINES = 40
+_CAPTURING = contextvars.ContextVar('capturing', default=False)
+_PROFILE_NUMBERS = itertools.count(1)
+
+
+def get_profile_path(input_values, directory=PROFILE_DIR):
+    """
+    Get the path of the profile files of a job without extension, e.g.
+    "./output/profile-kita_ikuyo_tekken_7-20240101-120000-1".
+
+    The label includes the job 'id' if there is one, and every path ends with a number counting
+    the profiles of the process, so jobs profiled within the same second do not collide.
+    """
+    label = '_'.join(str(input_values[key]) for key in ('id', 'anime_name', 'game_name')
+                     if input_values.get(key))
+    label = re.sub(r'[^\w-]+', '_', label).strip('_').lower() or 'job'
+    return os.path.join(directory, f'profile-{label}-{time.strftime("%Y%m%d-%H%M%S")}-'
+                                   f'{next(_PROFILE_NUMBERS)}')
+
+
+def start_torch_profiler():
+    """
+    Start the torch profiler on the CPU, and on CUDA if available.
+
+    Returns:
+        The running profiler, None if torch is not installed.
+    """
+    try:
+        activities = [torch.profiler.ProfilerActivity.CPU]
+    except ImportError:
+        return None
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+    profiler.start()
+    return profiler
+
+
+@contextlib.contextmanager
+def capture_profile(input_values, directory=PROFILE_DIR):
+    """
+    Profile everything run in the block, e.g. one process_image or create_image call.
+
+    Writes, next to each other:
+        - <path>.prof: The cProfile stats, for snakeviz or flameprof flamegraphs.
+        - <path>.txt: The functions with the highest cumulative time.
+        - <path>.trace.json: The torch profiler trace, for chrome://tracing or Perfetto, with
+          the calls of PROFILED_COMPONENTS labelled, see label_components.
+        - <path>.operators.txt: The CPU time per torch operator.
+        - <path>.json: The input values of the job.
+
+    Failing to write the files is reported without replacing the outcome of the block.
+
+    Args:
+        input_values (dict): The inputs of the job, which also label the files.
+        directory (str): Where the files are written.
+    """
+    path = get_profile_path(input_values, directory)
+    torch_profiler = start_torch_profiler()
+    python_profiler = cProfile.Profile()
+    token = _CAPTURING.set(True)
+    python_profiler.enable()
+    try:
+        yield path
+    finally:
+        python_profiler.disable()
+        _CAPTURING.reset(token)
+        if torch_profiler is not None:
+            torch_profiler.stop()
+        try:
+            write_profile(path, input_values, python_profiler, torch_profiler)
+        except Exception as error:  # pylint: disable=W0718
+            print(f"Could not write the profile {path}: {error!r}")
+
+
+def write_profile(path, input_values, python_profiler, torch_profiler=None):
+    """
+    Write the files of capture_profile.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.json', 'w', encoding='utf-8') as file:
+        json.dump(input_values, file, indent=2, default=str)
+    python_profiler.dump_stats(f'{path}.prof')
+    report = io.StringIO()
+    pstats.Stats(python_profiler, stream=report).sort_stats('cumulative').print_stats(
+        REPORT_LINES)
+    with open(f'{path}.txt', 'w', encoding='utf-8') as file:
+        file.write(report.getvalue())
+    if torch_profiler is not None:
+        torch_profiler.export_chrome_trace(f'{path}.trace.json')
+        with open(f'{path}.operators.txt', 'w', encoding='utf-8') as file:
+            file.write(torch_profiler.key_averages().table(sort_by='self_cpu_time_total',
+                                                           row_limit=REPORT_LINES))
+    print(f"Profile saved as: {path}.*")
+
+
+def is_capturing():
+    """
+    Check whether the current code runs inside capture_profile.
+    """
+    return _CAPTURING.get()
+
+
+@contextlib.contextmanager
+def label_components(pipe, components=None):
+    """
+    Label the calls of pipeline components in the torch profiler trace while capturing.
+
+    Args:
+        pipe: The diffusers pipeline.
+        components (dict): The method to label by component name, PROFILED_COMPONENTS by default.
+    """
+    if not is_capturing():
+        yield
+        return
+    wrapped = []
+    for component, method in (components or PROFILED_COMPONENTS).items():
+        module = getattr(pipe, component, None)
+        if module is None:
+            continue
+        wrapped.append((module, method, vars(module).get(method)))
+        setattr(module, method, _record(f'{component}.{method}', getattr(module, method)))
+    try:
+        yield
+    finally:
+        for module, method, original in wrapped:
+            if original is None:
+                delattr(module, method)
+            else:
+                setattr(module, method, original)
+
+
+def _record(name, function):
+    @functools.wraps(function)
+    def recorded(*args, **kwargs):
+        with torch.profiler.record_function(name):
+            return function(*args, **kwargs)
+    return recorded
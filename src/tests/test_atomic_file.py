@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+from src.atomic_file import FILE_MODE, atomic_write
+
+
+class TestAtomicFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+
+    def test_atomic_write(self):
+        path = os.path.join(self.directory.name, 'tables', 'genres.json')
+
+        with atomic_write(path, 'w', encoding='utf-8') as file:
+            file.write('{}')
+            self.assertFalse(os.path.exists(path))
+        with atomic_write(path, 'w', encoding='utf-8', permissions=0o600) as file:
+            file.write('{"4": "Fighting"}')
+
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), '{"4": "Fighting"}')
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['genres.json'])
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_failed_write_keeps_the_file(self):
+        path = os.path.join(self.directory.name, 'genres.json')
+        with atomic_write(path) as file:
+            file.write(b'old')
+
+        with self.assertRaises(ValueError), atomic_write(path) as file:
+            file.write(b'partial')
+            raise ValueError()
+
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), b'old')
+        self.assertEqual(os.listdir(self.directory.name), ['genres.json'])
+        self.assertEqual(os.stat(path).st_mode & 0o777, FILE_MODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
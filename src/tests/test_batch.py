@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from src.batch import ProgressManifest, Stage, StagedPipeline, read_jobs
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_read_jobs(self):
+        csv_path = self.write('jobs.csv', "anime_name,game_name,daytime\n"
+                                          "Asuka Langley,Tekken 7,\n"
+                                          "Mio,Final Fantasy VII,day\n")
+        jsonl_path = self.write('jobs.jsonl', json.dumps({"id": "asuka",
+                                                          "anime_name": "Asuka Langley",
+                                                          "game_name": "Tekken 7",
+                                                          "seed": 0}) + "\n\n")
+
+        csv_jobs = list(read_jobs(csv_path))
+        jsonl_jobs = list(read_jobs(jsonl_path))
+
+        self.assertEqual([job['id'] for job in csv_jobs], ["1", "2"])
+        self.assertEqual([job['daytime'] for job in csv_jobs], ["night", "day"])
+        self.assertEqual(jsonl_jobs[0]['id'], "asuka")
+        self.assertEqual(jsonl_jobs[0]['facial_expression'], "smile")
+        self.assertEqual(jsonl_jobs[0]['seed'], 0)
+        self.assertNotIn('seed', csv_jobs[0])
+
+    def test_read_jobs_rejects_bad_rows(self):
+        for name, content in (('jobs.jsonl', '{"anime_name": "Mio"'),
+                              ('jobs.csv', "anime_name,game_name\nMio,\n")):
+            with self.assertRaises(ValueError):
+                list(read_jobs(self.write(name, content)))
+
+    def test_bad_input_file_stops_the_run(self):
+        finished, errors = [], []
+        path = self.write('jobs.jsonl', '{"anime_name": "Mio", "game_name": "Tekken 7"}\n'
+                                        'not json\n')
+        pipeline = StagedPipeline([Stage("lookup", lambda job: job, workers=2),
+                                   Stage("save", finished.append)])
+
+        def run():
+            try:
+                pipeline.run(read_jobs(path))
+            except ValueError as error:
+                errors.append(error)
+
+        runner = threading.Thread(target=run, daemon=True)
+        runner.start()
+        runner.join(5)
+
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertEqual([job['id'] for job in finished], ["1"])
+        with self.assertRaises(FileNotFoundError):
+            pipeline.run(read_jobs(os.path.join(self.directory.name, 'missing.csv')))
+
+    def test_manifest_resumes(self):
+        path = os.path.join(self.directory.name, 'manifest.jsonl')
+        ProgressManifest(path).record("1", ["./output/1-0.png"])
+
+        manifest = ProgressManifest(path)
+
+        self.assertTrue(manifest.is_finished("1"))
+        self.assertFalse(manifest.is_finished("2"))
+        self.assertEqual(manifest.finished["1"], ["./output/1-0.png"])
+
+    def test_stages_overlap(self):
+        finished = []
+
+        def slow(job):
+            time.sleep(0.1)
+            return job
+
+        def fail_odd(job):
+            if job['id'] % 2:
+                raise ValueError("odd job")
+            return job
+
+        stages = [Stage("lookup", slow), Stage("filter", fail_odd), Stage("render", slow),
+                  Stage("save", finished.append)]
+        pipeline = StagedPipeline(stages, queue_size=1)
+
+        pipeline.run({'id': number} for number in range(6))
+        report = pipeline.report()
+
+        self.assertEqual(finished, [{'id': 0}, {'id': 2}, {'id': 4}])
+        self.assertLess(pipeline.wall_seconds, 0.85)
+        self.assertEqual(report['filter']['processed'], 3)
+        self.assertEqual(report['filter']['failed'], 3)
+        self.assertEqual(report['save']['processed'], 3)
+        self.assertGreater(report['lookup']['utilization'], 0.5)
+
+    def test_background_failure_counted(self):
+        stage = Stage("save", lambda job: job)
+        pipeline = StagedPipeline([stage])
+        pipeline.run({'id': number} for number in range(3))
+
+        stage.record_failure(1, OSError("disk full"))
+
+        self.assertEqual((pipeline.report()['save']['processed'],
+                          pipeline.report()['save']['failed']), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+from src.image.character_catalog import CharacterCatalog, parse_character_line
+
+CHARACTER_LINES = ["1boy, male focus, uzumaki naruto, naruto \\(series\\)",
+                   "1girl, uzumaki himawari, naruto \\(series\\)",
+                   "1girl, akiyama mio, k-on!",
+                   "1girl, nakano azusa, k-on!",
+                   "no separators",
+                   ""]
+
+
+class TestCharacterCatalog(unittest.TestCase):
+    def test_parse_character_line(self):
+        self.assertEqual(parse_character_line(CHARACTER_LINES[0]),
+                         ("1boy, male focus", "uzumaki naruto", "naruto \\(series\\)"))
+        self.assertEqual(parse_character_line("no separators"), ("", "no separators", ""))
+
+    def test_fields(self):
+        catalog = CharacterCatalog.from_lines(CHARACTER_LINES)
+
+        self.assertEqual(len(catalog), 5)
+        self.assertEqual(catalog.gender(0), "1boy, male focus")
+        self.assertEqual(catalog.name(1), "uzumaki himawari")
+        self.assertEqual(catalog.series(3), "k-on!")
+        self.assertEqual(catalog.lines(), CHARACTER_LINES[:5])
+
+    def test_select(self):
+        catalog = CharacterCatalog.from_lines(CHARACTER_LINES)
+
+        self.assertEqual(catalog.select(series="K-ON!"), [2, 3])
+        self.assertEqual(catalog.select(gender="1boy"), [0])
+        self.assertEqual(catalog.select(series="naruto \\(series\\)", gender="1girl"), [1])
+        self.assertEqual(catalog.lines(gender="1girl"), CHARACTER_LINES[1:4])
+
+    def test_save_and_load(self):
+        catalog = CharacterCatalog.from_lines(CHARACTER_LINES)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "characters.catalog")
+            catalog.save(path)
+            loaded = CharacterCatalog.load(path)
+
+            self.assertEqual(loaded.lines(), catalog.lines())
+            self.assertEqual(loaded.select(series="k-on!"), [2, 3])
+            self.assertAlmostEqual(loaded.created, catalog.created)
+            self.assertEqual(os.listdir(directory), ["characters.catalog"])
+
+    def test_failed_save_leaves_no_file(self):
+        catalog = CharacterCatalog.from_lines(CHARACTER_LINES)
+        with tempfile.TemporaryDirectory() as directory:
+            with patch('os.replace', Mock(side_effect=OSError("disk full"))):
+                with self.assertRaises(OSError):
+                    catalog.save(os.path.join(directory, "characters.catalog"))
+
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_load_rejects_other_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "characters.catalog")
+            with open(path, "wb") as file:
+                file.write(b"\0" * 64)
+
+            with self.assertRaises(ValueError):
+                CharacterCatalog.load(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import random
+import unittest
+from unittest.mock import patch
+from thefuzz import process, fuzz
+from src.image.character_index import CharacterIndex, min_overlap
+from src.image.character_info import get_character_index
+
+SYLLABLES = ["na", "ru", "to", "u", "zu", "ma", "ki", "a", "su", "ka", "lan", "gley",
+             "ri", "mi", "ko", "sa", "ta", "hi", "yo", "shi", "ro", "chan"]
+
+
+def random_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+
+def random_character_list(rng, size):
+    series = [f"{random_word(rng)} {random_word(rng)}" for _ in range(40)]
+    return [f"{rng.choice(['1girl', '1boy, male focus'])}, {random_word(rng)} "
+            f"{random_word(rng)}, {rng.choice(series)}" for _ in range(size)]
+
+
+class TestCharacterIndex(unittest.TestCase):
+    def test_matches_thefuzz(self):
+        rng = random.Random(7)
+        characters = random_character_list(rng, 2000)
+        characters += characters[:50]
+        index = CharacterIndex(characters)
+        queries = ([f"{random_word(rng)} {random_word(rng)}" for _ in range(40)]
+                   + ["xxxxxxxxxxxxxxxx", "A", "Asuka Langley", ""])
+
+        for query in queries:
+            for limit in (1, 3):
+                expected = process.extractBests(query.lower(), characters,
+                                                scorer=fuzz.partial_token_sort_ratio,
+                                                score_cutoff=50, limit=limit)
+                self.assertEqual(index.search(query.lower(), limit=limit, score_cutoff=50),
+                                 expected, query)
+
+    def test_min_overlap(self):
+        self.assertEqual(min_overlap(100, 10), 10)
+        self.assertEqual(min_overlap(50, 9), 3)
+        self.assertEqual(min_overlap(0, 10), 0)
+
+    @patch('src.image.character_info.CharacterIndex', wraps=CharacterIndex)
+    def test_index_rebuilt_only_when_list_changes(self, mock_index):
+        characters = ["1girl, akiyama mio, k-on!", "1girl, nakano azusa, k-on!"]
+
+        first = get_character_index(list(characters))
+        second = get_character_index(list(characters))
+        third = get_character_index(characters + ["1girl, hirasawa yui, k-on!"])
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+        self.assertEqual(mock_index.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
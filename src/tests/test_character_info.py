@@ -1,7 +1,12 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, Mock
+import requests
+from src.image import character_info
 from src.image.character_info import (
-    get_all_characters, get_closest_character, get_closest_characters
+    close_character_pool, get_all_characters, get_closest_character, get_closest_characters,
+    get_closest_characters_many
 )
 
 
@@ -10,8 +15,22 @@ class TestCharacterFunctions(unittest.TestCase):
         super().__init__(methodName)
         self.character_list = ["souryuu asuka langley", "warrior of light (ff14)"]
 
-    @patch('requests.get')
-    def test_get_all_characters(self, mock_get):
+    def setUp(self):
+        self.catalog_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        catalog_path = os.path.join(self.catalog_dir.name, 'characters.catalog')
+        path_patch = patch.object(character_info, 'CATALOG_PATH', catalog_path)
+        path_patch.start()
+        self.addCleanup(path_patch.stop)
+        self.addCleanup(self.catalog_dir.cleanup)
+        character_info._CATALOG_CACHE.clear()  # pylint: disable=W0212
+        self.session = Mock()
+        session_patch = patch.object(character_info, 'get_character_session',
+                                     Mock(return_value=self.session))
+        session_patch.start()
+        self.addCleanup(session_patch.stop)
+
+    def test_get_all_characters(self):
+        mock_get = self.session.get
         mock_response = Mock()
         response_body = ("1girl, souryuu asuka langley, neon genesis evangelion\n"
                          "1girl, warrior of light \\(ff14\\), final fantasy\n"
@@ -35,8 +54,8 @@ class TestCharacterFunctions(unittest.TestCase):
         self.assertIsInstance(characters, list)
         self.assertTrue(all(isinstance(c, str) for c in characters))
 
-    @patch('requests.get')
-    def test_get_closest_character(self, mock_get):
+    def test_get_closest_character(self):
+        mock_get = self.session.get
         mock_response = Mock()
         response_body = ("1girl, souryuu asuka langley, neon genesis evangelion\n"
                          "1girl, warrior of light \\(ff14\\), final fantasy\n"
@@ -58,8 +77,8 @@ class TestCharacterFunctions(unittest.TestCase):
 
         self.assertEqual(closest_name, "1girl, souryuu asuka langley, neon genesis evangelion")
 
-    @patch('requests.get')
-    def test_get_closest_characters(self, mock_get):
+    def test_get_closest_characters(self):
+        mock_get = self.session.get
         mock_response = Mock()
         response_body = ("1boy, male focus, uzumaki naruto, naruto \\(series\\)\n"
                          "1boy, male focus, uzumaki boruto, naruto \\(series\\)\n"
@@ -75,8 +94,8 @@ class TestCharacterFunctions(unittest.TestCase):
                                          '1boy, male focus, uzumaki boruto, naruto \\(series\\)',
                                          '1girl, uzumaki himawari, naruto \\(series\\)'])
 
-    @patch('requests.get')
-    def test_get_closest_character_not_found(self, mock_get):
+    def test_get_closest_character_not_found(self):
+        mock_get = self.session.get
         mock_response = Mock()
         response_body = ("1boy, male focus, uzumaki naruto, naruto \\(series\\)\n"
                          "1boy, male focus, uzumaki boruto, naruto \\(series\\)\n"
@@ -88,6 +107,96 @@ class TestCharacterFunctions(unittest.TestCase):
         closest_name = get_closest_character("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
 
         self.assertIsNone(closest_name)
+        self.assertEqual(get_closest_characters("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"), [])
+
+    def test_get_closest_characters_by_gender(self):
+        mock_get = self.session.get
+        mock_response = Mock()
+        mock_response.text = ("1boy, male focus, uzumaki naruto, naruto \\(series\\)\n"
+                              "1girl, uzumaki himawari, naruto \\(series\\)\n")
+        mock_get.return_value = mock_response
+
+        closest_names = get_closest_characters("Uzumaki", 3, gender="1girl")
+
+        self.assertEqual(closest_names, ['1girl, uzumaki himawari, naruto \\(series\\)'])
+
+    def test_catalog_used_offline(self):
+        mock_get = self.session.get
+        mock_response = Mock()
+        mock_response.text = "1girl, akiyama mio, k-on!\n"
+        mock_get.return_value = mock_response
+        get_all_characters()
+        character_info._CATALOG_CACHE.clear()  # pylint: disable=W0212
+        mock_get.side_effect = requests.ConnectionError()
+
+        with patch.object(character_info, 'CATALOG_MAX_AGE', -1):
+            characters = get_all_characters()
+            character_info._CATALOG_CACHE['refresh'].join()  # pylint: disable=W0212
+
+        self.assertEqual(characters, ["1girl, akiyama mio, k-on!"])
+        self.assertEqual(get_all_characters(), ["1girl, akiyama mio, k-on!"])
+
+    def test_expired_catalog_refreshed_in_background(self):
+        mock_get = self.session.get
+        mock_response = Mock()
+        mock_response.text = "1girl, akiyama mio, k-on!\n"
+        mock_get.return_value = mock_response
+        get_all_characters()
+        refreshed_response = Mock()
+        refreshed_response.text = "1girl, akiyama mio, k-on!\n1girl, nakano azusa, k-on!\n"
+        mock_get.return_value = refreshed_response
+
+        with patch.object(character_info, 'CATALOG_MAX_AGE', -1):
+            characters = get_all_characters()
+            character_info._CATALOG_CACHE['refresh'].join()  # pylint: disable=W0212
+
+        self.assertEqual(characters, ["1girl, akiyama mio, k-on!"])
+        self.assertEqual(get_all_characters(), ["1girl, akiyama mio, k-on!",
+                                                "1girl, nakano azusa, k-on!"])
+        self.assertEqual(mock_get.call_args.kwargs['refresh'], True)
+
+    def test_unwritable_catalog_kept_in_memory(self):
+        mock_get = self.session.get
+        mock_response = Mock()
+        mock_response.text = "1girl, akiyama mio, k-on!\n"
+        mock_get.return_value = mock_response
+        get_all_characters()
+        mock_response.text = "1girl, nakano azusa, k-on!\n"
+
+        with patch.object(character_info.CharacterCatalog, 'save',
+                          Mock(side_effect=OSError("read-only file system"))):
+            with patch.object(character_info, 'CATALOG_MAX_AGE', -1):
+                characters = get_all_characters()
+                character_info._CATALOG_CACHE['refresh'].join()  # pylint: disable=W0212
+            self.assertEqual(get_all_characters(), ["1girl, akiyama mio, k-on!"])
+
+            character_info._CATALOG_CACHE.clear()  # pylint: disable=W0212
+            os.remove(character_info.CATALOG_PATH)
+            self.assertEqual(get_all_characters(), ["1girl, nakano azusa, k-on!"])
+
+        self.assertEqual(characters, ["1girl, akiyama mio, k-on!"])
+
+    def test_get_closest_characters_many(self):
+        mock_get = self.session.get
+        mock_response = Mock()
+        mock_response.text = ("1boy, male focus, uzumaki naruto, naruto \\(series\\)\n"
+                              "1boy, male focus, uzumaki boruto, naruto \\(series\\)\n"
+                              "1girl, souryuu asuka langley, neon genesis evangelion\n"
+                              "1girl, akiyama mio, k-on!\n")
+        mock_get.return_value = mock_response
+        names = ["Naruto Uzumaki", "Asuka Langley", "xxxxxxxxxxxxxxxx", "mio"] * 10
+
+        self.addCleanup(close_character_pool)
+
+        expected = [get_closest_characters(name) for name in names]
+
+        self.assertEqual(get_closest_characters_many(names, workers=1), expected)
+        self.assertEqual(get_closest_characters_many(names, workers=2), expected)
+        pool = character_info._POOL['executor']  # pylint: disable=W0212
+        self.assertEqual(get_closest_characters_many(names, workers=2), expected)
+        self.assertIs(character_info._POOL['executor'], pool)  # pylint: disable=W0212
+        self.assertIn([], expected)
+        mock_get.assert_called_once()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import Mock
+from src.image.display_cache import DisplayCache, get_display_buffer, get_thumbnail_size
+
+
+class FakeImage:
+    def __init__(self, mode='RGB', width=1024, height=1024, info=None):
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.info = info or {}
+
+    def convert(self, mode):
+        return FakeImage(mode, self.width, self.height)
+
+    def tobytes(self):
+        return bytes(self.width * self.height * len(self.mode))
+
+    def resize(self, size):
+        return FakeImage(self.mode, *size)
+
+
+class TestDisplayCache(unittest.TestCase):
+    def test_get_display_buffer(self):
+        data, width, height, bytes_per_line, mode = get_display_buffer(FakeImage('RGBA', 3, 2))
+
+        self.assertEqual((width, height, bytes_per_line, mode), (3, 2, 12, 'RGBA'))
+        self.assertEqual(len(data), bytes_per_line * height)
+        self.assertEqual(get_display_buffer(FakeImage('RGB', 5, 1))[3:], (15, 'RGB'))
+
+    def test_get_display_buffer_converts_other_modes(self):
+        self.assertEqual(get_display_buffer(FakeImage('L', 5, 1))[3:], (15, 'RGB'))
+        self.assertEqual(get_display_buffer(FakeImage('LA', 5, 1))[3:], (20, 'RGBA'))
+        self.assertEqual(get_display_buffer(FakeImage('P', 5, 1, {'transparency': 0}))[3:],
+                         (20, 'RGBA'))
+
+    def test_get_thumbnail_size(self):
+        self.assertEqual(get_thumbnail_size(1024, 1024, 96), (96, 96))
+        self.assertEqual(get_thumbnail_size(1024, 512, 96), (96, 48))
+        self.assertEqual(get_thumbnail_size(64, 32, 96), (64, 32))
+        self.assertEqual(get_thumbnail_size(4096, 1, 96), (96, 1))
+
+    def test_only_displayed_pixmap_is_kept(self):
+        to_pixmap = Mock(side_effect=lambda image: (image.width, image.height, object()))
+        cache = DisplayCache(to_pixmap, thumbnail_size=96)
+        cache.set_images([FakeImage(), FakeImage(width=512)])
+
+        first = cache.pixmap(0)
+        self.assertIs(cache.pixmap(0), first)
+        cache.pixmap(1)
+        self.assertIsNot(cache.pixmap(0), first)
+        self.assertEqual(to_pixmap.call_count, 3)
+
+    def test_thumbnails_are_scaled_before_conversion(self):
+        to_pixmap = Mock(side_effect=lambda image: (image.width, image.height))
+        cache = DisplayCache(to_pixmap, thumbnail_size=96)
+        cache.set_images([FakeImage(), FakeImage(width=512)])
+
+        self.assertEqual(cache.thumbnail(1), (48, 96))
+        self.assertEqual(cache.thumbnail(1), (48, 96))
+        self.assertEqual(to_pixmap.call_count, 1)
+
+        cache.set_images([FakeImage(width=96, height=96)])
+        self.assertEqual(cache.thumbnail(0), (96, 96))
+        self.assertEqual(to_pixmap.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from src.image import execution_profile
+from src.image.execution_profile import configure_threads, resolve_profile
+
+
+class TestExecutionProfile(unittest.TestCase):
+    def setUp(self):
+        torch_patch = patch.object(execution_profile, 'torch', MagicMock())
+        self.torch = torch_patch.start()
+        self.addCleanup(torch_patch.stop)
+
+    def test_auto_profile(self):
+        torch = self.torch
+        torch.cuda.is_available.return_value = True
+        self.assertEqual(resolve_profile('auto')['dtype'], 'float16')
+
+        torch.cuda.is_available.return_value = False
+        profile = resolve_profile('auto', threads=6)
+
+        self.assertEqual(profile['name'], 'cpu')
+        self.assertEqual((profile['threads'], profile['interop_threads']), (6, 1))
+        self.assertTrue(profile['channels_last'])
+        self.assertFalse(profile['compile'])
+
+    def test_cpu_dtype_follows_bfloat16_support(self):
+        with patch("src.image.execution_profile.cpu_supports_bfloat16", return_value=True):
+            self.assertEqual(resolve_profile('cpu')['dtype'], 'bfloat16')
+            self.assertEqual(resolve_profile('cpu-fp32')['dtype'], 'float32')
+        with patch("src.image.execution_profile.cpu_supports_bfloat16", return_value=False):
+            self.assertEqual(resolve_profile('cpu-compile')['dtype'], 'float32')
+            self.assertTrue(resolve_profile('cpu-compile')['compile'])
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            resolve_profile('tpu')
+
+    def test_configure_threads(self):
+        torch = self.torch
+        torch.set_num_interop_threads.side_effect = RuntimeError
+
+        configure_threads(resolve_profile('cpu-fp32', threads=4))
+        configure_threads(resolve_profile('cuda'))
+
+        torch.set_num_threads.assert_called_once_with(4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,14 @@
+import threading
 import time
 import unittest
 import random
-from unittest.mock import patch, Mock
+from unittest.mock import MagicMock, patch, Mock
 from src.image.game_info import (
-    GameInfo, get_year_recency, DATE_RECENCY,
-    get_summary_keywords, is_relevant_adjective
+    GameInfo, get_year_recency, DATE_RECENCY, ensure_nltk_data, prefetch_nltk,
+    get_summary_keywords, get_summary_keywords_many, is_relevant_adjective
 )
+from src.image.genre_registry import GenreRegistry
+from src.image.twitch_auth import TwitchTokenManager
 
 TEKKEN_GAME_INFO = {
     'id': 7498,
@@ -24,7 +27,7 @@ TEKKEN_GAME_INFO = {
 class TestGameInfo(unittest.TestCase):
     def __init__(self, methodName: str = "runTest") -> None:
         super().__init__(methodName)
-        self.game_info = GameInfo()
+        self.game_info = GameInfo(genre_registry=GenreRegistry(path=None))
 
     @patch('requests.post')
     def test_authenticate(self, mock_post):
@@ -39,23 +42,24 @@ class TestGameInfo(unittest.TestCase):
         }
         mock_response.json.return_value = response_body
         mock_post.return_value = mock_response
+        token_manager = TwitchTokenManager("someClientId", "someSecret", path=None)
+        game_infos = [GameInfo(token_manager=token_manager) for _ in range(2)]
 
-        self.game_info.authenticate()
+        for game_info in game_infos:
+            game_info.authenticate()
 
-        self.assertIsNotNone(self.game_info.token)
-        self.assertTrue(time.time() - response_body["expires_in"]
-                        < self.game_info.authentication_time)
+        self.assertEqual(game_infos[1].token["access_token"], "someAccessToken")
+        self.assertTrue(time.time() < game_infos[1].token["expires_at"])
+        mock_post.assert_called_once()
 
-    @patch("requests.post")
+    @patch("src.image.igdb_client.IGDBTransport.post")
     @patch("src.image.game_info.GameInfo.authenticate", Mock())
     def test_get_game_info(self, mock_post_info):
         """
         Test IGDB Response on https://api.igdb.com/v4/games
         """
-        mock_response = Mock()
         response_body = [TEKKEN_GAME_INFO, {}]
-        mock_response.json.return_value = response_body
-        mock_post_info.return_value = mock_response
+        mock_post_info.return_value = response_body
         self.game_info.token = {
             "access_token": "someAccessToken",
             "expires_in": 9112004,
@@ -65,19 +69,17 @@ class TestGameInfo(unittest.TestCase):
 
         self.assertEqual(response_body[0], info)
 
-    @patch("requests.post")
+    @patch("src.image.igdb_client.IGDBTransport.post")
     @patch("src.image.game_info.GameInfo.authenticate", Mock())
     def test_get_genres(self, mock_post):
         """
         Test IGDB Response on https://api.igdb.com/v4/genres
         """
-        mock_response = Mock()
         response_body = [{
             "id": 4,
             "name": "Fighting"
         }]
-        mock_response.json.return_value = response_body
-        mock_post.return_value = mock_response
+        mock_post.return_value = response_body
         self.game_info.token = {
             "access_token": "someAccessToken",
             "expires_in": 9112004,
@@ -104,6 +106,49 @@ class TestGameInfo(unittest.TestCase):
         self.assertIsNotNone(keywords)
         self.assertIn("Fighting", keywords[1])
 
+    @patch("src.image.igdb_client.IGDBTransport.post")
+    @patch("src.image.game_info.get_summary_keywords_many",
+           Mock(side_effect=lambda summaries: [['epic']] * len(summaries)))
+    @patch("src.image.game_info.GameInfo.authenticate", Mock())
+    def test_get_game_keywords_many(self, mock_post):
+        """
+        Test batched lookups through https://api.igdb.com/v4/multiquery
+        """
+        def multiquery(endpoint, query, headers):  # pylint: disable=W0613
+            if endpoint == 'genres':
+                return [{"id": 4, "name": "Fighting"}]
+            return [{"name": str(i), "result": [TEKKEN_GAME_INFO] if i % 2 == 0 else []}
+                    for i in range(query.count("query games"))]
+
+        mock_post.side_effect = multiquery
+        self.game_info.token = {
+            "access_token": "someAccessToken",
+            "expires_in": 9112004,
+            "token_type": "bearer"
+        }
+        keywords = self.game_info.get_game_keywords_many(['Tekken 7', 'Unknown'] * 6)
+
+        self.assertEqual(len(keywords), 12)
+        self.assertEqual(keywords[0][0], 'mid')
+        self.assertCountEqual(keywords[0][1], ['Fighting', 'epic'])
+        self.assertTrue(all(keyword is None for keyword in keywords[1::2]))
+        self.assertEqual([call.args[0] for call in mock_post.call_args_list],
+                         ['multiquery', 'multiquery', 'genres'])
+
+    def test_wordnet_loaded_once_before_use(self):
+        loaded = threading.Event()
+        nltk = MagicMock()
+        nltk.corpus.wordnet.ensure_loaded.side_effect = lambda: time.sleep(0.1) or loaded.set()
+
+        with patch('src.image.game_info.nltk', nltk), \
+                patch.dict('src.image.game_info._NLTK_STATE', {'ready': False}):
+            prefetch = prefetch_nltk()
+            ensure_nltk_data()
+            self.assertTrue(loaded.is_set())
+            prefetch.join()
+
+        nltk.corpus.wordnet.ensure_loaded.assert_called_once()
+
     def test_get_year_recency(self):
         for recency, (start_year, end_year) in DATE_RECENCY.items():
             start_timestamp = time.mktime(time.strptime(f"01 Jan {start_year}", "%d %b %Y"))
@@ -124,6 +169,12 @@ class TestGameInfo(unittest.TestCase):
         self.assertEqual(keywords,
                          ['Experience', 'epic', 'conclusion', 'clan', 'reasons'])
 
+    def test_get_summary_keywords_many(self):
+        summaries = [TEKKEN_GAME_INFO['summary'], '', 'A bright, colorful platformer.']
+
+        self.assertEqual(get_summary_keywords_many(summaries),
+                         [get_summary_keywords(summary) for summary in summaries])
+
     def test_is_relevant_adjective(self):
         self.assertTrue(is_relevant_adjective('epic'))
         self.assertFalse(is_relevant_adjective('the'))
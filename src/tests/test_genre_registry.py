@@ -0,0 +1,99 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+import requests
+from src.image.genre_registry import ALL_GENRES_QUERY, GenreRegistry
+
+ALL_GENRES = [{"id": 4, "name": "Fighting"}, {"id": 12, "name": "Role-playing (RPG)"}]
+
+
+class TestGenreRegistry(unittest.TestCase):
+    def test_fetches_table_once(self):
+        fetch = Mock(return_value=ALL_GENRES)
+        registry = GenreRegistry(path=None)
+
+        self.assertEqual(registry.resolve([4], fetch), ["Fighting"])
+        self.assertEqual(registry.resolve([12, 4], fetch), ["Role-playing (RPG)", "Fighting"])
+        fetch.assert_called_once_with(ALL_GENRES_QUERY)
+
+    def test_fetches_unknown_ids(self):
+        fetch = Mock(side_effect=[ALL_GENRES, [{"id": 33, "name": "Arcade"}]])
+        registry = GenreRegistry(path=None)
+
+        genres = registry.resolve([4, 33], fetch)
+
+        self.assertEqual(genres, ["Fighting", "Arcade"])
+        self.assertEqual(fetch.call_args[0][0], "fields name; where id = (33);")
+
+    def test_remembers_missing_ids(self):
+        fetch = Mock(side_effect=[ALL_GENRES, [], []])
+        registry = GenreRegistry(path=None, ttl=60)
+
+        self.assertEqual(registry.resolve([4, 99, 99], fetch), ["Fighting"])
+        self.assertEqual(registry.resolve([99, 4], fetch), ["Fighting"])
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(fetch.call_args[0][0], "fields name; where id = (99);")
+
+        registry.missing[99] = time.time() - 61
+        registry.resolve([99], fetch)
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_persists_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "genres.json")
+            GenreRegistry(path=path).resolve([4], Mock(return_value=ALL_GENRES))
+            fetch = Mock()
+
+            genres = GenreRegistry(path=path).resolve([12], fetch)
+
+            self.assertEqual(genres, ["Role-playing (RPG)"])
+            fetch.assert_not_called()
+
+    def test_unwritable_table_kept_in_memory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "resources")
+            with open(path, "w", encoding="utf-8"):
+                pass
+            registry = GenreRegistry(path=os.path.join(path, "genres.json"))
+
+            self.assertEqual(registry.resolve([4], Mock(return_value=ALL_GENRES)), ["Fighting"])
+            self.assertEqual(registry.resolve([12], Mock()), ["Role-playing (RPG)"])
+            self.assertEqual(os.listdir(directory), ["resources"])
+
+    def test_corrupt_table_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "genres.json")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write('{"genres": {"4": "Figh')
+            fetch = Mock(return_value=ALL_GENRES)
+
+            self.assertEqual(GenreRegistry(path=path).resolve([4], fetch), ["Fighting"])
+            fetch.assert_called_once_with(ALL_GENRES_QUERY)
+            self.assertEqual(GenreRegistry(path=path).resolve([12], Mock()),
+                             ["Role-playing (RPG)"])
+
+    def test_refetches_after_ttl(self):
+        fetch = Mock(return_value=ALL_GENRES)
+        registry = GenreRegistry(path=None, ttl=60)
+        registry.resolve([4], fetch)
+        registry.fetched = time.time() - 61
+
+        registry.resolve([4], fetch)
+
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_keeps_stale_table_when_offline(self):
+        registry = GenreRegistry(path=None, ttl=60)
+        registry.resolve([4], Mock(return_value=ALL_GENRES))
+        registry.fetched = time.time() - 61
+        fetch = Mock(side_effect=requests.ConnectionError())
+
+        self.assertEqual(registry.resolve([4], fetch), ["Fighting"])
+        self.assertEqual(registry.resolve([4], fetch), ["Fighting"])
+        fetch.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.image.http_cache import CachedClientSession
+
+
+class StubETagHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=C0103
+        server = self.server
+        with server.lock:
+            server.requests.append(self.headers.get("If-None-Match"))
+            etag = f'"{server.version}"'
+            body = f"version {server.version}".encode()
+        time.sleep(server.delay)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        return
+
+
+class TestCachedClientSession(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubETagHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.version = 1
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/characters.txt"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for_requests(self, count):
+        deadline = time.time() + 5
+        while len(self.server.requests) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_counts_hits_and_misses(self):
+        session = CachedClientSession('test_cache', backend='memory')
+
+        first = session.get(self.url, timeout=3)
+        second = session.get(self.url, timeout=3)
+
+        self.assertEqual((first.text, second.text), ("version 1", "version 1"))
+        self.assertTrue(second.from_cache)
+        self.assertEqual(session.stats(), {'hits': 1, 'stale_hits': 0, 'misses': 1})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_serves_stale_while_revalidating(self):
+        session = CachedClientSession('test_cache', backend='memory', expire_after=1)
+        session.get(self.url, timeout=3)
+        time.sleep(1.1)
+        self.server.version = 2
+        self.server.delay = 0.5
+
+        start = time.perf_counter()
+        stale = session.get(self.url, timeout=3)
+        seconds = time.perf_counter() - start
+        self.wait_for_requests(2)
+        time.sleep(0.7)
+        fresh = session.get(self.url, timeout=3)
+
+        self.assertEqual(stale.text, "version 1")
+        self.assertLess(seconds, 0.4)
+        self.assertEqual(self.server.requests, [None, '"1"'])
+        self.assertEqual(fresh.text, "version 2")
+        self.assertEqual(session.stats(), {'hits': 1, 'stale_hits': 1, 'misses': 1})
+
+    def test_revalidates_with_etag(self):
+        session = CachedClientSession('test_cache', backend='memory', expire_after=1)
+        session.get(self.url, timeout=3)
+
+        response = session.get(self.url, timeout=3, refresh=True)
+
+        self.assertEqual(response.text, "version 1")
+        self.assertEqual(self.server.requests, [None, '"1"'])
+
+
+if __name__ == '__main__':
+    unittest.main()
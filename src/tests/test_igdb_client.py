@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+import requests
+from src.image.game_info import GameInfo
+from src.image.genre_registry import GenreRegistry
+from src.image.igdb_client import AsyncIGDBTransport, IGDBTransport
+
+HEADERS = {"Content-Type": "text/plain"}
+
+
+class StubIGDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=C0103
+        server = self.server
+        query = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        with server.lock:
+            server.requests.append((self.path, query, self.client_address))
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        body = json.dumps(server.responses.get(self.path, [])).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        return
+
+
+class TestIGDBTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubIGDBHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.statuses = []
+        self.server.delay = 0
+        self.server.responses = {"/v4/games": [{"id": 7498, "name": "Tekken 7"}],
+                                 "/v4/genres": [{"id": 4, "name": "Fighting"}]}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v4"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        transport = IGDBTransport(self.base_url)
+
+        games = transport.post("games", "fields name;", HEADERS)
+        genres = transport.post("genres", "fields name;", HEADERS)
+
+        self.assertEqual(games, [{"id": 7498, "name": "Tekken 7"}])
+        self.assertEqual(genres, [{"id": 4, "name": "Fighting"}])
+        self.assertEqual(self.server.requests[0][2], self.server.requests[1][2])
+        transport.close()
+
+    def test_cache_opened_on_first_use(self):
+        with tempfile.TemporaryDirectory() as directory:
+            transport = IGDBTransport(self.base_url,
+                                      cache_name=os.path.join(directory, 'game_api_cache'))
+            self.assertEqual(os.listdir(directory), [])
+
+            transport.post("games", "fields name;", HEADERS)
+            transport.close()
+
+            self.assertEqual(os.listdir(directory), ['game_api_cache.sqlite'])
+
+    def test_retries_failed_requests(self):
+        self.server.statuses = [503, 502]
+        transport = IGDBTransport(self.base_url, retries=2, backoff_factor=0)
+
+        games = transport.post("games", "fields name;", HEADERS)
+
+        self.assertEqual(games, [{"id": 7498, "name": "Tekken 7"}])
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_raises_after_retries(self):
+        self.server.statuses = [503, 503]
+        transport = IGDBTransport(self.base_url, retries=1, backoff_factor=0)
+
+        with self.assertRaises(requests.HTTPError):
+            transport.post("games", "fields name;", HEADERS)
+
+    def test_timeout(self):
+        self.server.delay = 0.5
+        transport = IGDBTransport(self.base_url, timeout=0.1, retries=0)
+
+        with self.assertRaises(requests.ConnectionError):
+            transport.post("games", "fields name;", HEADERS)
+
+    def test_async_requests_run_concurrently(self):
+        self.server.delay = 0.2
+
+        async def post_three(transport):
+            return await asyncio.gather(*(transport.post("games", "fields name;", HEADERS)
+                                          for _ in range(3)))
+
+        start = time.perf_counter()
+        results = asyncio.run(post_three(AsyncIGDBTransport(IGDBTransport(self.base_url))))
+        concurrent_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        asyncio.run(post_three(AsyncIGDBTransport(IGDBTransport(self.base_url),
+                                                  max_in_flight=1)))
+        serial_seconds = time.perf_counter() - start
+
+        self.assertEqual(len(results), 3)
+        self.assertLess(concurrent_seconds, 0.5)
+        self.assertGreaterEqual(serial_seconds, 0.6)
+
+    @patch("src.image.game_info.GameInfo.authenticate", Mock())
+    def test_game_info_through_stub(self):
+        game_info = GameInfo(transport=IGDBTransport(self.base_url),
+                             genre_registry=GenreRegistry(path=None))
+        game_info.token = {"access_token": "someAccessToken"}
+
+        game = game_info.get_game_info("Tekken 7")
+        genres = asyncio.run(game_info.get_genres_async([4]))
+
+        self.assertEqual(game["name"], "Tekken 7")
+        self.assertEqual(genres, ["Fighting"])
+        self.assertIn('search "Tekken 7"', self.server.requests[0][1])
+        self.assertEqual(self.server.requests[1][1], "fields name; limit 500;")
+
+
+if __name__ == '__main__':
+    unittest.main()
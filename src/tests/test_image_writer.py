@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+from src.atomic_file import FILE_MODE
+from src.image import image_writer
+from src.image.image_writer import (
+    ImageWriter, get_default_image_format, get_save_options, write_image
+)
+
+
+class FakeImage:
+    def __init__(self, mode='RGB', fail=False):
+        self.mode = mode
+        self.fail = fail
+        self.options = None
+
+    def convert(self, mode):
+        return FakeImage(mode)
+
+    def save(self, file, **options):
+        file.write(b'partial')
+        if self.fail:
+            raise OSError("disk full")
+        self.options = options
+
+
+class TestImageWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+        for name in ('pil_image', 'png_plugin'):
+            module_patch = patch.object(image_writer, name, MagicMock())
+            module_patch.start()
+            self.addCleanup(module_patch.stop)
+
+    def test_png_metadata(self):
+        options = get_save_options('png', {'prompt': "1girl, solo", 'seed': 7}, compress_level=9)
+
+        self.assertEqual((options['format'], options['compress_level']), ('PNG', 9))
+        options['pnginfo'].add_text.assert_any_call('prompt', "1girl, solo")
+        options['pnginfo'].add_text.assert_any_call('seed', '7')
+        options['pnginfo'].add_text.assert_any_call('parameters',
+                                                    '{"prompt": "1girl, solo", "seed": 7}')
+
+    def test_exif_metadata(self):
+        options = get_save_options('webp', {'seed': 7}, quality=80)
+
+        self.assertEqual((options['format'], options['quality']), ('WEBP', 80))
+        image_writer.pil_image.Exif.return_value.__setitem__.assert_called_once_with(
+            image_writer.EXIF_IMAGE_DESCRIPTION, '{"seed": 7}')
+
+    def test_write_image(self):
+        image = FakeImage('RGBA')
+        path = write_image(image, os.path.join(self.directory.name, 'images', 'asuka'), 'png')
+
+        self.assertEqual(path, os.path.join(self.directory.name, 'images', 'asuka.png'))
+        self.assertEqual(image.options['format'], 'PNG')
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['asuka.png'])
+        self.assertEqual(os.stat(path).st_mode & 0o777, FILE_MODE)
+
+        with patch.object(FakeImage, 'convert', Mock(return_value=FakeImage())) as convert:
+            write_image(image, os.path.join(self.directory.name, 'asuka'), 'jpeg')
+        convert.assert_called_once_with('RGB')
+
+    def test_failed_write_leaves_no_file(self):
+        with self.assertRaises(OSError):
+            write_image(FakeImage(fail=True), os.path.join(self.directory.name, 'asuka'), 'png')
+
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_writer(self):
+        writer = ImageWriter('webp', workers=1)
+        path = os.path.join(self.directory.name, 'asuka')
+
+        single = writer.submit(FakeImage(), path, image_format='jpeg')
+        variants = writer.submit_all([FakeImage(), FakeImage()], path, [{'seed': 1}])
+        writer.close()
+
+        self.assertEqual(single.result(), f'{path}.jpg')
+        self.assertEqual(variants.result(), [f'{path}-0.webp', f'{path}-1.webp'])
+        with self.assertRaises(ValueError):
+            ImageWriter('gif')
+
+    def test_format_aliases(self):
+        self.assertEqual(ImageWriter('JPG', workers=1).image_format, 'jpeg')
+        self.assertEqual(get_default_image_format('jpg'), 'jpeg')
+        self.assertEqual(get_default_image_format('gif'), 'png')
+
+
+if __name__ == '__main__':
+    unittest.main()
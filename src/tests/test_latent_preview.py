@@ -0,0 +1,42 @@
+import time
+import unittest
+from unittest.mock import patch
+from src.image.latent_preview import LatentPreviewer
+
+
+class TestLatentPreviewer(unittest.TestCase):
+    @patch("src.image.latent_preview.latents_to_previews", side_effect=lambda latents: latents)
+    def test_previews_every_n_steps(self, _):
+        previews = []
+        previewer = LatentPreviewer(lambda *preview: previews.append(preview), every=2,
+                                    max_overhead=1.0)
+
+        previewer.start()
+        for step in range(1, 7):
+            time.sleep(0.01)
+            previewer.on_step(step, [f"latent {step}"], range(0, 1), 1)
+
+        self.assertEqual([preview[1] for preview in previews], [2, 4, 6])
+        self.assertEqual(previews[0], (["latent 2"], 2, range(0, 1), 1))
+        self.assertLess(previewer.overhead(), 0.5)
+
+    @patch("src.image.latent_preview.latents_to_previews")
+    def test_overhead_capped(self, convert):
+        def slow_convert(latents):
+            time.sleep(0.05)
+            return latents
+        convert.side_effect = slow_convert
+        previewer = LatentPreviewer(lambda *_: None, every=1, max_overhead=0.1)
+
+        previewer.start()
+        for step in range(1, 21):
+            time.sleep(0.01)
+            previewer.on_step(step, ["latent"], range(0, 1), 1)
+
+        self.assertLess(previewer.previews, 5)
+        self.assertLess(previewer.preview_seconds,
+                        previewer.max_overhead * previewer.step_seconds + 0.06)
+
+
+if __name__ == '__main__':
+    unittest.main()
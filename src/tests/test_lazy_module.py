@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import unittest
+from src.lazy_module import LazyModule, prefetch
+
+LOADED_MODULES_SCRIPT = """
+import sys
+import {module}
+print(' '.join(name for name in {heavy} if name in sys.modules))
+"""
+
+
+def loaded_after_import(module, heavy):
+    output = subprocess.run([sys.executable, "-c", LOADED_MODULES_SCRIPT.format(
+        module=module, heavy=heavy)], capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+
+class TestLazyModule(unittest.TestCase):
+    def test_imports_on_attribute_access(self):
+        module = LazyModule("json")
+
+        self.assertEqual(module.dumps([1]), "[1]")
+        self.assertIs(module.import_module(), sys.modules["json"])
+
+    def test_missing_module_fails_on_use(self):
+        module = LazyModule("a_module_that_does_not_exist")
+
+        with self.assertRaises(ImportError):
+            module.import_module()
+
+    def test_prefetch_runs_tasks(self):
+        loaded = []
+
+        prefetch(lambda: loaded.append(1), lambda: loaded.append(2)).join()
+
+        self.assertEqual(loaded, [1, 2])
+
+    def test_game_info_import_has_no_heavy_side_effects(self):
+        self.assertEqual(loaded_after_import("src.image.game_info", ["nltk"]), [])
+
+    def test_text_to_image_import_is_lazy(self):
+        self.assertEqual(loaded_after_import("src.image.text_to_image",
+                                             ["torch", "diffusers"]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+from src.image.lookups import resolve_inputs
+from src.metrics import collect_spans
+
+STAGE_SECONDS = 0.3
+
+
+def slow(result):
+    def stage(_name):
+        time.sleep(STAGE_SECONDS)
+        return result(threading.current_thread())
+    return stage
+
+
+class TestLookups(unittest.TestCase):
+    def setUp(self):
+        self.threads = {}
+        self.game_info = Mock(get_game_keywords=slow(
+            lambda thread: self.threads.setdefault('game', thread) and ('mid', ['fighting'])))
+        characters_patch = patch("src.image.lookups.get_closest_characters", slow(
+            lambda thread: self.threads.setdefault('characters', thread) and ['1girl, mio']))
+        characters_patch.start()
+        self.addCleanup(characters_patch.stop)
+
+    def test_stages_run_concurrently(self):
+        input_values = {"anime_name": "mio", "game_name": "tekken 7"}
+
+        start = time.perf_counter()
+        with collect_spans() as spans:
+            resolve_inputs(input_values, self.game_info)
+        wall_seconds = time.perf_counter() - start
+
+        self.assertLess(wall_seconds, 1.5 * STAGE_SECONDS)
+        self.assertEqual(input_values, {"anime_name": "mio", "game_name": "tekken 7",
+                                        "recency": "mid", "game_tags": ["fighting"],
+                                        "processed_anime_name": ["1girl, mio"]})
+        self.assertEqual({name for name, _, _ in spans}, {'game lookup', 'character match'})
+        self.assertNotIn(threading.current_thread(), self.threads.values())
+
+    @patch("src.image.lookups.is_capturing", Mock(return_value=True))
+    def test_stages_run_inline_while_profiling(self):
+        resolve_inputs({"anime_name": "mio", "game_name": "tekken 7"}, self.game_info)
+
+        self.assertEqual(set(self.threads.values()), {threading.current_thread()})
+
+    def test_stage_error_is_raised(self):
+        self.game_info.get_game_keywords = Mock(side_effect=ValueError("no such game"))
+
+        with self.assertRaises(ValueError):
+            resolve_inputs({"anime_name": "mio", "game_name": "tekken 7"}, self.game_info)
+
+
+if __name__ == '__main__':
+    unittest.main()
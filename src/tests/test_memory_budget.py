@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+from src.image.memory_budget import (
+    PeakMemoryRecorder, apply_memory_strategies, choose_memory_strategies, get_weights_overflow
+)
+
+GIB = 1024 ** 3
+SDXL_SIZES = {'unet': 5 * GIB, 'text_encoder': GIB // 4, 'text_encoder_2': GIB + GIB // 4,
+              'vae': GIB // 4}
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_choose_memory_strategies(self):
+        self.assertEqual(choose_memory_strategies(None, SDXL_SIZES, 'cuda'), [])
+        self.assertEqual(choose_memory_strategies(12 * GIB, SDXL_SIZES, 'cuda'), [])
+        self.assertEqual(choose_memory_strategies(8 * GIB, SDXL_SIZES, 'cuda'),
+                         ['attention_slicing', 'vae_slicing', 'vae_tiling'])
+        self.assertEqual(choose_memory_strategies(6 * GIB, SDXL_SIZES, 'cuda')[-1],
+                         'model_cpu_offload')
+        self.assertEqual(choose_memory_strategies(4 * GIB, SDXL_SIZES, 'cuda')[-1],
+                         'sequential_cpu_offload')
+        self.assertEqual(choose_memory_strategies(4 * GIB, SDXL_SIZES, 'cpu'),
+                         ['attention_slicing', 'vae_slicing', 'vae_tiling'])
+
+    def test_get_weights_overflow(self):
+        self.assertEqual(get_weights_overflow(None, SDXL_SIZES, 'cpu'), 0)
+        self.assertEqual(get_weights_overflow(12 * GIB, SDXL_SIZES, 'cpu'), 0)
+        self.assertEqual(get_weights_overflow(4 * GIB, SDXL_SIZES, 'cpu'), 2 * GIB + 3 * GIB // 4)
+        self.assertEqual(get_weights_overflow(4 * GIB, SDXL_SIZES, 'cuda'), 0)
+
+    def test_apply_memory_strategies(self):
+        pipe = Mock()
+
+        apply_memory_strategies(pipe, ['vae_tiling', 'model_cpu_offload'])
+
+        pipe.enable_vae_tiling.assert_called_once()
+        pipe.enable_model_cpu_offload.assert_called_once()
+        pipe.enable_attention_slicing.assert_not_called()
+
+    def test_peak_memory_recorder(self):
+        recorder = PeakMemoryRecorder()
+
+        recorder.start('load')
+        data = b'\x01' * (64 * 1024 ** 2)
+        recorder.start('denoising')
+        del data
+        recorder.stop()
+
+        self.assertEqual(set(recorder.peaks), {'load', 'denoising'})
+        self.assertGreaterEqual(recorder.peaks['load'], 64 * 1024 ** 2)
+        self.assertEqual(recorder.over_budget(0), recorder.peaks)
+        self.assertEqual(recorder.over_budget(float('inf')), {})
+
+    def test_peak_memory_recorder_on_cuda(self):
+        torch = MagicMock()
+        torch.cuda.max_memory_allocated.return_value = 6 * GIB
+        recorder = PeakMemoryRecorder(lambda: 'cuda:0')
+
+        with patch("src.image.memory_budget.torch", torch):
+            recorder.start('denoising')
+            recorder.stop()
+
+        torch.cuda.reset_peak_memory_stats.assert_called_once_with('cuda:0')
+        self.assertEqual(recorder.peaks, {'denoising': 6 * GIB})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import unittest
+from unittest.mock import patch
+from src.metrics import Cancelled, MetricsRegistry, collect_spans, format_breakdown, span
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics_patch = patch("src.metrics.METRICS", MetricsRegistry(buckets=(0.1, 1)))
+        self.metrics = metrics_patch.start()
+        self.addCleanup(metrics_patch.stop)
+
+    def test_registry(self):
+        self.metrics.increment('requests')
+        self.metrics.increment('requests', 2)
+        self.metrics.observe('stage', 0.05)
+        self.metrics.observe('stage', 0.5)
+        self.metrics.observe('stage', 5)
+
+        snapshot = self.metrics.snapshot()
+
+        self.assertEqual(snapshot['counters'], {'requests': 3})
+        self.assertEqual(snapshot['histograms']['stage']['buckets'], [1, 1, 1])
+        self.assertEqual(snapshot['histograms']['stage']['count'], 3)
+        self.assertEqual((snapshot['histograms']['stage']['min'],
+                          snapshot['histograms']['stage']['max']), (0.05, 5))
+
+    def test_span(self):
+        with self.assertLogs('anigame.metrics', level='INFO') as logs, collect_spans() as spans:
+            with span('game lookup', game='Tekken 7'):
+                pass
+            with self.assertRaises(ValueError), span('diffusion'):
+                raise ValueError()
+
+        self.assertEqual([name for name, _, _ in spans], ['game lookup', 'diffusion'])
+        self.assertEqual(self.metrics.snapshot()['counters'], {'diffusion.errors': 1})
+        self.assertEqual(set(self.metrics.snapshot()['histograms']), {'game lookup', 'diffusion'})
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['span'], line['game'], line['status']),
+                         ('game lookup', 'Tekken 7', 'ok'))
+        self.assertEqual(json.loads(logs.records[1].getMessage())['status'], 'error')
+
+    def test_nested_spans(self):
+        with collect_spans() as spans:
+            with span('generation'):
+                with span('model load'):
+                    pass
+                with self.assertRaises(Cancelled), span('diffusion'):
+                    raise Cancelled()
+            with span('result cache save'):
+                pass
+
+        self.assertEqual([(name, parent) for name, _, parent in spans], [
+            ('model load', 'generation'), ('diffusion', 'generation'), ('generation', None),
+            ('result cache save', None)])
+        self.assertEqual(self.metrics.snapshot()['counters'], {'diffusion.cancelled': 1})
+
+    def test_format_breakdown(self):
+        self.assertEqual(format_breakdown([('game lookup', 0.5, None), ('diffusion', 2, None),
+                                           ('diffusion', 1.25, None)]),
+                         "game lookup 0.50 s, diffusion 3.25 s")
+        self.assertEqual(format_breakdown([('model load', 0.5, 'generation'),
+                                           ('diffusion', 2, 'generation'),
+                                           ('generation', 2.75, None),
+                                           ('retry', 0.25, 'retry'), ('retry', 0.5, None)]),
+                         "generation 2.75 s (model load 0.50 s, diffusion 2.00 s), "
+                         "retry 0.50 s (retry 0.25 s)")
+
+
+if __name__ == '__main__':
+    unittest.main()
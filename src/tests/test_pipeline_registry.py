@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from src.image.pipeline_registry import PipelineRegistry
+
+
+class TestPipelineRegistry(unittest.TestCase):
+    def test_loads_each_combination_once(self):
+        loader = Mock(side_effect=lambda model, dtype, device: object())
+        registry = PipelineRegistry(loader, size_of=lambda pipe: 1)
+
+        first = registry.get("model", "float16", "cpu")
+        second = registry.get("model", "float16", "cpu")
+        other = registry.get("model", "float32", "cpu")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(loader.call_count, 2)
+        self.assertEqual(registry.stats()["hits"], 1)
+        self.assertEqual(registry.stats()["misses"], 2)
+
+    def test_concurrent_callers_share_one_load(self):
+        def slow_loader(*_):
+            time.sleep(0.05)
+            return object()
+
+        loader = Mock(side_effect=slow_loader)
+        registry = PipelineRegistry(loader, size_of=lambda pipe: 1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            registry.get("model", "float16", "cpu"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(loader.call_count, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_evicts_least_recently_used(self):
+        registry = PipelineRegistry(lambda model, dtype, device: model,
+                                    memory_budget=2, size_of=lambda pipe: 1)
+        registry.get("a", "float16", "cpu")
+        registry.get("b", "float16", "cpu")
+        registry.get("a", "float16", "cpu")
+        registry.get("c", "float16", "cpu")
+
+        stats = registry.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["cached"], 2)
+        registry.get("a", "float16", "cpu")
+        self.assertEqual(registry.stats()["misses"], 3)
+
+    def test_reports_saved_load_time(self):
+        def slow_loader(*_):
+            time.sleep(0.02)
+            return object()
+
+        registry = PipelineRegistry(slow_loader, size_of=lambda pipe: 1)
+        registry.get("model", "float16", "cpu")
+        registry.get("model", "float16", "cpu")
+
+        self.assertGreaterEqual(registry.stats()["saved_seconds"], 0.02)
+
+    def test_warm_up_in_background(self):
+        loader = Mock(return_value=object())
+        registry = PipelineRegistry(loader, size_of=lambda pipe: 1)
+
+        registry.warm_up("model", "float16", "cpu", background=True).join()
+        registry.get("model", "float16", "cpu")
+
+        loader.assert_called_once_with("model", "float16", "cpu")
+
+
+if __name__ == '__main__':
+    unittest.main()
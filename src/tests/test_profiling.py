@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from src.profiling import capture_profile, get_profile_path, is_capturing, label_components
+
+
+class Component:
+    def decode(self, latents):
+        return latents * 2
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+
+    def test_get_profile_path(self):
+        path = get_profile_path({"anime_name": "kita ikuyo", "game_name": "Tekken 7!"}, 'out')
+
+        self.assertTrue(os.path.basename(path).startswith('profile-kita_ikuyo_tekken_7-'))
+        self.assertEqual(os.path.dirname(path), 'out')
+        self.assertNotEqual(get_profile_path({"anime_name": "kita ikuyo"}),
+                            get_profile_path({"anime_name": "kita ikuyo"}))
+        self.assertTrue(os.path.basename(get_profile_path({"id": 7})).startswith('profile-7-'))
+
+    @patch("src.profiling.start_torch_profiler", return_value=None)
+    def test_capture_profile_without_torch(self, _):
+        input_values = {"anime_name": "kita ikuyo", "game_name": "tekken 7"}
+
+        with capture_profile(input_values, self.directory.name) as path:
+            self.assertTrue(is_capturing())
+            sorted(range(1000), key=lambda x: -x)
+
+        self.assertFalse(is_capturing())
+        with open(f'{path}.json', encoding='utf-8') as file:
+            self.assertEqual(json.load(file), input_values)
+        with open(f'{path}.txt', encoding='utf-8') as file:
+            self.assertIn('function calls', file.read())
+        self.assertTrue(os.path.exists(f'{path}.prof'))
+        self.assertFalse(os.path.exists(f'{path}.trace.json'))
+
+    def test_capture_profile_with_torch(self):
+        torch_profiler = MagicMock()
+        torch_profiler.key_averages.return_value.table.return_value = "aten::conv2d"
+
+        with patch("src.profiling.start_torch_profiler", return_value=torch_profiler), \
+                capture_profile({}, self.directory.name) as path:
+            pass
+
+        torch_profiler.stop.assert_called_once()
+        torch_profiler.export_chrome_trace.assert_called_once_with(f'{path}.trace.json')
+        with open(f'{path}.operators.txt', encoding='utf-8') as file:
+            self.assertEqual(file.read(), "aten::conv2d")
+
+    @patch("src.profiling.start_torch_profiler", return_value=None)
+    @patch("src.profiling.write_profile", side_effect=OSError("disk full"))
+    def test_failed_write_keeps_the_job_error(self, *_):
+        with self.assertRaises(ValueError):
+            with capture_profile({}, self.directory.name):
+                raise ValueError("job failed")
+
+        with capture_profile({}, self.directory.name):
+            pass
+
+    @patch("src.profiling.torch", MagicMock())
+    @patch("src.profiling.start_torch_profiler", return_value=None)
+    def test_label_components(self, _):
+        pipe = MagicMock(unet=None, vae=Component())
+
+        with label_components(pipe):
+            self.assertNotIn('decode', vars(pipe.vae))
+        with capture_profile({}, self.directory.name), label_components(pipe):
+            self.assertIn('decode', vars(pipe.vae))
+            self.assertEqual(pipe.vae.decode(2), 4)
+
+        self.assertNotIn('decode', vars(pipe.vae))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+from src.image.prompt_embeddings import PromptEmbeddingCache
+
+KEY = ("model", "fp16", "cpu")
+
+
+def fake_encode_prompt(prompt, **_):
+    return ([f"embeds {text}" for text in prompt], None,
+            [f"pooled {text}" for text in prompt], None)
+
+
+@patch("src.image.prompt_embeddings.torch",
+       MagicMock(cat=lambda tensors: [row for tensor in tensors for row in tensor]))
+class TestPromptEmbeddingCache(unittest.TestCase):
+    def test_negative_prompt_encoded_once(self):
+        pipe = Mock(encode_prompt=Mock(side_effect=fake_encode_prompt))
+        cache = PromptEmbeddingCache("lowres", max_prompts=8)
+
+        first = cache.get(pipe, KEY, ["asuka", "rei"])
+        second = cache.get(pipe, KEY, ["rei", "asuka"])
+
+        self.assertEqual(first, {
+            'prompt_embeds': ["embeds asuka", "embeds rei"],
+            'pooled_prompt_embeds': ["pooled asuka", "pooled rei"],
+            'negative_prompt_embeds': ["embeds lowres"] * 2,
+            'negative_pooled_prompt_embeds': ["pooled lowres"] * 2
+        })
+        self.assertEqual(second['prompt_embeds'], ["embeds rei", "embeds asuka"])
+        self.assertEqual([call.kwargs['prompt'] for call in pipe.encode_prompt.call_args_list],
+                         [["lowres"], ["asuka", "rei"]])
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_least_recently_used_prompt_evicted(self):
+        pipe = Mock(encode_prompt=Mock(side_effect=fake_encode_prompt))
+        cache = PromptEmbeddingCache("lowres", max_prompts=2)
+
+        cache.get(pipe, KEY, ["asuka"])
+        cache.get(pipe, KEY, ["rei"])
+        cache.get(pipe, KEY, ["asuka"])
+        cache.get(pipe, KEY, ["mio"])
+        cache.get(pipe, KEY, ["asuka", "rei"])
+
+        self.assertEqual([call.kwargs['prompt'] for call in pipe.encode_prompt.call_args_list],
+                         [["lowres"], ["asuka"], ["rei"], ["mio"], ["rei"]])
+        self.assertEqual(cache.stats()['cached'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
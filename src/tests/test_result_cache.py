@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+from src.image.result_cache import ResultCache, get_result_key
+
+
+class FakeImage:
+    def __init__(self, size):
+        self.size = size
+
+    def save(self, file, **_):
+        file.write(b'\0' * self.size)
+
+
+def fake_open(path):
+    with open(path, 'rb'):
+        pass
+    image = MagicMock()
+    image.__enter__.return_value = image
+    image.path = path
+    return image
+
+
+@patch("src.image.result_cache.pil_image", MagicMock(open=fake_open))
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+
+    def test_get_result_key(self):
+        self.assertEqual(get_result_key({'prompt': "a", 'seed': 0}),
+                         get_result_key({'seed': 0, 'prompt': "a"}))
+        self.assertNotEqual(get_result_key({'prompt': "a", 'seed': 0}),
+                            get_result_key({'prompt': "a", 'seed': 1}))
+
+    def test_put_and_get(self):
+        cache = ResultCache(self.directory.name)
+
+        missing = cache.get({'prompt': "a"})
+        cache.put({'prompt': "a"}, FakeImage(100))
+        image = cache.get({'prompt': "a"})
+
+        self.assertIsNone(missing)
+        self.assertTrue(cache.contains({'prompt': "a"}))
+        self.assertFalse(cache.contains({'prompt': "b"}))
+        self.assertEqual(image.path, os.path.join(self.directory.name,
+                                                  f"{get_result_key({'prompt': 'a'})}.png"))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_unreadable_image_is_deleted(self):
+        cache = ResultCache(self.directory.name)
+        cache.put({'prompt': "a"}, FakeImage(100))
+
+        with patch("src.image.result_cache.pil_image",
+                   MagicMock(open=Mock(side_effect=OSError("image file is truncated")))):
+            image = cache.get({'prompt': "a"})
+
+        self.assertIsNone(image)
+        self.assertEqual(os.listdir(self.directory.name), [])
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_unwritable_cache_is_skipped(self):
+        path = os.path.join(self.directory.name, 'file')
+        with open(path, 'wb'):
+            pass
+        cache = ResultCache(os.path.join(path, 'results'))
+
+        cache.put({'prompt': "a"}, FakeImage(100))
+
+        self.assertIsNone(cache.get({'prompt': "a"}))
+        self.assertEqual(os.listdir(self.directory.name), ['file'])
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(self.directory.name, max_bytes=3900)
+        for time_stamp, prompt in enumerate("abc"):
+            cache.put({'prompt': prompt}, FakeImage(1000))
+            path = os.path.join(self.directory.name, f"{get_result_key({'prompt': prompt})}.png")
+            os.utime(path, (time_stamp, time_stamp))
+        cache.get({'prompt': "a"})
+
+        cache.put({'prompt': "d"}, FakeImage(1000))
+
+        self.assertIsNotNone(cache.get({'prompt': "a"}))
+        self.assertIsNone(cache.get({'prompt': "b"}))
+        self.assertIsNotNone(cache.get({'prompt': "c"}))
+        self.assertIsNotNone(cache.get({'prompt': "d"}))
+        self.assertLessEqual(cache.stats()['bytes'], 3900)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+from unittest.mock import patch, Mock
+from src.image.result_cache import ResultCache
+from src.image.text_to_image import (
+    GenerationCancelled, MAX_SEED, NUM_INFERENCE_STEPS, build_prompts, choose_seed,
+    is_cached, may_be_cached, render_prompts, reuse_seed, wait_for_warm_up, warm_up_pipeline
+)
+
+
+def fake_pipe(prompt, callback_on_step_end=None, **_):
+    for step in range(NUM_INFERENCE_STEPS):
+        if callback_on_step_end:
+            callback_on_step_end(None, step, 1000 - step, {})
+    return Mock(images=list(prompt))
+
+
+@patch("src.image.text_to_image.get_pipeline_key", Mock(return_value=("model", "fp16", "cpu")))
+@patch("src.image.text_to_image.torch", Mock())
+@patch("src.image.text_to_image.RESULT_CACHE", ResultCache(max_bytes=0))
+@patch("src.image.text_to_image.PROMPT_EMBEDDINGS",
+       Mock(get=lambda pipe, key, prompts: {"prompt": prompts}))
+@patch("src.image.text_to_image.PIPELINE_REGISTRY")
+class TestTextToImage(unittest.TestCase):
+    def test_build_prompts(self, _):
+        prompts = build_prompts({"anime_name": "asuka", "recency": "newest",
+                                 "processed_anime_name": ["1girl, souryuu asuka langley",
+                                                          "1girl, ayanami rei"],
+                                 "game_name": "Tekken 7", "game_tags": ["Fighting"]})
+
+        self.assertEqual(prompts, [
+            "newest, masterpiece, best quality, very aesthetic, 1girl, souryuu asuka langley, "
+            "solo, upper body, v, looking at , tekken 7, fighting",
+            "newest, masterpiece, best quality, very aesthetic, 1girl, ayanami rei, "
+            "solo, upper body, v, looking at , tekken 7, fighting"])
+
+    def test_render_prompts_reports_steps(self, registry):
+        registry.get.return_value = fake_pipe
+        steps = []
+
+        images = render_prompts(["a", "b", "c"], max_batch_size=2,
+                                on_step=lambda *progress: steps.append(progress))
+
+        self.assertEqual(images, ["a", "b", "c"])
+        self.assertEqual(len(steps), 2 * NUM_INFERENCE_STEPS)
+        self.assertEqual(steps[0], (1, NUM_INFERENCE_STEPS, range(0, 2), 3))
+        self.assertEqual(steps[-1], (NUM_INFERENCE_STEPS, NUM_INFERENCE_STEPS, range(2, 3), 3))
+
+    def test_render_prompts_cancelled(self, registry):
+        registry.get.return_value = fake_pipe
+        steps = []
+
+        def on_step(step, *_):
+            steps.append(step)
+            if step == 3:
+                raise GenerationCancelled()
+
+        with self.assertRaises(GenerationCancelled):
+            render_prompts(["a", "b"], on_step=on_step)
+        self.assertEqual(steps, [1, 2, 3])
+
+    def test_build_prompts_without_matched_character(self, _):
+        prompts = build_prompts({"anime_name": "mio", "recency": "newest",
+                                 "processed_anime_name": [], "game_name": "Tekken 7"})
+
+        self.assertEqual(prompts, ["newest, masterpiece, best quality, very aesthetic, mio, "
+                                   "solo, upper body, v, looking at , tekken 7"])
+
+    def test_choose_seed(self, _):
+        random_params, given_params = {"seed": None}, {"seed": "42"}
+
+        seed = choose_seed(random_params)
+
+        self.assertTrue(0 <= seed <= MAX_SEED)
+        self.assertEqual(random_params, {"seed": seed})
+        self.assertEqual(choose_seed(random_params), seed)
+        self.assertEqual(choose_seed(given_params), 42)
+        self.assertEqual(given_params, {"seed": 42})
+
+    def test_reuse_seed(self, _):
+        last_params = {"anime_name": "mio", "game_name": "tekken 7", "seed": 42}
+
+        self.assertFalse(reuse_seed({"anime_name": "mio", "game_name": "tekken 8", "seed": None},
+                                    last_params))
+        self.assertFalse(reuse_seed({"anime_name": "mio", "game_name": "tekken 7", "seed": 7},
+                                    last_params))
+        self.assertFalse(reuse_seed({"anime_name": "mio", "seed": None}, {}))
+        repeated_params = {"anime_name": "mio", "game_name": "tekken 7", "seed": None}
+        self.assertTrue(reuse_seed(repeated_params, last_params))
+        self.assertEqual(repeated_params, last_params)
+
+    def test_may_be_cached(self, _):
+        last_params = {"anime_name": "mio", "game_name": "tekken 7", "seed": 42,
+                       "processed_anime_name": ["1girl, akiyama mio, k-on!"]}
+
+        self.assertTrue(may_be_cached({"anime_name": "mio", "seed": 7}, {}))
+        self.assertTrue(may_be_cached({"anime_name": "mio", "game_name": "tekken 7",
+                                       "seed": None}, last_params))
+        self.assertFalse(may_be_cached({"anime_name": "mio", "game_name": "tekken 8",
+                                        "seed": None}, last_params))
+
+    def test_is_cached(self, _):
+        params = {"anime_name": "mio", "game_name": "tekken 7", "recency": "newest",
+                  "processed_anime_name": ["mio", "ritsu"], "seed": 42}
+
+        with patch("src.image.text_to_image.RESULT_CACHE") as cache:
+            cache.contains.side_effect = lambda params: params["seed"] == 42
+            self.assertTrue(is_cached(params))
+            self.assertFalse(is_cached(dict(params, seed=None)))
+            cache.contains.side_effect = lambda params: "ritsu" not in params["prompt"]
+            self.assertFalse(is_cached(params))
+
+    def test_render_prompts_uses_result_cache(self, registry):
+        pipe = Mock(side_effect=fake_pipe)
+        registry.get.return_value = pipe
+
+        with patch("src.image.text_to_image.RESULT_CACHE") as cache:
+            cache.get.side_effect = lambda params: "cached" if params["prompt"] == "b" else None
+            images = render_prompts(["a", "b", "c"])
+            cache.get.side_effect = lambda params: "cached"
+            cached_images = render_prompts(["a", "b", "c"])
+
+        self.assertEqual(images, ["a", "cached", "c"])
+        self.assertEqual(pipe.call_args.kwargs["prompt"], ["a", "c"])
+        self.assertEqual([call.args[1] for call in cache.put.call_args_list], ["a", "c"])
+        self.assertEqual(cached_images, ["cached"] * 3)
+        registry.get.assert_called_once()
+
+    def test_warm_up_pipeline_in_background(self, registry):
+        with patch.dict("src.image.text_to_image._WARM_UP", clear=True):
+            self.assertIs(warm_up_pipeline(), warm_up_pipeline())
+            wait_for_warm_up()
+            registry.warm_up.assert_called_once_with("model", "fp16", "cpu")
+
+    def test_failed_warm_up_is_raised_once(self, registry):
+        registry.warm_up.side_effect = OSError("model not found")
+        with patch.dict("src.image.text_to_image._WARM_UP", clear=True), \
+                patch("builtins.print") as print_mock:
+            warm_up_pipeline()
+            with self.assertRaises(OSError):
+                wait_for_warm_up()
+            wait_for_warm_up()
+
+            warm_up_pipeline().join()
+
+        print_mock.assert_called()
+        self.assertEqual(registry.warm_up.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, Mock
+import requests
+from src.image.twitch_auth import TwitchTokenManager
+
+
+def token_response(access_token, expires_in=5000000, delay=0):
+    def post(*_, **__):
+        time.sleep(delay)
+        response = Mock()
+        response.json.return_value = {"access_token": access_token, "expires_in": expires_in,
+                                      "token_type": "bearer"}
+        return response
+    return post
+
+
+class TestTwitchTokenManager(unittest.TestCase):
+    def setUp(self):
+        self.token_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.token_dir.cleanup)
+        self.token_path = os.path.join(self.token_dir.name, 'twitch_token.json')
+
+    @patch('requests.post')
+    def test_token_persisted(self, mock_post):
+        mock_post.side_effect = token_response("someAccessToken")
+        TwitchTokenManager("someClientId", "someSecret", path=self.token_path).get_token()
+
+        token = TwitchTokenManager("someClientId", "someSecret", path=self.token_path).get_token()
+        other_client = TwitchTokenManager("otherClientId", "someSecret", path=self.token_path)
+        mock_post.side_effect = token_response("otherAccessToken")
+
+        self.assertEqual(token["access_token"], "someAccessToken")
+        self.assertEqual(other_client.get_token()["access_token"], "otherAccessToken")
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(os.stat(self.token_path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.listdir(self.token_dir.name), ['twitch_token.json'])
+
+    @patch('requests.post')
+    def test_concurrent_callers_share_refresh(self, mock_post):
+        mock_post.side_effect = token_response("someAccessToken", delay=0.2)
+        token_manager = TwitchTokenManager("someClientId", "someSecret", path=None)
+        tokens = []
+
+        threads = [threading.Thread(target=lambda: tokens.append(token_manager.get_token()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([token["access_token"] for token in tokens], ["someAccessToken"] * 8)
+        mock_post.assert_called_once()
+
+    @patch('requests.post')
+    def test_failed_save_still_hands_out_the_token(self, mock_post):
+        mock_post.side_effect = token_response("someAccessToken", delay=0.2)
+        with open(self.token_path, 'w', encoding='utf-8'):
+            pass
+        token_manager = TwitchTokenManager("someClientId", "someSecret",
+                                           path=os.path.join(self.token_path, 'token.json'))
+        tokens = []
+
+        threads = [threading.Thread(target=lambda: tokens.append(token_manager.get_token()))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual([token["access_token"] for token in tokens], ["someAccessToken"] * 4)
+        mock_post.assert_called_once()
+
+    @patch('requests.post')
+    def test_refreshed_ahead_of_expiry(self, mock_post):
+        mock_post.side_effect = token_response("oldAccessToken", expires_in=3600)
+        token_manager = TwitchTokenManager("someClientId", "someSecret", path=None,
+                                           refresh_before=7200)
+        token_manager.get_token()
+        mock_post.side_effect = token_response("newAccessToken", delay=0.2)
+
+        start = time.perf_counter()
+        token = token_manager.get_token()
+        seconds = time.perf_counter() - start
+        time.sleep(0.4)
+
+        self.assertEqual(token["access_token"], "oldAccessToken")
+        self.assertLess(seconds, 0.1)
+        self.assertEqual(token_manager.get_token()["access_token"], "newAccessToken")
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('requests.post')
+    def test_failed_refresh_raised(self, mock_post):
+        mock_post.side_effect = requests.ConnectionError()
+        token_manager = TwitchTokenManager("someClientId", "someSecret", path=None)
+
+        with self.assertRaises(requests.ConnectionError):
+            token_manager.get_token()
+        token_manager.warm_up()
+
+
+if __name__ == '__main__':
+    unittest.main()